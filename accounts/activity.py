@@ -0,0 +1,114 @@
+"""
+Buffered activity logging.
+
+record_activity() queues a UserActivity in the cache instead of inserting
+it, so the pages that log views stay read-only; flush_activity() drains the
+queue into the database with bulk inserts, and feeds the written rows to
+the activity count badge rules, which bulk inserts would skip. The queue
+is a head and a tail counter plus one cache key per entry, which works on
+any cache backend with an atomic incr(). Buffering is best-effort: entries evicted from the cache
+before a flush are lost, which is acceptable for view tracking.
+
+Buffering needs a cache shared by every process (Redis, Memcached). With a
+per-process cache such as the default LocMemCache, which another process
+cannot flush and which culls entries long before ACTIVITY_BUFFER_SIZE,
+record_activity() writes the row directly instead.
+"""
+from collections import Counter
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.contenttypes.models import ContentType
+from django.core.cache import caches
+from django.utils import timezone
+
+from courses.cache import is_shared_cache
+from gamification.rules import has_rules, record_event
+from .models import UserActivity
+
+
+ACTIVITY_BUFFER_PREFIX = 'activity_buffer'
+
+
+def get_cache_alias():
+    return getattr(settings, 'ACTIVITY_BUFFER_CACHE', 'default')
+
+
+def get_cache():
+    return caches[get_cache_alias()]
+
+
+def buffering_enabled():
+    return is_shared_cache(get_cache_alias())
+
+
+def _key(name):
+    return f'{ACTIVITY_BUFFER_PREFIX}:{name}'
+
+
+def _next_slot(cache):
+    try:
+        return cache.incr(_key('tail'))
+    except ValueError:
+        # Restart after the last flushed slot if the tail counter was evicted
+        cache.add(_key('tail'), cache.get(_key('head')) or 0, None)
+        return cache.incr(_key('tail'))
+
+
+def record_activity(user, activity_type, obj=None, data=None):
+    """
+    Queue a UserActivity for the next flush, or write it straight away when
+    the cache is not shared.
+    """
+    entry = {
+        'user_id': user.pk,
+        'activity_type': activity_type,
+        'content_type_id': ContentType.objects.get_for_model(obj).pk if obj is not None else None,
+        'object_id': obj.pk if obj is not None else None,
+        'data': data or {},
+        'timestamp': timezone.now(),
+    }
+    if not buffering_enabled():
+        UserActivity.objects.create(**entry)
+        return
+
+    cache = get_cache()
+    slot = _next_slot(cache)
+    cache.set(_key(slot), entry, getattr(settings, 'ACTIVITY_BUFFER_TIMEOUT', 60 * 60 * 24))
+
+    # Whoever fills the buffer drains it
+    if slot - (cache.get(_key('head')) or 0) >= getattr(settings, 'ACTIVITY_BUFFER_SIZE', 500):
+        flush_activity()
+
+
+def flush_activity(batch_size=1000):
+    """
+    Write queued activity to the database and return how many rows were written.
+    """
+    cache = get_cache()
+    # One flush at a time; a concurrent caller leaves the work to the running one
+    if not cache.add(_key('lock'), True, 60):
+        return 0
+
+    written = 0
+    per_user = Counter()
+    try:
+        head = cache.get(_key('head')) or 0
+        tail = cache.get(_key('tail')) or 0
+        for start in range(head + 1, tail + 1, batch_size):
+            slots = range(start, min(start + batch_size, tail + 1))
+            keys = [_key(slot) for slot in slots]
+            entries = cache.get_many(keys)
+            UserActivity.objects.bulk_create([UserActivity(**entries[key]) for key in keys if key in entries])
+            cache.delete_many(keys)
+            cache.set(_key('head'), slots[-1], None)
+            written += len(entries)
+            per_user.update(entry['user_id'] for entry in entries.values())
+    finally:
+        cache.delete(_key('lock'))
+
+    # bulk_create sends no post_save, so count the rows towards activity badges here
+    if per_user and has_rules('activity_count'):
+        for user in get_user_model().objects.filter(pk__in=per_user):
+            record_event(user, 'activity_count', amount=per_user[user.pk])
+    return written
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from accounts.activity import flush_activity
+
+
+class Command(BaseCommand):
+    help = 'Write buffered user activity to the database'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        written = flush_activity(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Flushed {written} activity records'))
@@ -1,8 +1,8 @@
 from django.db import models
 from django.contrib.auth.models import AbstractUser, BaseUserManager
 from django.utils.translation import gettext_lazy as _
+from django.utils import timezone
 from django.conf import settings
-from django.db.models import Sum
 from django.contrib.contenttypes.fields import GenericForeignKey
 from django.contrib.contenttypes.models import ContentType
 from django.db.models.signals import post_save
@@ -45,11 +45,9 @@ class CustomUser(AbstractUser):
     @property
     def total_points(self):
         """
-        Calculate total points earned by the user.
+        Total points earned by the user, as kept by the points ledger.
         """
-        from gamification.models import Point
-        points = Point.objects.filter(user=self).aggregate(Sum('points'))
-        return points['points__sum'] or 0
+        return self.points
     
     @property
     def full_name(self):
@@ -128,7 +126,8 @@ class UserActivity(models.Model):
     
     user = models.ForeignKey('CustomUser', on_delete=models.CASCADE, related_name='account_activities')
     activity_type = models.CharField(max_length=50, choices=ACTIVITY_TYPES)
-    timestamp = models.DateTimeField(auto_now_add=True)
+    # Not auto_now_add, so buffered activity keeps the time it happened
+    timestamp = models.DateTimeField(default=timezone.now)
     
     # Generic foreign key to associate activity with any model
     content_type = models.ForeignKey(
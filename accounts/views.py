@@ -45,18 +45,11 @@ def dashboard(request):
     user = request.user
     
     # Get enrolled courses
-    enrollments = Enrollment.objects.filter(student=user).select_related('course')[:4]
+    enrollments = Enrollment.objects.filter(student=user).select_related('course', 'progress_summary')[:4]
     
-    # Calculate progress for each course
+    # Read course progress from the completion roll-ups
     for enrollment in enrollments:
-        course = enrollment.course
-        progress_records = user.progress.filter(course=course)
-        
-        if progress_records.exists():
-            total_percentage = sum(p.completion_percentage for p in progress_records)
-            enrollment.overall_progress = total_percentage / progress_records.count()
-        else:
-            enrollment.overall_progress = 0
+        enrollment.overall_progress = enrollment.overall_completion
     
     # Get recent activities
     recent_activities = UserActivity.objects.filter(user=user).order_by('-timestamp')[:5]
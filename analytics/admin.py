@@ -2,7 +2,8 @@ from django.contrib import admin
 from .models import (
     UserActivity, LearningInsight, UserPerformance,
     ContentDifficulty, UserContentDifficultyRating,
-    LearningStyle, AILearningRecommendation
+    LearningStyle, AILearningRecommendation, TopicMastery,
+    QuestionStatistics
 )
 
 
@@ -59,4 +60,19 @@ class UserContentDifficultyRatingAdmin(admin.ModelAdmin):
     list_display = ['user', 'content_difficulty', 'rating', 'timestamp']
     list_filter = ['rating', 'timestamp']
     search_fields = ['user__username']
-    date_hierarchy = 'timestamp' 
\ No newline at end of file
+    date_hierarchy = 'timestamp' 
+
+
+@admin.register(TopicMastery)
+class TopicMasteryAdmin(admin.ModelAdmin):
+    list_display = ['user', 'module', 'course', 'attempt_count', 'mean_score', 'last_attempt_at']
+    list_filter = ['course']
+    search_fields = ['user__username', 'module__title']
+    raw_id_fields = ['user', 'module', 'course']
+
+
+@admin.register(QuestionStatistics)
+class QuestionStatisticsAdmin(admin.ModelAdmin):
+    list_display = ['question', 'exposure_count', 'correct_count', 'p_value', 'point_biserial', 'computed_at']
+    search_fields = ['question__text']
+    raw_id_fields = ['question']
@@ -0,0 +1,161 @@
+"""
+Item analysis of quiz questions.
+
+Classical test statistics for each question, from completed quiz attempts,
+live and archived:
+
+- exposure: completed attempts of the question's quiz
+- p-value: share of those attempts that answered correctly, with omitted
+  answers counting as wrong
+- point-biserial: correlation between answering correctly and the rest
+  of the attempt's score (the score without this question's points)
+
+Only per-quiz score sums and the correct answers are read: QuizAnswer rows,
+and the packed responses of QuizAttemptArchive rows. The answers are
+streamed in keyset-paginated chunks into NumPy arrays and folded into
+per-question sums, so memory is bounded by the number of questions rather
+than the number of answers.
+"""
+from itertools import chain
+
+import numpy as np
+from django.db.models import Count, F, Sum
+from django.utils import timezone
+
+from courses.models import Quiz, Question, QuizAttempt, QuizAnswer, QuizAttemptArchive, unpack_responses
+from courses.question_bank import QuestionBank
+from .models import QuestionStatistics
+
+
+def compute_question_statistics(quiz_ids=None, chunk_size=50000, batch_size=1000):
+    """
+    Recompute QuestionStatistics for every question, or the questions of
+    the given quizzes, and return the number of rows written.
+    """
+    questions = Question.objects.order_by('id')
+    attempts = QuizAttempt.objects.filter(completed=True)
+    answers = QuizAnswer.objects.filter(is_correct=True, quiz_attempt__completed=True)
+    archived = QuizAttemptArchive.objects.all()
+    if quiz_ids is not None:
+        questions = questions.filter(quiz_id__in=quiz_ids)
+        attempts = attempts.filter(quiz_id__in=quiz_ids)
+        answers = answers.filter(quiz_attempt__quiz_id__in=quiz_ids)
+        archived = archived.filter(quiz_id__in=quiz_ids)
+
+    rows = list(questions.values_list('id', 'quiz_id', 'points'))
+    if not rows:
+        return 0
+    question_ids = np.array([row[0] for row in rows], dtype=np.int64)
+    question_quiz_ids = [row[1] for row in rows]
+    points = np.array([row[2] for row in rows], dtype=np.float64)
+    size = len(question_ids)
+
+    # Attempt count, score sum and sum of squared scores of each question's quiz
+    quiz_totals = {}
+    for table in (attempts, archived):
+        for quiz_id, count, total, squares in table.values('quiz_id').annotate(
+            count=Count('id'), total=Sum('score'), squares=Sum(F('score') * F('score'))
+        ).order_by().values_list('quiz_id', 'count', 'total', 'squares'):
+            previous = quiz_totals.get(quiz_id, (0, 0.0, 0.0))
+            quiz_totals[quiz_id] = (previous[0] + count, previous[1] + (total or 0.0), previous[2] + (squares or 0.0))
+    totals = np.array([quiz_totals.get(quiz_id, (0, 0.0, 0.0)) for quiz_id in question_quiz_ids], dtype=np.float64)
+    exposure, score_sum, score_squares = totals[:, 0], totals[:, 1], totals[:, 2]
+
+    # Per-question sums over correct answers
+    correct = np.zeros(size)
+    rest_sum = np.zeros(size)
+    squares_removed = np.zeros(size)
+    for chunk in chain(_answer_chunks(answers, chunk_size), _archived_answer_chunks(archived, chunk_size)):
+        chunk_question_ids = chunk[:, 0].astype(np.int64)
+        index = np.minimum(np.searchsorted(question_ids, chunk_question_ids), size - 1)
+        known = question_ids[index] == chunk_question_ids
+        index, score = index[known], chunk[known, 1]
+        rest = score - points[index]
+        correct += np.bincount(index, minlength=size)
+        rest_sum += np.bincount(index, weights=rest, minlength=size)
+        squares_removed += np.bincount(index, weights=score ** 2 - rest ** 2, minlength=size)
+
+    # Pearson correlation of x (1 if correct) and y (rest score), where x * x == x
+    n = exposure
+    sum_x = correct
+    sum_y = score_sum - points * correct
+    sum_xy = rest_sum
+    sum_yy = score_squares - squares_removed
+    with np.errstate(divide='ignore', invalid='ignore'):
+        p_value = np.where(n > 0, np.minimum(sum_x / n, 1.0), np.nan)
+        spread = (n * sum_x - sum_x ** 2) * (n * sum_yy - sum_y ** 2)
+        point_biserial = np.where(spread > 0, (n * sum_xy - sum_x * sum_y) / np.sqrt(spread), np.nan)
+    point_biserial = np.clip(point_biserial, -1.0, 1.0)
+
+    now = timezone.now()
+    statistics = [
+        QuestionStatistics(
+            question_id=int(question_ids[i]),
+            exposure_count=int(n[i]),
+            correct_count=int(sum_x[i]),
+            p_value=float(p_value[i]),
+            point_biserial=None if np.isnan(point_biserial[i]) else float(point_biserial[i]),
+            computed_at=now
+        )
+        for i in np.flatnonzero(n > 0)
+    ]
+    QuestionStatistics.objects.bulk_create(
+        statistics,
+        batch_size=batch_size,
+        update_conflicts=True,
+        unique_fields=['question'],
+        update_fields=['exposure_count', 'correct_count', 'p_value', 'point_biserial', 'computed_at']
+    )
+    # Questions no longer attempted keep no statistics
+    unexposed = question_ids[n == 0].tolist()
+    for start in range(0, len(unexposed), batch_size):
+        QuestionStatistics.objects.filter(question_id__in=unexposed[start:start + batch_size]).delete()
+
+    quizzes = Quiz.objects.all() if quiz_ids is None else Quiz.objects.filter(id__in=quiz_ids)
+    for course_id in quizzes.values_list('module__course_id', flat=True).distinct():
+        QuestionBank.invalidate(course_id)
+
+    return len(statistics)
+
+
+def _answer_chunks(answers, chunk_size):
+    """
+    Yield (question ID, attempt score) arrays of correct answers, paginating on the answer ID.
+    """
+    last_id = 0
+    while True:
+        rows = list(
+            answers.filter(id__gt=last_id).order_by('id').values_list(
+                'id', 'question_id', 'quiz_attempt__score'
+            )[:chunk_size]
+        )
+        if not rows:
+            return
+        last_id = rows[-1][0]
+        yield np.array([(question_id, score) for _id, question_id, score in rows], dtype=np.float64)
+
+
+def _archived_answer_chunks(archived, chunk_size, page_size=1000):
+    """
+    Yield (question ID, attempt score) arrays of the correct answers packed
+    into archived attempts, reading `page_size` attempts at a time by ID.
+    """
+    last_id = 0
+    correct = []
+    while True:
+        rows = list(
+            archived.filter(id__gt=last_id).order_by('id').values_list('id', 'score', 'answers')[:page_size]
+        )
+        if rows:
+            last_id = rows[-1][0]
+            correct.extend(
+                (question_id, score)
+                for _id, score, packed in rows
+                for question_id, _answer_id, is_correct in unpack_responses(packed)
+                if is_correct
+            )
+        if correct and (len(correct) >= chunk_size or not rows):
+            yield np.array(correct, dtype=np.float64)
+            correct = []
+        if not rows:
+            return
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from analytics.item_analysis import compute_question_statistics
+
+
+class Command(BaseCommand):
+    help = 'Compute per-question item statistics (exposure, p-value, point-biserial) from completed quiz attempts'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--quiz', type=int, nargs='+', dest='quiz_ids', help='Only analyse these quiz IDs')
+        parser.add_argument('--chunk-size', type=int, default=50000, help='Answers read per query')
+
+    def handle(self, *args, **options):
+        written = compute_question_statistics(quiz_ids=options['quiz_ids'], chunk_size=options['chunk_size'])
+        self.stdout.write(self.style.SUCCESS(f'Computed statistics for {written} questions'))
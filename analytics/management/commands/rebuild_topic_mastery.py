@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from analytics.models import TopicMastery
+
+
+class Command(BaseCommand):
+    help = 'Recompute topic mastery from completed quiz attempts'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', type=int, nargs='+', dest='user_ids', help='Only rebuild these user IDs')
+
+    def handle(self, *args, **options):
+        written = TopicMastery.objects.rebuild(user_ids=options['user_ids'])
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt {written} topic mastery rows'))
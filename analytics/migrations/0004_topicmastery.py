@@ -0,0 +1,70 @@
+# Generated by Django 4.2.7 on 2026-10-18 03:06
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+from django.db.models import Case, Count, F, FloatField, Max, Sum, Value, When
+
+
+def build_topic_mastery(apps, schema_editor):
+    """
+    Fill topic mastery from the completed quiz attempts so far.
+    """
+    QuizAttempt = apps.get_model('courses', 'QuizAttempt')
+    TopicMastery = apps.get_model('analytics', 'TopicMastery')
+    percentage = Case(
+        When(max_score__gt=0, then=F('score') * 100.0 / F('max_score')),
+        default=Value(0.0),
+        output_field=FloatField()
+    )
+    rows = QuizAttempt.objects.filter(completed=True).values(
+        'user_id', 'quiz__module_id', 'quiz__module__course_id'
+    ).annotate(attempts=Count('id'), total=Sum(percentage), last_attempt=Max('completed_at')).order_by()
+    TopicMastery.objects.bulk_create(
+        [
+            TopicMastery(
+                user_id=row['user_id'],
+                module_id=row['quiz__module_id'],
+                course_id=row['quiz__module__course_id'],
+                attempt_count=row['attempts'],
+                score_total=row['total'] or 0,
+                mean_score=(row['total'] or 0) / row['attempts'],
+                last_attempt_at=row['last_attempt']
+            )
+            for row in rows.iterator()
+        ],
+        batch_size=1000
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('courses', '0015_personalized_quiz_spec'),
+        ('analytics', '0003_learninginsight_relevance_score_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TopicMastery',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('attempt_count', models.PositiveIntegerField(default=0, verbose_name='Attempt Count')),
+                ('score_total', models.FloatField(default=0, verbose_name='Score Total')),
+                ('mean_score', models.FloatField(default=0, verbose_name='Mean Score')),
+                ('last_score', models.FloatField(blank=True, null=True, verbose_name='Last Score')),
+                ('last_attempt_at', models.DateTimeField(blank=True, null=True, verbose_name='Last Attempt')),
+                ('course', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='topic_mastery', to='courses.course', verbose_name='Course')),
+                ('module', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='topic_mastery', to='courses.module', verbose_name='Module')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='topic_mastery', to=settings.AUTH_USER_MODEL, verbose_name='User')),
+            ],
+            options={
+                'verbose_name': 'Topic Mastery',
+                'verbose_name_plural': 'Topic Mastery',
+                'indexes': [models.Index(fields=['user', 'mean_score'], name='analytics_t_user_id_74ce0a_idx')],
+                'unique_together': {('user', 'module')},
+            },
+        ),
+        migrations.RunPython(build_topic_mastery, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 4.2.7 on 2026-10-18 03:08
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0015_personalized_quiz_spec'),
+        ('analytics', '0004_topicmastery'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='QuestionStatistics',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('exposure_count', models.PositiveIntegerField(default=0, help_text="Completed attempts of the question's quiz", verbose_name='Exposure Count')),
+                ('correct_count', models.PositiveIntegerField(default=0, verbose_name='Correct Count')),
+                ('p_value', models.FloatField(blank=True, help_text='Share of attempts that answered correctly (0-1)', null=True, verbose_name='P-Value')),
+                ('point_biserial', models.FloatField(blank=True, help_text="Correlation between answering correctly and the rest of the attempt's score (-1 to 1)", null=True, verbose_name='Point-Biserial')),
+                ('computed_at', models.DateTimeField(verbose_name='Computed At')),
+                ('question', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='statistics', to='courses.question', verbose_name='Question')),
+            ],
+            options={
+                'verbose_name': 'Question Statistics',
+                'verbose_name_plural': 'Question Statistics',
+            },
+        ),
+    ]
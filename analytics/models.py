@@ -1,4 +1,5 @@
-from django.db import models
+from django.db import models, transaction, IntegrityError
+from django.db.models import Case, Count, F, FloatField, Max, Sum, Value, When
 from django.conf import settings
 from django.utils.translation import gettext_lazy as _
 from django.contrib.contenttypes.fields import GenericForeignKey
@@ -294,6 +295,44 @@ class ContentDifficulty(models.Model):
         return f"{self.get_content_type_display()} {self.content_id} - Difficulty: {self.difficulty_score}"
 
 
+class QuestionStatistics(models.Model):
+    """
+    Item analysis of a quiz question, computed in batches by compute_question_statistics.
+    """
+    question = models.OneToOneField(
+        'courses.Question',
+        on_delete=models.CASCADE,
+        related_name='statistics',
+        verbose_name=_('Question')
+    )
+    exposure_count = models.PositiveIntegerField(
+        _('Exposure Count'),
+        default=0,
+        help_text=_("Completed attempts of the question's quiz")
+    )
+    correct_count = models.PositiveIntegerField(_('Correct Count'), default=0)
+    p_value = models.FloatField(
+        _('P-Value'),
+        null=True,
+        blank=True,
+        help_text=_("Share of attempts that answered correctly (0-1)")
+    )
+    point_biserial = models.FloatField(
+        _('Point-Biserial'),
+        null=True,
+        blank=True,
+        help_text=_("Correlation between answering correctly and the rest of the attempt's score (-1 to 1)")
+    )
+    computed_at = models.DateTimeField(_('Computed At'))
+    
+    class Meta:
+        verbose_name = _('Question Statistics')
+        verbose_name_plural = _('Question Statistics')
+    
+    def __str__(self):
+        return f"Question {self.question_id} - p={self.p_value} r={self.point_biserial}"
+
+
 class UserContentDifficultyRating(models.Model):
     """
     Individual user ratings for content difficulty.
@@ -330,4 +369,144 @@ class UserContentDifficultyRating(models.Model):
         unique_together = [['user', 'content_difficulty']]
     
     def __str__(self):
-        return f"{self.user.username} - {self.content_difficulty} - Rating: {self.rating}" 
\ No newline at end of file
+        return f"{self.user.username} - {self.content_difficulty} - Rating: {self.rating}"
+
+
+def attempt_percentage_expression():
+    """
+    SQL expression for a QuizAttempt's score as a percentage of its max score.
+    """
+    return Case(
+        When(max_score__gt=0, then=F('score') * 100.0 / F('max_score')),
+        default=Value(0.0),
+        output_field=FloatField()
+    )
+
+
+class TopicMasteryQuerySet(models.QuerySet):
+    """
+    Incremental maintenance of per-user, per-module quiz performance.
+    """
+    
+    def record_attempt(self, user_id, module_id, course_id, percentage, attempted_at):
+        """
+        Add one completed quiz attempt to a user's mastery of a module.
+        """
+        changes = {
+            'course_id': course_id,
+            'attempt_count': F('attempt_count') + 1,
+            'score_total': F('score_total') + percentage,
+            # Right-hand sides read the old values, so this is the new mean
+            'mean_score': (F('score_total') + percentage) / (F('attempt_count') + 1),
+            'last_score': percentage,
+            'last_attempt_at': attempted_at,
+        }
+        if self.filter(user_id=user_id, module_id=module_id).update(**changes):
+            return
+        try:
+            with transaction.atomic():
+                self.create(
+                    user_id=user_id, module_id=module_id, course_id=course_id, attempt_count=1,
+                    score_total=percentage, mean_score=percentage, last_score=percentage,
+                    last_attempt_at=attempted_at
+                )
+        except IntegrityError:
+            # Another attempt created the row first
+            self.filter(user_id=user_id, module_id=module_id).update(**changes)
+    
+    def weak(self, user, threshold=70, course_id=None):
+        """
+        The user's topics with a mean score below the threshold, weakest first.
+        """
+        topics = self.filter(user=user, mean_score__lt=threshold)
+        if course_id is not None:
+            topics = topics.filter(course_id=course_id)
+        return topics.order_by('mean_score', 'module_id')
+    
+    def rebuild(self, user_ids=None):
+        """
+        Recompute mastery rows from the completed quiz attempts, live and
+        archived, for all users or the given ones. Returns the number of
+        rows written.
+        """
+        from courses.models import QuizAttempt, QuizAttemptArchive
+        
+        totals = {}
+        for attempts in (QuizAttempt.objects.filter(completed=True), QuizAttemptArchive.objects.all()):
+            if user_ids is not None:
+                attempts = attempts.filter(user_id__in=user_ids)
+            rows = attempts.values('user_id', 'quiz__module_id', 'quiz__module__course_id').annotate(
+                attempts=Count('id'),
+                total=Sum(attempt_percentage_expression()),
+                last_attempt=Max('completed_at')
+            ).order_by().values_list(
+                'user_id', 'quiz__module_id', 'quiz__module__course_id', 'attempts', 'total', 'last_attempt'
+            )
+            for user_id, module_id, course_id, count, total, last_attempt in rows.iterator():
+                entry = totals.setdefault((user_id, module_id), [course_id, 0, 0.0, None])
+                entry[1] += count
+                entry[2] += total or 0
+                if last_attempt and (entry[3] is None or last_attempt > entry[3]):
+                    entry[3] = last_attempt
+        
+        with transaction.atomic():
+            stale = self.all() if user_ids is None else self.filter(user_id__in=user_ids)
+            stale.delete()
+            return len(self.bulk_create(
+                [
+                    self.model(
+                        user_id=user_id,
+                        module_id=module_id,
+                        course_id=course_id,
+                        attempt_count=count,
+                        score_total=total,
+                        mean_score=total / count,
+                        last_attempt_at=last_attempt
+                    )
+                    for (user_id, module_id), (course_id, count, total, last_attempt) in totals.items()
+                ],
+                batch_size=1000
+            ))
+
+
+class TopicMastery(models.Model):
+    """
+    A user's quiz performance in one module, updated as quiz attempts complete.
+    """
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='topic_mastery',
+        verbose_name=_('User')
+    )
+    module = models.ForeignKey(
+        'courses.Module',
+        on_delete=models.CASCADE,
+        related_name='topic_mastery',
+        verbose_name=_('Module')
+    )
+    course = models.ForeignKey(
+        'courses.Course',
+        on_delete=models.CASCADE,
+        related_name='topic_mastery',
+        verbose_name=_('Course')
+    )
+    attempt_count = models.PositiveIntegerField(_('Attempt Count'), default=0)
+    # Sum of attempt percentages, so the mean can be updated without reading the row
+    score_total = models.FloatField(_('Score Total'), default=0)
+    mean_score = models.FloatField(_('Mean Score'), default=0)
+    last_score = models.FloatField(_('Last Score'), null=True, blank=True)
+    last_attempt_at = models.DateTimeField(_('Last Attempt'), null=True, blank=True)
+    
+    objects = TopicMasteryQuerySet.as_manager()
+    
+    class Meta:
+        verbose_name = _('Topic Mastery')
+        verbose_name_plural = _('Topic Mastery')
+        unique_together = [['user', 'module']]
+        indexes = [
+            models.Index(fields=['user', 'mean_score']),
+        ]
+    
+    def __str__(self):
+        return f"{self.user.username} - {self.module} - {self.mean_score:.0f}%"
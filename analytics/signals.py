@@ -0,0 +1,36 @@
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from courses.models import Module, Quiz, QuizAttempt
+from courses.signals import attempt_just_completed
+from .models import TopicMastery
+
+
+@receiver(post_save, sender=QuizAttempt)
+def update_topic_mastery(sender, instance, created, raw=False, **kwargs):
+    """
+    Add each attempt to the user's mastery of the quiz's module once, when it completes.
+    """
+    if raw or not attempt_just_completed(instance, created):
+        return
+    
+    placement = Quiz.objects.filter(pk=instance.quiz_id).values_list('module_id', 'module__course_id').first()
+    if placement is None:
+        return
+    module_id, course_id = placement
+    TopicMastery.objects.record_attempt(
+        instance.user_id, module_id, course_id, instance.score_percentage,
+        instance.completed_at or timezone.now()
+    )
+
+
+@receiver(post_save, sender=Module)
+def move_topic_mastery(sender, instance, raw=False, **kwargs):
+    """
+    Keep the course of a module's mastery rows in step when the module moves to another course.
+    """
+    if not raw:
+        TopicMastery.objects.filter(module_id=instance.pk).exclude(course_id=instance.course_id).update(
+            course_id=instance.course_id
+        )
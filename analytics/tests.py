@@ -0,0 +1,107 @@
+from datetime import timedelta
+
+from django.test import TestCase
+from django.utils import timezone
+
+from accounts.models import CustomUser
+from courses.archive import archive_attempts
+from courses.models import Answer, Course, Module, Question, Quiz, QuizAnswer, QuizAttempt, QuizAttemptArchive
+from .item_analysis import compute_question_statistics
+from .models import QuestionStatistics, TopicMastery
+
+
+class TopicMasteryTests(TestCase):
+    """
+    Per-module mastery rows kept from completed quiz attempts.
+    """
+
+    def setUp(self):
+        instructor = CustomUser.objects.create_user(username='instructor', password='password')
+        self.student = CustomUser.objects.create_user(username='student', password='password', is_student=True)
+        self.courses = [
+            Course.objects.create(
+                title=f'Course {number}', slug=f'course-{number}', description='Description',
+                instructor=instructor, learning_outcomes='Outcomes'
+            )
+            for number in range(2)
+        ]
+        self.module = Module.objects.create(course=self.courses[0], title='Module')
+        self.quiz = Quiz.objects.create(module=self.module, title='Quiz')
+
+    def test_completed_attempts_update_mastery(self):
+        QuizAttempt.objects.create(user=self.student, quiz=self.quiz, score=4, max_score=10, completed=True)
+        QuizAttempt.objects.create(user=self.student, quiz=self.quiz, score=6, max_score=10, completed=True)
+        QuizAttempt.objects.create(user=self.student, quiz=self.quiz, score=0, max_score=10)
+
+        mastery = TopicMastery.objects.get(user=self.student, module=self.module)
+        self.assertEqual(mastery.attempt_count, 2)
+        self.assertAlmostEqual(mastery.mean_score, 50)
+        self.assertEqual(list(TopicMastery.objects.weak(self.student)), [mastery])
+
+    def test_moved_module_takes_its_mastery_along(self):
+        QuizAttempt.objects.create(user=self.student, quiz=self.quiz, score=4, max_score=10, completed=True)
+
+        self.module.course = self.courses[1]
+        self.module.save()
+
+        self.assertFalse(TopicMastery.objects.weak(self.student, course_id=self.courses[0].pk).exists())
+        self.assertEqual(
+            list(TopicMastery.objects.weak(self.student, course_id=self.courses[1].pk).values_list('module_id', flat=True)),
+            [self.module.pk]
+        )
+
+
+class QuestionStatisticsTests(TestCase):
+    """
+    Item statistics over live and archived quiz attempts.
+    """
+
+    def setUp(self):
+        instructor = CustomUser.objects.create_user(username='instructor', password='password')
+        course = Course.objects.create(
+            title='Course', slug='course', description='Description',
+            instructor=instructor, learning_outcomes='Outcomes'
+        )
+        quiz = Quiz.objects.create(module=Module.objects.create(course=course, title='Module'), title='Quiz')
+        self.questions = [Question.objects.create(quiz=quiz, text=f'Question {number}', points=1) for number in range(2)]
+        answers = [
+            (Answer.objects.create(question=question, text='Right', is_correct=True),
+             Answer.objects.create(question=question, text='Wrong', is_correct=False))
+            for question in self.questions
+        ]
+        # Correct answers per student for the two questions
+        sheets = [(True, True), (True, False), (False, False), (True, True), (False, True)]
+        for number, sheet in enumerate(sheets):
+            student = CustomUser.objects.create_user(username=f'student{number}', password='password')
+            attempt = QuizAttempt.objects.create(
+                user=student, quiz=quiz, score=sum(sheet), max_score=2, completed=True,
+                completed_at=timezone.now() - timedelta(days=number)
+            )
+            for question, (right, wrong), is_correct in zip(self.questions, answers, sheet):
+                QuizAnswer.objects.create(
+                    quiz_attempt=attempt, question=question, answer=right if is_correct else wrong, is_correct=is_correct
+                )
+
+    def statistics(self):
+        return {
+            row.question_id: (row.exposure_count, row.correct_count, round(row.p_value, 6), round(row.point_biserial, 6))
+            for row in QuestionStatistics.objects.all()
+        }
+
+    def test_statistics(self):
+        self.assertEqual(compute_question_statistics(), 2)
+        exposure, correct, p_value, _point_biserial = self.statistics()[self.questions[0].pk]
+        self.assertEqual((exposure, correct, p_value), (5, 3, 0.6))
+
+    def test_archived_attempts_still_count(self):
+        compute_question_statistics()
+        live = self.statistics()
+
+        self.assertEqual(archive_attempts(before=timezone.now() - timedelta(hours=36)), 3)
+        self.assertEqual(QuizAttemptArchive.objects.count(), 3)
+        compute_question_statistics()
+        self.assertEqual(self.statistics(), live)
+
+        archive_attempts(before=timezone.now() + timedelta(days=1))
+        compute_question_statistics()
+        self.assertEqual(self.statistics(), live)
@@ -11,7 +11,7 @@ from .models import (
     LearningStyle, AILearningRecommendation
 )
 from courses.models import (
-    Enrollment, Progress, QuizAttempt, Course,
+    Enrollment, QuizAttempt, Course,
     Lesson, Quiz, Module
 )
 from gamification.models import UserAchievement, UserBadge, PointsTransaction
@@ -43,18 +43,12 @@ def get_user_learning_data(user):
     }
     
     # Course progress
-    enrollments = Enrollment.objects.filter(student=user)
+    enrollments = Enrollment.objects.filter(student=user).select_related('course', 'progress_summary')
     courses_data = []
     
     for enrollment in enrollments:
-        progress_records = Progress.objects.filter(
-            student=user, 
-            course=enrollment.course
-        )
-        
-        if progress_records.exists():
-            total_percentage = sum(p.completion_percentage for p in progress_records)
-            overall_progress = total_percentage / progress_records.count()
+        if hasattr(enrollment, 'progress_summary'):
+            overall_progress = enrollment.progress_summary.percentage
             
             # Get recent progress (last 30 days)
             recent_activity = UserActivity.objects.filter(
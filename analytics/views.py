@@ -9,16 +9,17 @@ from datetime import timedelta
 import json
 import openai
 import numpy as np
-from collections import Counter
 from django.contrib.contenttypes.models import ContentType
 
 from .models import (
     UserActivity, LearningInsight, UserPerformance,
     ContentDifficulty, UserContentDifficultyRating,
-    LearningStyle, AILearningRecommendation
+    LearningStyle, AILearningRecommendation, TopicMastery
 )
-from courses.models import Enrollment, Progress, QuizAttempt, Course, Lesson, Quiz
+from courses.models import Enrollment, Progress, QuizAttempt, Course, Lesson, Quiz, CourseProgressSummary
+from courses.outline import CourseOutline
 from gamification.models import UserAchievement, UserBadge, PointsTransaction
+from gamification.points import award_points
 from .utils import (
     generate_learning_insights, generate_learning_recommendations,
     detect_learning_style, get_user_learning_data
@@ -67,21 +68,11 @@ def dashboard(request):
     ).order_by('date')
     
     # Get course progress
-    enrollments = Enrollment.objects.filter(student=user).select_related('course')
+    enrollments = Enrollment.objects.filter(student=user).select_related('course', 'progress_summary')
     
-    # Calculate progress for each course
+    # Read course progress from the completion roll-ups
     for enrollment in enrollments:
-        course = enrollment.course
-        progress_records = Progress.objects.filter(
-            student=user,
-            course=course
-        )
-        
-        if progress_records.exists():
-            total_percentage = sum(p.completion_percentage for p in progress_records)
-            enrollment.overall_progress = total_percentage / progress_records.count()
-        else:
-            enrollment.overall_progress = 0
+        enrollment.overall_progress = enrollment.overall_completion
     
     # Get quiz performance
     quiz_attempts = QuizAttempt.objects.filter(user=user).order_by('-completed_at')[:10]
@@ -333,11 +324,10 @@ def complete_recommendation(request, recommendation_id):
     recommendation.save()
     
     # Award points for completing a recommendation
-    PointsTransaction.objects.create(
-        user=request.user,
-        points=10,
-        transaction_type='earned',
-        description=f"Completed recommendation: {recommendation.title}"
+    award_points(
+        request.user,
+        10,
+        f"Completed recommendation: {recommendation.title}"
     )
     
     return redirect('analytics:dashboard')
@@ -424,11 +414,9 @@ class InstructorDashboardView(LoginRequiredMixin, UserPassesTestMixin, TemplateV
             dropped = enrollments.filter(status='dropped').count()
             
             # Calculate average progress
-            progress_records = Progress.objects.filter(course=course)
-            if progress_records.exists():
-                avg_progress = progress_records.aggregate(avg=Avg('completion_percentage'))['avg'] or 0
-            else:
-                avg_progress = 0
+            avg_progress = CourseProgressSummary.objects.filter(enrollment__course=course).aggregate(
+                avg=Avg('percentage')
+            )['avg'] or 0
             
             # Calculate quiz performance
             course_quizzes = QuizAttempt.objects.filter(quiz__module__course=course)
@@ -477,58 +465,52 @@ class CourseAnalyticsView(LoginRequiredMixin, UserPassesTestMixin, DetailView):
         progress_records = Progress.objects.filter(course=course)
         
         # Get module completion data
+        module_completion = dict(
+            progress_records.with_completion().values('module_id').annotate(
+                avg=Avg('completion')
+            ).order_by().values_list('module_id', 'avg')
+        )
         module_data = []
         for module in course.modules.all():
-            module_progress = progress_records.filter(module=module)
-            completion_percentage = module_progress.aggregate(avg=Avg('completion_percentage'))['avg'] or 0
-            
             module_data.append({
                 'module': module,
-                'completion_percentage': completion_percentage,
+                'completion_percentage': module_completion.get(module.id) or 0,
             })
         
         # Get quiz performance data
         quiz_data = []
-        for module in course.modules.all():
-            for quiz in module.contents.filter(quiz__isnull=False):
-                quiz_attempts = QuizAttempt.objects.filter(quiz=quiz.quiz)
-                avg_score = quiz_attempts.aggregate(avg=Avg('score'))['avg'] or 0
-                pass_rate = quiz_attempts.filter(passed=True).count() / quiz_attempts.count() if quiz_attempts.count() > 0 else 0
-                
-                quiz_data.append({
-                    'quiz': quiz.quiz,
-                    'attempts': quiz_attempts.count(),
-                    'avg_score': avg_score,
-                    'pass_rate': pass_rate,
-                })
+        quizzes = Quiz.objects.filter(module__course=course).annotate(
+            attempt_count=Count('attempts'),
+            avg_score=Avg('attempts__score'),
+            passed_count=Count('attempts', filter=Q(attempts__passed=True))
+        ).order_by('module__order', 'order', 'id')
+        for quiz in quizzes:
+            quiz_data.append({
+                'quiz': quiz,
+                'attempts': quiz.attempt_count,
+                'avg_score': quiz.avg_score or 0,
+                'pass_rate': quiz.passed_count / quiz.attempt_count if quiz.attempt_count > 0 else 0,
+            })
         
-        # Get content difficulty ratings
+        # Get content difficulty ratings, walking the content registry in outline order
+        outline = CourseOutline.get(course)
+        contents = [item for module in outline.modules for item in module.items]
+        difficulties = {
+            (difficulty.content_type, difficulty.content_id): difficulty
+            for difficulty in ContentDifficulty.objects.filter(
+                content_type__in={content.kind for content in contents},
+                content_id__in={content.id for content in contents}
+            )
+        }
         difficulty_data = []
-        for module in course.modules.all():
-            for content in module.contents.all():
-                if hasattr(content, 'lesson'):
-                    content_type = 'lesson'
-                    content_id = content.lesson.id
-                elif hasattr(content, 'video'):
-                    content_type = 'video'
-                    content_id = content.video.id
-                elif hasattr(content, 'quiz'):
-                    content_type = 'quiz'
-                    content_id = content.quiz.id
-                else:
-                    continue
-                
-                difficulty = ContentDifficulty.objects.filter(
-                    content_type=content_type,
-                    content_id=content_id
-                ).first()
-                
-                if difficulty:
-                    difficulty_data.append({
-                        'content': content,
-                        'difficulty_score': difficulty.difficulty_score,
-                        'rating_count': difficulty.rating_count,
-                    })
+        for content in contents:
+            difficulty = difficulties.get((content.kind, content.id))
+            if difficulty:
+                difficulty_data.append({
+                    'content': content,
+                    'difficulty_score': difficulty.difficulty_score,
+                    'rating_count': difficulty.rating_count,
+                })
         
         context.update({
             'enrollment_count': enrollment_count,
@@ -689,39 +671,28 @@ def get_personalized_course_recommendations(user, limit=5):
     # Get courses the user is already enrolled in - changed from enrollment__student to enrollments__student
     enrolled_courses = Course.objects.filter(enrollments__student=user)
     
-    # Get user's quiz performance to identify strengths and weaknesses
-    quiz_attempts = QuizAttempt.objects.filter(user=user)
+    # Get user's per-module quiz performance to identify strengths and weaknesses
+    mastery = TopicMastery.objects.filter(user=user)
     
     # If user has no quiz attempts, recommend popular courses
-    if not quiz_attempts.exists():
+    if not mastery.exists():
         return Course.objects.exclude(id__in=enrolled_courses).annotate(
             enrollment_count=Count('enrollments')
         ).order_by('-enrollment_count')[:limit]
     
-    # Identify topics the user performs well in
-    strong_topics = []
-    weak_topics = []
-    
-    for attempt in quiz_attempts:
-        quiz = attempt.quiz
-        if attempt.score >= 80:  # User is strong in this topic
-            strong_topics.append(quiz.lesson.title)
-        elif attempt.score <= 50:  # User is weak in this topic
-            weak_topics.append(quiz.lesson.title)
-    
-    # Count occurrences of each topic
-    strong_topic_counts = Counter(strong_topics)
-    weak_topic_counts = Counter(weak_topics)
-    
-    # Get most common strong and weak topics
-    most_common_strong = [topic for topic, _ in strong_topic_counts.most_common(3)]
-    most_common_weak = [topic for topic, _ in weak_topic_counts.most_common(3)]
+    # Most practised topics the user performs well in (for interest) and poorly in (for improvement)
+    most_common_strong = list(
+        mastery.filter(mean_score__gte=80).order_by('-attempt_count').values_list('module__title', flat=True)[:3]
+    )
+    most_common_weak = list(
+        mastery.filter(mean_score__lte=50).order_by('-attempt_count').values_list('module__title', flat=True)[:3]
+    )
     
     # Recommend courses that cover user's weak topics (for improvement)
     # and are related to user's strong topics (for interest)
     recommended_courses = Course.objects.exclude(id__in=enrolled_courses).filter(
-        Q(module__lesson__title__in=most_common_weak) | 
-        Q(module__lesson__title__in=most_common_strong)
+        Q(modules__title__in=most_common_weak) | 
+        Q(modules__title__in=most_common_strong)
     ).distinct()
     
     # If not enough recommendations, add popular courses
@@ -735,7 +706,7 @@ def get_personalized_course_recommendations(user, limit=5):
         ).order_by('-enrollment_count')
         
         # Combine the recommendations
-        recommended_courses = list(recommended_courses) + list(popular_courses)
+        recommended_courses = list(recommended_courses) + list(popular_courses[:limit])
         
     return recommended_courses[:limit]
 
@@ -744,37 +715,13 @@ def identify_weak_areas(user):
     """
     Identify areas where the user needs improvement based on quiz performance.
     """
-    # Get user's quiz attempts
-    quiz_attempts = QuizAttempt.objects.filter(user=user)
-    
-    if not quiz_attempts.exists():
-        return []
-    
-    # Group attempts by lesson/topic and calculate average score
-    topic_scores = {}
-    for attempt in quiz_attempts:
-        topic = attempt.quiz.lesson.title
-        if topic not in topic_scores:
-            topic_scores[topic] = {'total': 0, 'count': 0}
-        
-        topic_scores[topic]['total'] += attempt.score
-        topic_scores[topic]['count'] += 1
-    
-    # Calculate average score for each topic
-    for topic in topic_scores:
-        topic_scores[topic]['avg'] = topic_scores[topic]['total'] / topic_scores[topic]['count']
-    
-    # Identify weak areas (topics with average score below 70%)
-    weak_areas = [
-        {'topic': topic, 'avg_score': data['avg']} 
-        for topic, data in topic_scores.items() 
-        if data['avg'] < 70
+    # Topics (modules) with a mean score below 70%, weakest first
+    return [
+        {'topic': topic, 'module_id': module_id, 'avg_score': mean_score, 'attempts': attempts}
+        for module_id, topic, mean_score, attempts in TopicMastery.objects.weak(user, 70).values_list(
+            'module_id', 'module__title', 'mean_score', 'attempt_count'
+        )
     ]
-    
-    # Sort by average score (ascending)
-    weak_areas.sort(key=lambda x: x['avg_score'])
-    
-    return weak_areas
 
 
 def calculate_completion_rate(course):
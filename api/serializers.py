@@ -4,6 +4,7 @@ from courses.models import (
     Category, Course, Module, Lesson, Video, Quiz,
     Question, Answer, Enrollment, Progress, QuizAttempt
 )
+from courses.outline import CourseOutline
 from gamification.models import (
     Badge, UserBadge, Achievement, UserAchievement,
     Challenge, UserChallenge, PointsTransaction, Streak
@@ -94,7 +95,7 @@ class QuizSerializer(serializers.ModelSerializer):
 class CourseDetailSerializer(serializers.ModelSerializer):
     category = CategorySerializer(read_only=True)
     instructor = UserSerializer(read_only=True)
-    modules = ModuleSerializer(many=True, read_only=True)
+    modules = serializers.SerializerMethodField()
     
     class Meta:
         model = Course
@@ -102,6 +103,10 @@ class CourseDetailSerializer(serializers.ModelSerializer):
                   'description', 'difficulty', 'prerequisites', 'learning_outcomes',
                   'thumbnail', 'created_at', 'updated_at', 'is_published',
                   'total_modules', 'total_students', 'modules']
+    
+    def get_modules(self, obj):
+        # Serialize from the cached outline rather than querying modules
+        return ModuleSerializer(CourseOutline.get(obj).modules, many=True).data
 
 
 class EnrollmentSerializer(serializers.ModelSerializer):
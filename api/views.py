@@ -9,6 +9,7 @@ from courses.models import (
     Category, Course, Module, Lesson, Video, Quiz,
     Question, Answer, Enrollment, Progress, QuizAttempt
 )
+from courses.enrollment import enroll_students
 from gamification.models import (
     Badge, UserBadge, Achievement, UserAchievement,
     Challenge, UserChallenge, PointsTransaction, Streak
@@ -188,35 +189,42 @@ class CourseViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        # Create enrollment
-        enrollment = Enrollment.objects.create(
-            student=user,
-            course=course,
-            status='enrolled'
-        )
+        # Create enrollment, progress records and points for enrollment
+        enrollments = enroll_students(course, [user])
+        if not enrollments:
+            return Response(
+                {'detail': 'You cannot enroll in this course.'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
         
-        # Create progress records for each module
-        for module in course.modules.all():
-            Progress.objects.create(
-                student=user,
-                course=course,
-                module=module
+        serializer = EnrollmentSerializer(enrollments[0])
+        return Response(serializer.data, status=status.HTTP_201_CREATED)
+    
+    @action(detail=True, methods=['post'])
+    def enroll_cohort(self, request, pk=None):
+        """
+        Enroll a list of students in this course in one batch.
+        """
+        course = self.get_object()
+        if course.instructor != request.user and not request.user.is_staff:
+            return Response(
+                {'detail': 'Only the course instructor can enroll students.'},
+                status=status.HTTP_403_FORBIDDEN
             )
         
-        # Add points for enrollment (gamification)
-        user.points += 50
-        user.save()
+        student_ids = request.data.get('student_ids')
+        if not isinstance(student_ids, list) or not all(isinstance(i, int) for i in student_ids):
+            return Response(
+                {'detail': 'student_ids must be a list of user IDs.'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
         
-        # Create points transaction
-        PointsTransaction.objects.create(
-            user=user,
-            points=50,
-            transaction_type='earned',
-            description=f"Enrolled in course: {course.title}"
+        student_ids = list(User.objects.filter(pk__in=student_ids).values_list('pk', flat=True))
+        enrollments = enroll_students(course, student_ids)
+        return Response(
+            {'enrolled': len(enrollments), 'skipped': len(student_ids) - len(enrollments)},
+            status=status.HTTP_201_CREATED
         )
-        
-        serializer = EnrollmentSerializer(enrollment)
-        return Response(serializer.data, status=status.HTTP_201_CREATED)
     
     @action(detail=False, methods=['get'])
     def my_courses(self, request):
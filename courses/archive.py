@@ -0,0 +1,122 @@
+"""
+Quiz attempt archive.
+
+Completed attempts older than QUIZ_ATTEMPT_ARCHIVE_AFTER_DAYS are moved by
+archive_quiz_attempts out of QuizAttempt and QuizAnswer, which live exams
+write to, into QuizAttemptArchive: one row per attempt with its answers
+packed into a compressed blob and the completion month as its period.
+Archived attempts keep their IDs.
+
+Views read attempts through this module, which falls through to the
+archive when an attempt is no longer live. Counts and best scores come
+from QuizAttemptSummary, which covers both tables.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .models import QuizAttempt, QuizAnswer, QuizAttemptArchive, pack_responses
+
+
+ARCHIVE_BATCH_SIZE = 500
+
+# Attempts whose exam-mode side effects have not been applied stay live
+UNFINISHED_TASK_STATUSES = ('pending', 'processing', 'failed')
+
+
+def archive_horizon():
+    days = getattr(settings, 'QUIZ_ATTEMPT_ARCHIVE_AFTER_DAYS', 180)
+    return timezone.now() - timedelta(days=days)
+
+
+def archivable_attempts(before):
+    return QuizAttempt.objects.filter(completed=True, completed_at__lt=before).exclude(
+        submission_task__status__in=UNFINISHED_TASK_STATUSES
+    )
+
+
+def archive_attempts(before=None, batch_size=ARCHIVE_BATCH_SIZE, limit=None):
+    """
+    Move completed attempts finished before `before` (by default the
+    configured horizon) into the archive, and return how many were moved.
+    """
+    before = before or archive_horizon()
+    archived = 0
+    while limit is None or archived < limit:
+        size = batch_size if limit is None else min(batch_size, limit - archived)
+        batch = list(archivable_attempts(before).order_by('id')[:size])
+        if not batch:
+            break
+        archived += archive_batch(batch)
+    return archived
+
+
+def archive_batch(attempts):
+    """
+    Archive a batch of attempts and delete them, with their answers, from the live tables.
+    """
+    attempt_ids = [attempt.pk for attempt in attempts]
+    responses = {}
+    rows = QuizAnswer.objects.filter(quiz_attempt_id__in=attempt_ids).order_by('id').values_list(
+        'quiz_attempt_id', 'question_id', 'answer_id', 'is_correct'
+    )
+    for attempt_id, question_id, answer_id, is_correct in rows:
+        responses.setdefault(attempt_id, []).append((question_id, answer_id, is_correct))
+
+    with transaction.atomic():
+        QuizAttemptArchive.objects.bulk_create(
+            [
+                QuizAttemptArchive(
+                    id=attempt.pk,
+                    user_id=attempt.user_id,
+                    quiz_id=attempt.quiz_id,
+                    score=attempt.score,
+                    max_score=attempt.max_score,
+                    passed=attempt.passed,
+                    started_at=attempt.started_at,
+                    completed_at=attempt.completed_at,
+                    period=attempt.completed_at.year * 100 + attempt.completed_at.month,
+                    answers=pack_responses(responses.get(attempt.pk, ()))
+                )
+                for attempt in attempts
+            ],
+            ignore_conflicts=True
+        )
+        QuizAttempt.objects.filter(id__in=attempt_ids).delete()
+    return len(attempt_ids)
+
+
+def attempt_history(user, quiz, limit=None):
+    """
+    A user's attempts at a quiz, newest first, reading the archive only
+    when the live attempts do not fill `limit`.
+    """
+    live = QuizAttempt.objects.filter(user=user, quiz=quiz).order_by('-started_at')
+    attempts = list(live[:limit] if limit else live)
+    if limit is None or len(attempts) < limit:
+        archived = QuizAttemptArchive.objects.filter(user=user, quiz=quiz).order_by('-started_at')
+        attempts += list(archived[:limit - len(attempts)] if limit else archived)
+    attempts.sort(key=lambda attempt: attempt.started_at, reverse=True)
+    return attempts
+
+
+def get_attempt(user, quiz, attempt_id):
+    """
+    A user's attempt by ID, live or archived, or None.
+    """
+    return (
+        QuizAttempt.objects.filter(id=attempt_id, user=user, quiz=quiz).first()
+        or QuizAttemptArchive.objects.filter(id=attempt_id, user=user, quiz=quiz).first()
+    )
+
+
+def latest_attempt(user, quiz):
+    """
+    A user's most recently finished attempt at a quiz, live or archived, or None.
+    """
+    attempt = QuizAttempt.objects.filter(user=user, quiz=quiz).order_by('-completed_at').first()
+    if attempt is None:
+        attempt = QuizAttemptArchive.objects.filter(user=user, quiz=quiz).order_by('-completed_at').first()
+    return attempt
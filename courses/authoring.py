@@ -0,0 +1,319 @@
+"""
+Bulk quiz authoring.
+
+The quiz editors and the import_quiz command describe a quiz's questions as
+plain dicts (id, title, text, question_type, points, order, explanation
+and a list of answers with text and is_correct). apply_questions() diffs
+them against the quiz's current questions and answers and writes only the
+difference, in one transaction, with one bulk_create, one bulk_update and
+at most one delete per table however many questions are submitted.
+
+Answers are matched by text first and then by position, so unchanged
+answers keep their IDs and the QuizAnswer rows that point at them. Bulk
+writes skip the model signals, so the caches they would invalidate are
+invalidated once, after the transaction commits, and the per-row
+invalidation receivers are deferred while cascading deletes run.
+"""
+import csv
+import json
+import os
+import re
+import threading
+from contextlib import contextmanager
+
+from django.db import transaction
+
+from .grading import AnswerKey
+from .models import Module, Quiz, Question, Answer
+from .outline import CourseOutline
+from .question_bank import QuestionBank
+
+
+QUESTION_FIELDS = ('title', 'text', 'question_type', 'points', 'order', 'explanation')
+QUESTION_TYPES = {question_type for question_type, _label in Question.QUESTION_TYPES}
+# Values of fields a new question was submitted without; order defaults to its position
+QUESTION_DEFAULTS = {'title': '', 'question_type': 'multiple_choice', 'points': 1, 'explanation': ''}
+BATCH_SIZE = 500
+
+QUIZ_FIELDS = ('title', 'description', 'time_limit', 'passing_score')
+
+# questions[<ID or new_N>][<field>] and questions[<ID or new_N>][answers][]
+QUESTION_POST_KEY = re.compile(r'questions\[(new_\d+|\d+)\]\[(\w+)\](?:\[\])?$')
+
+_state = threading.local()
+
+
+@contextmanager
+def deferred_invalidation():
+    """
+    Make the per-row cache invalidation receivers for questions and
+    answers do nothing; the caller invalidates the quiz's caches once.
+    """
+    previous = getattr(_state, 'deferred', False)
+    _state.deferred = True
+    try:
+        yield
+    finally:
+        _state.deferred = previous
+
+
+def invalidation_deferred():
+    return getattr(_state, 'deferred', False)
+
+
+class AuthoringResult:
+    """
+    Counts of the rows written by apply_questions().
+    """
+
+    def __init__(self):
+        self.questions_created = 0
+        self.questions_updated = 0
+        self.questions_deleted = 0
+        self.answers_created = 0
+        self.answers_updated = 0
+        self.answers_deleted = 0
+        self.skipped = 0
+
+    def __str__(self):
+        return (
+            f"{self.questions_created} questions created, {self.questions_updated} updated, "
+            f"{self.questions_deleted} deleted; {self.answers_created} answers created, "
+            f"{self.answers_updated} updated, {self.answers_deleted} deleted"
+            + (f"; {self.skipped} incomplete questions skipped" if self.skipped else "")
+        )
+
+
+def parse_question_post(data):
+    """
+    Read the questions and deleted question IDs posted by the quiz form.
+    """
+    questions = {}
+    for key, values in data.lists():
+        match = QUESTION_POST_KEY.match(key)
+        if not match:
+            continue
+        key_id, field = match.groups()
+        question = questions.setdefault(key_id, {'id': None if key_id.startswith('new_') else int(key_id)})
+        if field == 'answers':
+            question['answer_texts'] = values
+        else:
+            question[field] = values[-1]
+
+    for question in questions.values():
+        try:
+            correct_index = int(question.pop('correct_answer', 0) or 0)
+        except ValueError:
+            correct_index = 0
+        question['answers'] = [
+            {'text': text, 'is_correct': index == correct_index}
+            for index, text in enumerate(question.pop('answer_texts', []))
+        ]
+
+    deleted_ids = [int(question_id) for question_id in data.getlist('deleted_questions[]') if question_id.isdigit()]
+    return list(questions.values()), deleted_ids
+
+
+def read_quiz_file(path):
+    """
+    Read a quiz export and return (quiz fields, questions).
+
+    JSON files hold either a list of questions or an object with quiz
+    fields and a "questions" list. CSV files have one question per row,
+    with answer_1, answer_2, ... columns and a "correct" column of 1-based
+    answer numbers separated by semicolons; a short answer question with
+    no "correct" column accepts all its answers.
+    """
+    extension = os.path.splitext(path)[1].lower()
+    with open(path, newline='', encoding='utf-8-sig') as f:
+        if extension == '.json':
+            data = json.load(f)
+            if isinstance(data, list):
+                return {}, data
+            return {field: data[field] for field in QUIZ_FIELDS if field in data}, data.get('questions', [])
+        if extension == '.csv':
+            return {}, [question_from_csv_row(row) for row in csv.DictReader(f)]
+    raise ValueError(f"Unsupported quiz file '{path}'; use .json or .csv.")
+
+
+def question_from_csv_row(row):
+    answer_columns = sorted(
+        (column for column in row if column and column.startswith('answer_') and column[7:].isdigit()),
+        key=lambda column: int(column[7:])
+    )
+    texts = [row[column] for column in answer_columns]
+    correct = {int(number) for number in (row.get('correct') or '').replace(' ', '').split(';') if number.isdigit()}
+    accept_all = not correct and row.get('question_type') == 'short_answer'
+    question = {field: row[field] for field in ('id',) + QUESTION_FIELDS if row.get(field) not in (None, '')}
+    question['answers'] = [
+        {'text': text, 'is_correct': accept_all or number in correct}
+        for number, text in enumerate(texts, start=1)
+    ]
+    return question
+
+
+def clean_question(data, position):
+    """
+    Normalize one submitted question. Returns None for questions without
+    text or answers, and raises ValueError for invalid values.
+
+    Fields missing from `data` are left out, so an update keeps the stored
+    value; new questions get QUESTION_DEFAULTS and their position as order.
+    """
+    text = (data.get('text') or '').strip()
+    answers = [
+        {'text': str(answer.get('text', '')).strip(), 'is_correct': bool(answer.get('is_correct'))}
+        for answer in data.get('answers') or []
+    ]
+    answers = [answer for answer in answers if answer['text']]
+    if not text or not answers:
+        return None
+
+    question_id = data.get('id')
+    question = {
+        'id': int(question_id) if question_id not in (None, '') else None,
+        'position': position,
+        'text': text,
+        'answers': answers,
+    }
+    if 'title' in data:
+        question['title'] = (data['title'] or '').strip()[:200]
+    if 'explanation' in data:
+        question['explanation'] = (data['explanation'] or '').strip()
+    if 'question_type' in data:
+        question['question_type'] = data['question_type'] or QUESTION_DEFAULTS['question_type']
+        if question['question_type'] not in QUESTION_TYPES:
+            raise ValueError(f"Question {position + 1}: unknown question type '{question['question_type']}'.")
+    try:
+        if 'points' in data:
+            question['points'] = int(data['points'] or QUESTION_DEFAULTS['points'])
+        if data.get('order') not in (None, ''):
+            question['order'] = int(data['order'])
+    except (TypeError, ValueError):
+        raise ValueError(f"Question {position + 1}: points and order must be whole numbers.")
+    if question.get('points', 0) < 0 or question.get('order', 0) < 0:
+        raise ValueError(f"Question {position + 1}: points and order cannot be negative.")
+    return question
+
+
+def apply_questions(quiz, questions, deleted_ids=(), replace=False, batch_size=BATCH_SIZE):
+    """
+    Bring a quiz's questions in line with the submitted ones.
+
+    Submitted questions with the ID of one of the quiz's questions update
+    it; the rest are created. Questions listed in deleted_ids are deleted,
+    and with replace=True so is every question that was not submitted.
+    """
+    result = AuthoringResult()
+    cleaned = []
+    for position, data in enumerate(questions):
+        question = clean_question(data, position)
+        if question is None:
+            result.skipped += 1
+        else:
+            cleaned.append(question)
+
+    with transaction.atomic():
+        # One edit of a quiz at a time, so the rows it creates are the quiz's newest
+        Quiz.objects.select_for_update().filter(pk=quiz.pk).exists()
+        current = {row['id']: row for row in Question.objects.filter(quiz=quiz).values('id', *QUESTION_FIELDS)}
+        current_answers = {}
+        for answer_id, question_id, text, is_correct in Answer.objects.filter(question__quiz=quiz).order_by(
+            'id'
+        ).values_list('id', 'question_id', 'text', 'is_correct'):
+            current_answers.setdefault(question_id, []).append((answer_id, text, is_correct))
+
+        delete_ids = {question_id for question_id in deleted_ids if question_id in current}
+        if replace:
+            delete_ids |= set(current) - {question['id'] for question in cleaned}
+
+        new_questions, changed_questions, answer_plan = [], [], []
+        for spec in cleaned:
+            if spec['id'] in delete_ids:
+                continue
+            if spec['id'] in current:
+                row = current[spec['id']]
+                fields = {field: spec.get(field, row[field]) for field in QUESTION_FIELDS}
+                if any(row[field] != value for field, value in fields.items()):
+                    changed_questions.append(Question(id=spec['id'], quiz=quiz, **fields))
+                answer_plan.append((spec['id'], None, spec['answers']))
+            else:
+                # New questions, and IDs that belong to another quiz, get new rows
+                fields = {
+                    field: spec.get(field, QUESTION_DEFAULTS.get(field, spec['position']))
+                    for field in QUESTION_FIELDS
+                }
+                question = Question(quiz=quiz, **fields)
+                new_questions.append(question)
+                answer_plan.append((None, question, spec['answers']))
+
+        if delete_ids:
+            with deferred_invalidation():
+                result.questions_deleted = Question.objects.filter(id__in=delete_ids).delete()[1].get(
+                    Question._meta.label, 0
+                )
+        Question.objects.bulk_update(changed_questions, QUESTION_FIELDS, batch_size=batch_size)
+        Question.objects.bulk_create(new_questions, batch_size=batch_size)
+        if new_questions and new_questions[0].pk is None:
+            # Backends that cannot return IDs from bulk inserts: pair the new rows in insertion order
+            new_ids = Question.objects.filter(quiz=quiz).exclude(id__in=list(current)).order_by('id').values_list(
+                'id', flat=True
+            )
+            for question, question_id in zip(new_questions, new_ids):
+                question.pk = question_id
+        result.questions_updated = len(changed_questions)
+        result.questions_created = len(new_questions)
+
+        new_answers, changed_answers, removed_answer_ids = [], [], []
+        for question_id, question, answers in answer_plan:
+            question_id = question_id or question.pk
+            matched, leftovers = match_answers(current_answers.get(question_id, []), answers)
+            for answer, row in zip(answers, matched):
+                if row is None:
+                    new_answers.append(Answer(question_id=question_id, **answer))
+                elif (row[1], row[2]) != (answer['text'], answer['is_correct']):
+                    changed_answers.append(Answer(id=row[0], question_id=question_id, **answer))
+            removed_answer_ids.extend(row[0] for row in leftovers)
+
+        if removed_answer_ids:
+            with deferred_invalidation():
+                Answer.objects.filter(id__in=removed_answer_ids).delete()
+        Answer.objects.bulk_update(changed_answers, ['text', 'is_correct'], batch_size=batch_size)
+        Answer.objects.bulk_create(new_answers, batch_size=batch_size)
+        result.answers_created = len(new_answers)
+        result.answers_updated = len(changed_answers)
+        result.answers_deleted = len(removed_answer_ids)
+
+    course_id = Module.objects.filter(pk=quiz.module_id).values_list('course_id', flat=True).first()
+    # After commit, so no reader caches the old questions under the new version
+    transaction.on_commit(lambda: invalidate_quiz_caches(quiz.pk, course_id))
+    return result
+
+
+def invalidate_quiz_caches(quiz_id, course_id):
+    AnswerKey.invalidate(quiz_id)
+    if course_id:
+        CourseOutline.invalidate(course_id)
+        QuestionBank.invalidate(course_id)
+
+
+def match_answers(existing, answers):
+    """
+    Pair submitted answers with existing (id, text, is_correct) rows: same
+    text first, then by position. Returns the row (or None) for each
+    submitted answer and the rows left over.
+    """
+    by_text = {}
+    for row in existing:
+        by_text.setdefault(row[1], []).append(row)
+    matched = []
+    for answer in answers:
+        rows = by_text.get(answer['text'])
+        matched.append(rows.pop(0) if rows else None)
+
+    used = {row[0] for row in matched if row is not None}
+    leftovers = [row for row in existing if row[0] not in used]
+    for index, row in enumerate(matched):
+        if row is None and leftovers:
+            matched[index] = leftovers.pop(0)
+    return matched, leftovers
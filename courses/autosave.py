@@ -0,0 +1,161 @@
+"""
+Coalesced autosave for in-progress quiz attempts.
+
+Autosave requests only merge the changed answers into a short-lived
+per-attempt buffer in the cache, so repeated saves of the same question
+overwrite each other in memory. The buffer is written to QuizAnswer in one
+transaction once it is older than QUIZ_AUTOSAVE_FLUSH_INTERVAL, when the
+attempt is saved or submitted through take_quiz, or by the
+flush_quiz_autosaves command for attempts that went quiet.
+
+The buffer needs a cache shared by every process, since the next request
+or the flush command may run elsewhere. With a per-process cache such as
+the default LocMemCache, autosaves are written to QuizAnswer directly.
+"""
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .cache import get_cache, is_shared_cache
+from .grading import AnswerKey, save_responses
+from .models import QuizAttempt
+
+
+AUTOSAVE_CACHE_NAMESPACE = 'quiz_autosave'
+
+
+def _buffer_key(attempt_id):
+    return f'{AUTOSAVE_CACHE_NAMESPACE}:{attempt_id}'
+
+
+def _timeout():
+    return getattr(settings, 'QUIZ_AUTOSAVE_TIMEOUT', 60 * 60 * 6)
+
+
+def buffering_enabled():
+    return is_shared_cache(getattr(settings, 'COURSE_OUTLINE_CACHE', 'default'))
+
+
+def buffer_answers(attempt, answers, answer_key=None):
+    """
+    Merge changed answers ({question ID: answer ID or short answer text})
+    into the attempt's buffer.
+
+    Answers to questions outside the attempt's quiz, or choosing an answer
+    of another question, are rejected. Returns (accepted question IDs,
+    rejected question IDs).
+    """
+    answer_key = answer_key or AnswerKey.get(attempt.quiz_id)
+    accepted, rejected = {}, []
+    for question_id, value in answers.items():
+        question = answer_key.questions.get(_as_int(question_id))
+        if question is None:
+            rejected.append(question_id)
+            continue
+        if question.question_type != 'short_answer' and value not in (None, ''):
+            if question.check(value)[1] is None:
+                rejected.append(question_id)
+                continue
+        accepted[str(question.id)] = '' if value is None else str(value)
+
+    if accepted and not buffering_enabled():
+        write_answers(attempt, accepted, answer_key)
+    elif accepted:
+        cache = get_cache()
+        key = _buffer_key(attempt.pk)
+        entry = cache.get(key) or {'since': time.time(), 'answers': {}}
+        entry['answers'].update(accepted)
+        cache.set(key, entry, _timeout())
+
+        if time.time() - entry['since'] >= getattr(settings, 'QUIZ_AUTOSAVE_FLUSH_INTERVAL', 30):
+            flush_attempt(attempt, answer_key)
+
+    return [int(question_id) for question_id in accepted], rejected
+
+
+def pending_answers(attempt):
+    """
+    Return the buffered, not yet written answers of an attempt.
+    """
+    entry = get_cache().get(_buffer_key(attempt.pk))
+    return {int(question_id): value for question_id, value in entry['answers'].items()} if entry else {}
+
+
+def flush_attempt(attempt, answer_key=None):
+    """
+    Write an attempt's buffered answers to QuizAnswer and return how many
+    were written.
+    """
+    cache = get_cache()
+    key = _buffer_key(attempt.pk)
+    entry = cache.get(key)
+    if not entry:
+        return 0
+    # Take the buffer first so answers arriving during the write start a new one
+    cache.delete(key)
+
+    try:
+        write_answers(attempt, entry['answers'], answer_key)
+    except Exception:
+        # Put the answers back, under anything saved in the meantime
+        newer = cache.get(key)
+        if newer:
+            entry['answers'].update(newer['answers'])
+        cache.set(key, entry, _timeout())
+        raise
+    return len(entry['answers'])
+
+
+def write_answers(attempt, answers, answer_key=None):
+    """
+    Save answers ({question ID string: answer ID or text}) to QuizAnswer in
+    one transaction.
+    """
+    answer_key = answer_key or AnswerKey.get(attempt.quiz_id)
+    grade = answer_key.grade(answers, prefix='')
+    with transaction.atomic():
+        # Cleared answers remove the saved row
+        cleared = [int(question_id) for question_id, value in answers.items() if value == '']
+        if cleared:
+            attempt.answers.filter(question_id__in=cleared).delete()
+        save_responses(attempt, grade.responses)
+
+
+def flush_pending(batch_size=500):
+    """
+    Flush the buffers of every active attempt and return how many attempts
+    had answers written.
+    """
+    cache = get_cache()
+    cutoff = timezone.now() - timedelta(seconds=_timeout())
+    attempts = QuizAttempt.objects.filter(completed=False, started_at__gte=cutoff).only('id', 'quiz_id')
+
+    flushed = 0
+    batch = []
+    for attempt in attempts.iterator(chunk_size=batch_size):
+        batch.append(attempt)
+        if len(batch) >= batch_size:
+            flushed += _flush_batch(cache, batch)
+            batch = []
+    if batch:
+        flushed += _flush_batch(cache, batch)
+    return flushed
+
+
+def _flush_batch(cache, attempts):
+    buffered = cache.get_many([_buffer_key(attempt.pk) for attempt in attempts])
+    flushed = 0
+    for attempt in attempts:
+        if _buffer_key(attempt.pk) in buffered and flush_attempt(attempt):
+            flushed += 1
+    return flushed
+
+
+def _as_int(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
@@ -0,0 +1,412 @@
+"""
+Bitmap-backed completion storage.
+
+Each lesson, video and quiz gets a stable position in its course
+(ContentItem). A student's completed content in a course is then a single
+bitset over those positions (CourseCompletion), replacing one join row per
+completed item. BitmapCompletionManager exposes the bitset through the same
+API as the Progress.completed_* managers, and is returned by them when
+COMPLETION_STORAGE is 'bitmap'.
+"""
+from functools import reduce
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Max
+
+from .cache import get_or_build, bump_version
+from .models import Module, ContentItem, CourseCompletion, CourseProgressSummary, Progress
+
+
+CONTENT_INDEX_CACHE_NAMESPACE = 'content_items'
+
+
+def bitmap_storage_enabled():
+    return getattr(settings, 'COMPLETION_STORAGE', 'm2m') == 'bitmap'
+
+
+class CompletionBitset:
+    """
+    A set of content positions stored as the bits of an integer.
+    """
+    __slots__ = ('value',)
+
+    def __init__(self, value=0):
+        self.value = value
+
+    @classmethod
+    def from_bytes(cls, data):
+        return cls(int.from_bytes(bytes(data or b''), 'little'))
+
+    @classmethod
+    def from_positions(cls, positions):
+        bitset = cls()
+        bitset.update(positions)
+        return bitset
+
+    @classmethod
+    def union(cls, bitsets):
+        return cls(reduce(lambda value, bitset: value | bitset.value, bitsets, 0))
+
+    @classmethod
+    def intersection(cls, bitsets):
+        bitsets = list(bitsets)
+        if not bitsets:
+            return cls()
+        return cls(reduce(lambda value, bitset: value & bitset.value, bitsets[1:], bitsets[0].value))
+
+    def to_bytes(self):
+        return self.value.to_bytes((self.value.bit_length() + 7) // 8, 'little')
+
+    def __contains__(self, position):
+        return bool(self.value >> position & 1)
+
+    def __or__(self, other):
+        return CompletionBitset(self.value | other.value)
+
+    def __and__(self, other):
+        return CompletionBitset(self.value & other.value)
+
+    def __eq__(self, other):
+        return isinstance(other, CompletionBitset) and self.value == other.value
+
+    def __len__(self):
+        return bin(self.value).count('1')
+
+    def __iter__(self):
+        value, position = self.value, 0
+        while value:
+            if value & 1:
+                yield position
+            value >>= 1
+            position += 1
+
+    def add(self, position):
+        self.value |= 1 << position
+
+    def discard(self, position):
+        self.value &= ~(1 << position)
+
+    def update(self, positions):
+        """Set the given positions and return how many were newly set."""
+        before = self.value
+        for position in positions:
+            self.value |= 1 << position
+        return len(CompletionBitset(self.value & ~before))
+
+    def difference_update(self, positions):
+        """Clear the given positions and return how many were set before."""
+        before = self.value
+        for position in positions:
+            self.value &= ~(1 << position)
+        return len(CompletionBitset(before & ~self.value))
+
+
+class ContentIndex:
+    """
+    Mapping between a course's content and its bit positions.
+    """
+
+    def __init__(self, course_id, positions, live):
+        self.course_id = course_id
+        # (kind, object_id) -> position, for active and deactivated items
+        self.positions = positions
+        self.items = {position: key for key, position in positions.items()}
+        # Positions of content that still exists
+        self.live = live
+
+    @classmethod
+    def build(cls, course_id):
+        positions = {}
+        live = CompletionBitset()
+        rows = ContentItem.objects.filter(course_id=course_id).values_list(
+            'kind', 'object_id', 'position', 'is_active'
+        )
+        for kind, object_id, position, is_active in rows:
+            positions[(kind, object_id)] = position
+            if is_active:
+                live.add(position)
+        return cls(course_id, positions, live)
+
+    @classmethod
+    def get(cls, course_id):
+        return get_or_build(CONTENT_INDEX_CACHE_NAMESPACE, course_id, lambda: cls.build(course_id))
+
+    @classmethod
+    def invalidate(cls, course_id):
+        bump_version(CONTENT_INDEX_CACHE_NAMESPACE, course_id)
+
+    def position(self, kind, object_id):
+        return self.positions.get((kind, object_id))
+
+    def completed_ids(self, bitset):
+        """Return the IDs of the live content set in a bitset, keyed by kind."""
+        completed = {'lesson': set(), 'video': set(), 'quiz': set()}
+        for position in bitset & self.live:
+            kind, object_id = self.items[position]
+            completed[kind].add(object_id)
+        return completed
+
+    def percentage(self, bitset):
+        total = len(self.live)
+        return len(bitset & self.live) / total * 100 if total else 0
+
+
+def content_kind(model):
+    return model._meta.model_name
+
+
+def _next_position(course_id):
+    """
+    Return the next free position in a course, locking its registry rows
+    until the end of the enclosing transaction.
+    """
+    last = ContentItem.objects.select_for_update().filter(course_id=course_id).aggregate(
+        last=Max('position')
+    )['last']
+    return 0 if last is None else last + 1
+
+
+def register_content(instance):
+    """
+    Register newly created content at the next free position in its course.
+    """
+    course_id = Module.objects.filter(pk=instance.module_id).values_list('course_id', flat=True).first()
+    if course_id is None:
+        return None
+    with transaction.atomic():
+        item = ContentItem.objects.create(
+            course_id=course_id,
+            module_id=instance.module_id,
+            kind=content_kind(type(instance)),
+            object_id=instance.pk,
+            order=instance.order,
+            position=_next_position(course_id)
+        )
+    ContentIndex.invalidate(course_id)
+    return item
+
+
+def sync_content(instance):
+    """
+    Copy the module and order of saved content to its registry entry.
+
+    Content that was never registered is registered now. Content moved to
+    another course takes the next free position there, and its bit moves
+    with it in the bitmap of every student who completed it.
+    """
+    course_id = Module.objects.filter(pk=instance.module_id).values_list('course_id', flat=True).first()
+    if course_id is None:
+        return None
+    item = ContentItem.objects.filter(kind=content_kind(type(instance)), object_id=instance.pk).first()
+    if item is None:
+        return register_content(instance)
+    if item.course_id == course_id:
+        if (item.module_id, item.order) != (instance.module_id, instance.order):
+            ContentItem.objects.filter(pk=item.pk).update(module_id=instance.module_id, order=instance.order)
+        return item
+
+    previous_course_id, previous_position = item.course_id, item.position
+    with transaction.atomic():
+        item.position = _next_position(course_id)
+        item.course_id, item.module_id, item.order = course_id, instance.module_id, instance.order
+        item.save(update_fields=['course', 'module', 'order', 'position'])
+
+        student_ids = []
+        for completion in CourseCompletion.objects.select_for_update().filter(course_id=previous_course_id):
+            bitset = CompletionBitset.from_bytes(completion.bits)
+            if previous_position in bitset:
+                bitset.discard(previous_position)
+                completion.bits = bitset.to_bytes()
+                completion.save(update_fields=['bits', 'updated_at'])
+                student_ids.append(completion.student_id)
+        for student_id in student_ids:
+            completion, _ = CourseCompletion.objects.select_for_update().get_or_create(
+                student_id=student_id, course_id=course_id
+            )
+            bitset = CompletionBitset.from_bytes(completion.bits)
+            bitset.add(item.position)
+            completion.bits = bitset.to_bytes()
+            completion.save(update_fields=['bits', 'updated_at'])
+    ContentIndex.invalidate(previous_course_id)
+    ContentIndex.invalidate(course_id)
+    return item
+
+
+def deactivate_content(instance):
+    """
+    Retire the position of deleted content without freeing it for reuse.
+    """
+    items = ContentItem.objects.filter(kind=content_kind(type(instance)), object_id=instance.pk)
+    course_ids = list(items.values_list('course_id', flat=True))
+    items.update(is_active=False)
+    for course_id in course_ids:
+        ContentIndex.invalidate(course_id)
+
+
+def get_bitset(student, course_id):
+    bits = CourseCompletion.objects.filter(student=student, course_id=course_id).values_list(
+        'bits', flat=True
+    ).first()
+    return CompletionBitset.from_bytes(bits)
+
+
+def completed_ids(student, course_id):
+    """
+    Return the IDs of a student's completed items in a course, keyed by kind.
+    """
+    return ContentIndex.get(course_id).completed_ids(get_bitset(student, course_id))
+
+
+def course_bitsets(course, students=None):
+    """
+    Yield the completion bitset of every (or every given) student in a course.
+    """
+    completions = CourseCompletion.objects.filter(course=course)
+    if students is not None:
+        completions = completions.filter(student__in=students)
+    for bits in completions.values_list('bits', flat=True).iterator():
+        yield CompletionBitset.from_bytes(bits)
+
+
+def completed_by_any(course, students=None):
+    """
+    Return the content completed by at least one of the students, keyed by kind.
+    """
+    return ContentIndex.get(course.id).completed_ids(CompletionBitset.union(course_bitsets(course, students)))
+
+
+def completed_by_all(course, students=None):
+    """
+    Return the content completed by every one of the students, keyed by kind.
+    """
+    return ContentIndex.get(course.id).completed_ids(
+        CompletionBitset.intersection(course_bitsets(course, students))
+    )
+
+
+def completed_student_ids(instance, course_id):
+    """
+    Return the IDs of the students whose course bitmap includes the content.
+    """
+    position = ContentIndex.get(course_id).position(content_kind(type(instance)), instance.pk)
+    if position is None:
+        return []
+    return [
+        student_id
+        for student_id, bits in CourseCompletion.objects.filter(course_id=course_id).values_list(
+            'student_id', 'bits'
+        ).iterator()
+        if position in CompletionBitset.from_bytes(bits)
+    ]
+
+
+def discount_deleted_content(instance):
+    """
+    Decrement the completed counters of Progress rows whose bitmap includes deleted content.
+    """
+    course_id = Module.objects.filter(pk=instance.module_id).values_list('course_id', flat=True).first()
+    if course_id is None:
+        return
+    student_ids = completed_student_ids(instance, course_id)
+    if not student_ids:
+        return
+    Progress.objects.filter(
+        student_id__in=student_ids,
+        module_id=instance.module_id,
+        items_completed__gt=0
+    ).update(items_completed=F('items_completed') - 1)
+
+
+class BitmapCompletionManager:
+    """
+    Adapter giving a Progress row's completed lessons, videos or quizzes the
+    ManyToMany manager API, backed by the student's course bitmap.
+    """
+
+    def __init__(self, progress, model):
+        self.progress = progress
+        self.model = model
+        self.kind = content_kind(model)
+
+    def _object_ids(self, objs):
+        return [obj.pk if isinstance(obj, self.model) else obj for obj in objs]
+
+    def _module_ids(self):
+        return set(self.model.objects.filter(module_id=self.progress.module_id).values_list('pk', flat=True))
+
+    def _positions(self, object_ids, register=False):
+        """
+        Map content IDs to bit positions. Content the cached index does not
+        know is looked up in the registry itself; with register, content of
+        this course that is still missing is registered, and content of any
+        other course raises ValueError rather than being dropped.
+        """
+        course_id = self.progress.course_id
+        index = ContentIndex.get(course_id)
+        missing = [object_id for object_id in object_ids if index.position(self.kind, object_id) is None]
+        if missing:
+            # Registered by another process, or moved here, since the index was cached
+            ContentIndex.invalidate(course_id)
+            index = ContentIndex.get(course_id)
+            missing = [object_id for object_id in missing if index.position(self.kind, object_id) is None]
+        if missing and register:
+            for instance in self.model.objects.filter(pk__in=missing, module__course_id=course_id):
+                sync_content(instance)
+            index = ContentIndex.get(course_id)
+            missing = [object_id for object_id in missing if index.position(self.kind, object_id) is None]
+            if missing:
+                raise ValueError(
+                    f"{self.kind.capitalize()} {', '.join(map(str, missing))} is not content of course {course_id}."
+                )
+        positions = (index.position(self.kind, object_id) for object_id in object_ids)
+        return [position for position in positions if position is not None]
+
+    def _change(self, apply):
+        """Apply a change to the stored bitset and return the number of bits changed."""
+        with transaction.atomic():
+            completion, _ = CourseCompletion.objects.select_for_update().get_or_create(
+                student_id=self.progress.student_id,
+                course_id=self.progress.course_id
+            )
+            bitset = CompletionBitset.from_bytes(completion.bits)
+            changed = apply(bitset)
+            if changed:
+                completion.bits = bitset.to_bytes()
+                completion.save(update_fields=['bits', 'updated_at'])
+        return changed
+
+    def _adjust_counter(self, delta):
+        if delta:
+            Progress.objects.filter(pk=self.progress.pk).update(items_completed=F('items_completed') + delta)
+            self.progress.items_completed += delta
+            CourseProgressSummary.objects.record_completions(
+                self.progress.student_id, self.progress.course_id, delta
+            )
+
+    def get_ids(self):
+        ids = completed_ids(self.progress.student_id, self.progress.course_id)[self.kind]
+        return ids & self._module_ids()
+
+    def all(self):
+        ids = completed_ids(self.progress.student_id, self.progress.course_id)[self.kind]
+        return self.model.objects.filter(module_id=self.progress.module_id, pk__in=ids)
+
+    def __getattr__(self, name):
+        # filter(), values_list(), exists() and friends come from the queryset
+        return getattr(self.all(), name)
+
+    def count(self):
+        return len(self.get_ids())
+
+    def add(self, *objs):
+        positions = self._positions(self._object_ids(objs), register=True)
+        self._adjust_counter(self._change(lambda bitset: bitset.update(positions)))
+
+    def remove(self, *objs):
+        positions = self._positions(self._object_ids(objs))
+        self._adjust_counter(-self._change(lambda bitset: bitset.difference_update(positions)))
+
+    def clear(self):
+        positions = self._positions(self._module_ids())
+        self._adjust_counter(-self._change(lambda bitset: bitset.difference_update(positions)))
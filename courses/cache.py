@@ -0,0 +1,96 @@
+"""
+Versioned caching helpers.
+
+Cached values are stored under a key that embeds a per-object version
+counter. Bumping the version makes every earlier entry unreachable, so
+writers never have to know which cached values depend on an object.
+
+The counters live in the cache itself, so with a per-process backend
+(LocMemCache) a bump only reaches the process that made the edit. There,
+values are kept for COURSE_OUTLINE_LOCAL_CACHE_TIMEOUT seconds at most,
+and values that must never be stale, such as answer keys, are not cached.
+"""
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+
+
+# Backends whose entries are only visible to the process that wrote them
+PROCESS_LOCAL_CACHE_BACKENDS = (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
+
+
+def get_cache_alias():
+    return getattr(settings, 'COURSE_OUTLINE_CACHE', 'default')
+
+
+def get_cache():
+    return caches[get_cache_alias()]
+
+
+def is_shared_cache(alias):
+    """
+    Whether a cache alias is shared by every process, and so can hold
+    buffered writes that another process flushes and see its invalidations.
+    """
+    return settings.CACHES[alias]['BACKEND'] not in PROCESS_LOCAL_CACHE_BACKENDS
+
+
+def _version_key(namespace, object_id):
+    return f'{namespace}:{object_id}:version'
+
+
+def get_version(namespace, object_id):
+    """
+    Return the current version of an object, initialising it if missing.
+    """
+    cache = get_cache()
+    key = _version_key(namespace, object_id)
+    version = cache.get(key)
+    if version is None:
+        # Seed from the clock so an evicted counter never reuses an old version
+        cache.add(key, int(time.time() * 1000), None)
+        version = cache.get(key)
+    return version
+
+
+def bump_version(namespace, object_id):
+    """
+    Invalidate every cached value for an object by moving to a new version.
+    """
+    cache = get_cache()
+    key = _version_key(namespace, object_id)
+    try:
+        return cache.incr(key)
+    except ValueError:
+        # No counter yet, so nothing can have been cached against it
+        return get_version(namespace, object_id)
+
+
+def versioned_key(namespace, object_id):
+    return f'{namespace}:{object_id}:v{get_version(namespace, object_id)}'
+
+
+def get_or_build(namespace, object_id, builder, timeout=None, shared_only=False):
+    """
+    Return the cached value for an object, building and storing it on a miss.
+    With shared_only the value is built on every call unless the cache is
+    shared, for values that other processes' edits must invalidate at once.
+    """
+    shared = is_shared_cache(get_cache_alias())
+    if shared_only and not shared:
+        return builder()
+    cache = get_cache()
+    key = versioned_key(namespace, object_id)
+    value = cache.get(key)
+    if value is None:
+        value = builder()
+        if timeout is None:
+            timeout = getattr(settings, 'COURSE_OUTLINE_CACHE_TIMEOUT', 60 * 60 * 24)
+        if not shared:
+            timeout = min(timeout, getattr(settings, 'COURSE_OUTLINE_LOCAL_CACHE_TIMEOUT', 10))
+        cache.set(key, value, timeout)
+    return value
@@ -0,0 +1,328 @@
+"""
+Content completion.
+
+complete_item() is the single write path for a student completing a
+lesson, video, quiz or module: it updates Progress, appends a
+CompletionEvent and records any points in the ledger. replay_events()
+rebuilds Progress, the course roll-ups and completion points from that
+log in one streaming, chunked pass.
+"""
+from collections import Counter, defaultdict
+from itertools import groupby
+
+from django.contrib.auth import get_user_model
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F
+
+from gamification.models import PointsTransaction
+from gamification.points import award_points, refresh_totals
+from gamification.rules import has_rules, record_event
+from . import bitmaps
+from .models import (
+    Lesson, Video, Quiz, Progress, CourseProgressSummary, CourseCompletion, CompletionEvent
+)
+
+
+# Progress relation holding each kind of completed content
+COMPLETION_FIELDS = {
+    'lesson': 'completed_lessons',
+    'video': 'completed_videos',
+    'quiz': 'completed_quizzes',
+}
+
+CONTENT_MODELS = {
+    'lesson': Lesson,
+    'video': Video,
+    'quiz': Quiz,
+}
+
+
+def quiz_completion_points(percentage_score):
+    """
+    Points for passing a quiz: a base amount plus a bonus based on the score.
+    """
+    return 25 + int(percentage_score / 4)
+
+
+def complete_item(student, item, points=0, description=None):
+    """
+    Record that a student completed a lesson, video, quiz or module.
+
+    Returns the new CompletionEvent, or None if the item was already
+    completed, in which case nothing is written and no points are awarded.
+    """
+    kind = item._meta.model_name
+    module = item if kind == 'module' else item.module
+    course = module.course
+
+    with transaction.atomic():
+        if kind == 'module':
+            # Module completions have no join row to collide on, so concurrent ones queue on the student
+            get_user_model().objects.select_for_update().filter(pk=student.pk).exists()
+            if CompletionEvent.objects.filter(student=student, kind=kind, object_id=item.pk).exists():
+                return None
+        else:
+            progress = Progress.objects.for_module(student, course, module)
+            if getattr(progress, COMPLETION_FIELDS[kind]).filter(pk=item.pk).exists():
+                return None
+            if progress.pk is None:
+                progress = progress.materialize()
+            # The completion handlers only count rows this add inserted, so an
+            # unchanged counter means a concurrent request completed it first
+            completed_before = progress.items_completed
+            try:
+                with transaction.atomic():
+                    getattr(progress, COMPLETION_FIELDS[kind]).add(item)
+            except IntegrityError:
+                return None
+            if progress.items_completed == completed_before:
+                return None
+
+        points_transaction = None
+        if points:
+            points_transaction = award_points(student, points, description or f"Completed {kind}: {item.title}")
+
+        event = CompletionEvent.objects.create(
+            student=student,
+            course=course,
+            module=module,
+            kind=kind,
+            object_id=item.pk,
+            points=points,
+            points_transaction=points_transaction
+        )
+        record_badge_events(student, kind, course, module)
+        return event
+
+
+def record_badge_events(student, kind, course, module):
+    """
+    Feed a new completion to the badge rules: lessons count as they are
+    completed, and a module once its last item is.
+    """
+    if kind == 'lesson':
+        record_event(student, 'lesson_completion', course_id=course.pk, module_id=module.pk)
+    if kind != 'module' and has_rules('module_completion') and Progress.objects.filter(
+        student=student, module=module, items_total__gt=0, items_completed=F('items_total')
+    ).exists():
+        record_event(student, 'module_completion', course_id=course.pk, module_id=module.pk)
+
+
+def _module_totals():
+    totals = Counter()
+    for model in CONTENT_MODELS.values():
+        for module_id, count in model.objects.values_list('module_id').annotate(n=Count('id')).order_by():
+            totals[module_id] += count
+    return totals
+
+
+def _course_totals():
+    totals = Counter()
+    for model in CONTENT_MODELS.values():
+        for course_id, count in model.objects.values_list('module__course_id').annotate(n=Count('id')).order_by():
+            totals[course_id] += count
+    return totals
+
+
+class _ReplayState:
+    """
+    Completions of one student in one course, accumulated from the log.
+    """
+
+    def __init__(self, student_id, course_id):
+        self.student_id = student_id
+        self.course_id = course_id
+        self.completed = {kind: set() for kind in COMPLETION_FIELDS}
+        self.unbooked_points = []
+        self.last_activity = None
+
+    def apply(self, event_id, kind, object_id, points, points_transaction_id, timestamp):
+        if kind in self.completed:
+            self.completed[kind].add(object_id)
+        if points and points_transaction_id is None:
+            self.unbooked_points.append((event_id, kind, object_id, points))
+        if self.last_activity is None or timestamp > self.last_activity:
+            self.last_activity = timestamp
+
+
+def replay_events(course_ids=None, student_ids=None, chunk_size=500, stdout=None):
+    """
+    Rebuild completion state from the CompletionEvent log.
+
+    Events are streamed in (student, course) order and applied in chunks of
+    `chunk_size` student/course pairs, so memory stays bounded and no
+    per-user scans are needed. Returns the number of pairs rebuilt.
+    """
+    events = CompletionEvent.objects.order_by('student_id', 'course_id', 'id')
+    if course_ids:
+        events = events.filter(course_id__in=course_ids)
+    if student_ids:
+        events = events.filter(student_id__in=student_ids)
+    rows = events.values_list(
+        'student_id', 'course_id', 'id', 'kind', 'object_id', 'points',
+        'points_transaction_id', 'timestamp'
+    ).iterator(chunk_size=2000)
+
+    module_totals = _module_totals()
+    course_totals = _course_totals()
+
+    rebuilt = 0
+    batch = []
+    for (student_id, course_id), group in groupby(rows, key=lambda row: row[:2]):
+        state = _ReplayState(student_id, course_id)
+        for row in group:
+            state.apply(*row[2:])
+        batch.append(state)
+        if len(batch) >= chunk_size:
+            _apply_batch(batch, module_totals, course_totals)
+            rebuilt += len(batch)
+            batch = []
+            if stdout:
+                stdout.write(f'{rebuilt} student/course pairs rebuilt')
+    if batch:
+        _apply_batch(batch, module_totals, course_totals)
+        rebuilt += len(batch)
+    return rebuilt
+
+
+@transaction.atomic
+def _apply_batch(batch, module_totals, course_totals):
+    """
+    Write the rebuilt state of a chunk of student/course pairs.
+    """
+    pairs = {(state.student_id, state.course_id): state for state in batch}
+    student_ids = {state.student_id for state in batch}
+    course_ids = {state.course_id for state in batch}
+
+    # Current module of every logged item that still exists
+    item_modules = {}
+    for kind, model in CONTENT_MODELS.items():
+        ids = set().union(*(state.completed[kind] for state in batch))
+        for object_id, module_id in model.objects.filter(pk__in=ids).values_list('id', 'module_id'):
+            item_modules[(kind, object_id)] = module_id
+
+    # Completed items per Progress row, keyed by (student, course, module)
+    per_module = defaultdict(lambda: {kind: set() for kind in COMPLETION_FIELDS})
+    for state in batch:
+        for kind, object_ids in state.completed.items():
+            for object_id in object_ids:
+                module_id = item_modules.get((kind, object_id))
+                if module_id is not None:
+                    per_module[(state.student_id, state.course_id, module_id)][kind].add(object_id)
+
+    progress_rows = {
+        (p.student_id, p.course_id, p.module_id): p
+        for p in Progress.objects.filter(student_id__in=student_ids, course_id__in=course_ids)
+        if (p.student_id, p.course_id) in pairs
+    }
+    missing = [
+        Progress(student_id=student_id, course_id=course_id, module_id=module_id,
+                 items_total=module_totals[module_id])
+        for (student_id, course_id, module_id) in per_module
+        if (student_id, course_id, module_id) not in progress_rows
+    ]
+    if missing:
+        Progress.objects.bulk_create(missing)
+        progress_rows.update({
+            (p.student_id, p.course_id, p.module_id): p
+            for p in Progress.objects.filter(
+                student_id__in=student_ids, course_id__in=course_ids,
+                module_id__in={p.module_id for p in missing}
+            )
+            if (p.student_id, p.course_id) in pairs
+        })
+
+    # Completion sets, written without m2m signals
+    if bitmaps.bitmap_storage_enabled():
+        completions = []
+        for state in batch:
+            index = bitmaps.ContentIndex.get(state.course_id)
+            bitset = bitmaps.CompletionBitset.from_positions(
+                index.position(kind, object_id)
+                for kind, object_ids in state.completed.items()
+                for object_id in object_ids
+                if index.position(kind, object_id) is not None
+            )
+            completions.append(CourseCompletion(
+                student_id=state.student_id, course_id=state.course_id, bits=bitset.to_bytes()
+            ))
+        CourseCompletion.objects.bulk_create(
+            completions, update_conflicts=True, unique_fields=['student', 'course'], update_fields=['bits']
+        )
+    else:
+        progress_ids = [p.pk for p in progress_rows.values()]
+        for kind, field in COMPLETION_FIELDS.items():
+            through = getattr(Progress, field).through
+            through.objects.filter(progress_id__in=progress_ids).delete()
+            through.objects.bulk_create([
+                through(**{'progress_id': progress_rows[key].pk, f'{kind}_id': object_id})
+                for key, completed in per_module.items()
+                for object_id in completed[kind]
+            ])
+
+    # Progress counters
+    for key, progress in progress_rows.items():
+        progress.items_total = module_totals[progress.module_id]
+        progress.items_completed = sum(len(ids) for ids in per_module[key].values()) if key in per_module else 0
+    Progress.objects.bulk_update(progress_rows.values(), ['items_total', 'items_completed'], batch_size=1000)
+
+    # Course roll-ups
+    completed_by_pair = Counter()
+    for (student_id, course_id, _module_id), completed in per_module.items():
+        completed_by_pair[(student_id, course_id)] += sum(len(ids) for ids in completed.values())
+    summaries = [
+        summary for summary in CourseProgressSummary.objects.filter(
+            enrollment__student_id__in=student_ids, enrollment__course_id__in=course_ids
+        ).select_related('enrollment')
+        if (summary.enrollment.student_id, summary.enrollment.course_id) in pairs
+    ]
+    finished = []
+    for summary in summaries:
+        key = (summary.enrollment.student_id, summary.enrollment.course_id)
+        summary.items_total = course_totals[key[1]]
+        summary.items_completed = completed_by_pair[key]
+        summary.percentage = summary.calculate_percentage()
+        summary.last_activity = pairs[key].last_activity
+        if summary.percentage >= 100 and summary.enrollment.status == 'enrolled':
+            finished.append(summary.enrollment)
+    CourseProgressSummary.objects.bulk_update(
+        summaries, ['items_total', 'items_completed', 'percentage', 'last_activity'], batch_size=1000
+    )
+    for enrollment in finished:
+        enrollment.status = 'completed'
+        enrollment.save()
+
+    # Points from events that never reached the ledger
+    _book_missing_points(batch)
+
+
+def _book_missing_points(batch):
+    """
+    Create ledger entries for logged points that have none, then recompute
+    the affected users' totals from the ledger.
+    """
+    unbooked = [(state.student_id, entry) for state in batch for entry in state.unbooked_points]
+    if not unbooked:
+        return
+
+    transactions = PointsTransaction.objects.bulk_create([
+        PointsTransaction(
+            user_id=student_id,
+            points=points,
+            transaction_type='earned',
+            description=f"Completed {kind} {object_id} (replayed)"
+        )
+        for student_id, (_event_id, kind, object_id, points) in unbooked
+    ])
+    CompletionEvent.objects.bulk_update(
+        [
+            CompletionEvent(pk=event_id, points_transaction_id=points_transaction.pk)
+            for (_student_id, (event_id, *_rest)), points_transaction in zip(unbooked, transactions)
+            if points_transaction.pk is not None
+        ],
+        ['points_transaction'],
+        batch_size=1000
+    )
+
+    user_ids = {student_id for student_id, _entry in unbooked}
+    refresh_totals(user_ids)
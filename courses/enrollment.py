@@ -0,0 +1,72 @@
+"""
+Enrollment service.
+
+Enrolls one or many students in a course with a fixed number of bulk
+queries: enrollments and points are written in batches, and badge
+evaluation runs once per student after the transaction commits instead of
+from every row's post_save. Progress rows are not created up front; see
+ProgressQuerySet.for_module.
+"""
+from django.db import transaction
+
+from gamification.points import award_points_to_users
+from gamification.utils import evaluate_badges_for_users
+from .models import Enrollment, CourseProgressSummary
+
+
+ENROLLMENT_POINTS = 50
+BATCH_SIZE = 1000
+
+
+def chunked(items, size):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def enroll_students(course, students, points=ENROLLMENT_POINTS, batch_size=BATCH_SIZE):
+    """
+    Enroll students (users or user IDs) in a course and return the new
+    Enrollment objects. Students who are already enrolled, and the course
+    instructor, are skipped.
+    """
+    student_ids = list(dict.fromkeys(getattr(student, 'pk', student) for student in students))
+
+    with transaction.atomic():
+        already_enrolled = set()
+        for chunk in chunked(student_ids, batch_size):
+            already_enrolled.update(
+                Enrollment.objects.filter(course=course, student_id__in=chunk).values_list('student_id', flat=True)
+            )
+        new_ids = [
+            student_id for student_id in student_ids
+            if student_id not in already_enrolled and student_id != course.instructor_id
+        ]
+        if not new_ids:
+            return []
+
+        enrollments = Enrollment.objects.bulk_create(
+            [Enrollment(student_id=student_id, course=course, status='enrolled') for student_id in new_ids],
+            batch_size=batch_size
+        )
+
+        if any(enrollment.pk is None for enrollment in enrollments):
+            # Backends that cannot return IDs from bulk inserts
+            enrollments = [
+                enrollment
+                for chunk in chunked(new_ids, batch_size)
+                for enrollment in Enrollment.objects.filter(course=course, student_id__in=chunk)
+            ]
+
+        # bulk_create skips the Enrollment post_save that starts each roll-up
+        items_total = course.total_items
+        CourseProgressSummary.objects.bulk_create(
+            [CourseProgressSummary(enrollment=enrollment, items_total=items_total) for enrollment in enrollments],
+            batch_size=batch_size
+        )
+
+        if points:
+            award_points_to_users(new_ids, points, f"Enrolled in course: {course.title}", batch_size=batch_size)
+
+        transaction.on_commit(lambda: evaluate_badges_for_users(new_ids))
+
+    return enrollments
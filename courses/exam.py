@@ -0,0 +1,162 @@
+"""
+Exam-mode quiz submission.
+
+When a whole class submits the same quiz at once, the side effects of each
+submission (Progress updates, points, streaks, achievements and badges)
+contend for the same rows. In exam mode a submission only writes the
+graded QuizAttempt and a QuizSubmissionTask in one short transaction,
+without sending post_save (record_attempt, submit_attempt); the
+side effects are applied later by run_submission_worker, which drains the
+task table. Any number of workers can run at once: each task is claimed
+with a conditional UPDATE, so it is processed exactly once.
+"""
+import traceback
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django.db.models.signals import post_save
+from django.utils import timezone
+
+from .completion import complete_item, quiz_completion_points
+from .models import QuizAttempt, QuizSubmissionTask
+
+
+def exam_mode_enabled():
+    return getattr(settings, 'QUIZ_EXAM_MODE', False)
+
+
+def record_attempt(user, quiz, grade):
+    """
+    Store a graded submission and queue its side effects.
+
+    The attempt is inserted with bulk_create so its post_save receivers do
+    not run on the request; the worker sends post_save for it instead.
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        attempt, = QuizAttempt.objects.bulk_create([
+            QuizAttempt(
+                user=user,
+                quiz=quiz,
+                score=grade.score,
+                max_score=grade.max_score,
+                completed=True,
+                completed_at=now,
+                passed=grade.percentage >= quiz.passing_score
+            )
+        ])
+        if attempt.pk is None:
+            # Backends that cannot return IDs from bulk inserts
+            attempt = QuizAttempt.objects.filter(user=user, quiz=quiz, completed_at=now).latest('id')
+        QuizSubmissionTask.objects.create(attempt=attempt, replay_post_save=True)
+    return attempt
+
+
+def submit_attempt(attempt):
+    """
+    Complete an in-progress attempt, whose score, max_score and passed are
+    already set on the instance, and queue its side effects.
+
+    The attempt is completed with an UPDATE so its post_save receivers do
+    not run on the request; the worker sends post_save for it instead.
+    Returns the task, or None if the attempt was already completed.
+    """
+    attempt.completed = True
+    attempt.completed_at = timezone.now()
+    with transaction.atomic():
+        if not QuizAttempt.objects.filter(pk=attempt.pk, completed=False).update(
+            score=attempt.score,
+            max_score=attempt.max_score,
+            completed=True,
+            completed_at=attempt.completed_at,
+            passed=attempt.passed
+        ):
+            return None
+        return QuizSubmissionTask.objects.create(attempt=attempt, replay_post_save=True)
+
+
+def apply_attempt_effects(attempt, replay_post_save=False):
+    """
+    Apply the side effects of a submitted attempt: the post_save receivers
+    skipped at submission time, and completing the quiz if it was passed.
+    """
+    if replay_post_save:
+        post_save.send(
+            sender=QuizAttempt, instance=attempt, created=True, update_fields=None, raw=False,
+            using=attempt._state.db
+        )
+    if attempt.passed:
+        return complete_item(attempt.user, attempt.quiz, points=quiz_completion_points(attempt.score_percentage))
+    return None
+
+
+def claim_tasks(limit, exclude=()):
+    """
+    Claim up to `limit` pending tasks for this worker and return their IDs.
+    """
+    claimed = []
+    candidates = QuizSubmissionTask.objects.filter(status='pending').exclude(pk__in=exclude).order_by(
+        'id'
+    ).values_list('id', flat=True)
+    for task_id in candidates[:limit]:
+        # Only one worker's UPDATE can move a task out of 'pending'
+        if QuizSubmissionTask.objects.filter(pk=task_id, status='pending').update(
+            status='processing', claimed_at=timezone.now()
+        ):
+            claimed.append(task_id)
+    return claimed
+
+
+def process_task(task_id):
+    """
+    Apply one claimed task. Failures are retried up to QUIZ_SUBMISSION_MAX_TRIES.
+    """
+    task = QuizSubmissionTask.objects.select_related('attempt__user', 'attempt__quiz__module__course').get(pk=task_id)
+    try:
+        with transaction.atomic():
+            apply_attempt_effects(task.attempt, task.replay_post_save)
+            QuizSubmissionTask.objects.filter(pk=task.pk).update(
+                status='done', tries=F('tries') + 1, processed_at=timezone.now(), last_error=''
+            )
+        return True
+    except Exception:
+        tries = task.tries + 1
+        QuizSubmissionTask.objects.filter(pk=task.pk).update(
+            status='failed' if tries >= getattr(settings, 'QUIZ_SUBMISSION_MAX_TRIES', 5) else 'pending',
+            tries=tries,
+            last_error=traceback.format_exc()
+        )
+        return False
+
+
+def requeue_stale(older_than=timedelta(minutes=10)):
+    """
+    Return tasks claimed by a worker that died before finishing to the queue.
+    """
+    return QuizSubmissionTask.objects.filter(
+        status='processing', claimed_at__lt=timezone.now() - older_than
+    ).update(status='pending')
+
+
+def drain(batch_size=100, limit=None):
+    """
+    Process pending tasks until the queue is empty or `limit` tasks were
+    handled. Returns (processed, failed).
+    """
+    processed = failed = 0
+    # Tasks that failed in this pass wait for the next one
+    seen = set()
+    while limit is None or processed + failed < limit:
+        size = batch_size if limit is None else min(batch_size, limit - processed - failed)
+        task_ids = claim_tasks(size, exclude=seen)
+        if not task_ids:
+            break
+        seen.update(task_ids)
+        for task_id in task_ids:
+            if process_task(task_id):
+                processed += 1
+            else:
+                failed += 1
+    return processed, failed
@@ -0,0 +1,35 @@
+"""
+Custom model fields for the courses app.
+"""
+from django.conf import settings
+from django.db import models
+from django.db.models.fields.related_descriptors import ManyToManyDescriptor
+
+
+class CompletionDescriptor(ManyToManyDescriptor):
+    """
+    Return the bitmap-backed adapter instead of the M2M manager when
+    COMPLETION_STORAGE is 'bitmap'.
+    """
+
+    def __get__(self, instance, cls=None):
+        if instance is not None and getattr(settings, 'COMPLETION_STORAGE', 'm2m') == 'bitmap':
+            from .bitmaps import BitmapCompletionManager
+            return BitmapCompletionManager(instance, self.field.related_model)
+        return super().__get__(instance, cls)
+
+
+class CompletionManyToManyField(models.ManyToManyField):
+    """
+    ManyToManyField for Progress completion sets that can be served from
+    the per-course completion bitmap instead of the join table.
+    """
+
+    def contribute_to_class(self, cls, name, **kwargs):
+        super().contribute_to_class(cls, name, **kwargs)
+        setattr(cls, self.name, CompletionDescriptor(self.remote_field, reverse=False))
+
+    def deconstruct(self):
+        # The column layout is that of a plain ManyToManyField
+        name, path, args, kwargs = super().deconstruct()
+        return name, 'django.db.models.ManyToManyField', args, kwargs
@@ -0,0 +1,185 @@
+"""
+Compiled quiz answer keys.
+
+An AnswerKey holds everything needed to grade a quiz: each question's type,
+points, correct answer IDs and normalized accepted short answers. It is
+built with two queries, cached per quiz and invalidated whenever a question
+or answer changes, so grading a submission is a pure in-memory pass.
+save_responses() then stores the graded answers of an attempt in one bulk
+upsert.
+"""
+from .cache import get_or_build, bump_version
+from .models import Question, Answer, QuizAnswer
+
+
+ANSWER_KEY_CACHE_NAMESPACE = 'answer_key'
+
+
+def normalize_answer(text):
+    """Case- and whitespace-insensitive form of a short answer."""
+    return ' '.join(str(text).split()).lower()
+
+
+class QuestionKey:
+    """
+    The grading rule for one question.
+    """
+    __slots__ = ('id', 'question_type', 'points', 'answer_ids', 'correct_ids', 'accepted_answers')
+
+    def __init__(self, id, question_type, points):
+        self.id = id
+        self.question_type = question_type
+        self.points = points
+        # Every answer of the question, so submitted IDs from other questions are rejected
+        self.answer_ids = set()
+        self.correct_ids = set()
+        self.accepted_answers = set()
+
+    def __repr__(self):
+        return f"<QuestionKey {self.id}: {self.question_type}>"
+
+    def add_answer(self, answer_id, text, is_correct):
+        self.answer_ids.add(answer_id)
+        if is_correct:
+            self.correct_ids.add(answer_id)
+            self.accepted_answers.add(normalize_answer(text))
+
+    def check(self, value):
+        """
+        Grade a submitted value: an answer ID, or the text of a short answer.
+
+        Returns (is_correct, answer_id), where answer_id is the chosen answer
+        if it belongs to this question and None otherwise.
+        """
+        if value in (None, ''):
+            return False, None
+        if self.question_type == 'short_answer':
+            return normalize_answer(value) in self.accepted_answers, None
+        try:
+            answer_id = int(value)
+        except (TypeError, ValueError):
+            return False, None
+        if answer_id not in self.answer_ids:
+            return False, None
+        return answer_id in self.correct_ids, answer_id
+
+
+class QuizGrade:
+    """
+    The result of grading one submission against an AnswerKey.
+    """
+
+    def __init__(self, score, max_score, responses):
+        self.score = score
+        self.max_score = max_score
+        # (question_id, answer_id, is_correct) for every answered question
+        self.responses = responses
+
+    @property
+    def percentage(self):
+        return (self.score / self.max_score * 100) if self.max_score > 0 else 0
+
+    @property
+    def correct_count(self):
+        return sum(1 for _question_id, _answer_id, is_correct in self.responses if is_correct)
+
+
+class AnswerKey:
+    """
+    The compiled answer key of a quiz.
+    """
+
+    def __init__(self, quiz_id, questions):
+        self.quiz_id = quiz_id
+        # Question ID -> QuestionKey, in question order
+        self.questions = {question.id: question for question in questions}
+
+    def __len__(self):
+        return len(self.questions)
+
+    @classmethod
+    def build(cls, quiz_id):
+        """
+        Compile the key of a quiz: one query for questions and one for answers.
+        """
+        questions = [
+            QuestionKey(question_id, question_type, points)
+            for question_id, question_type, points in Question.objects.filter(quiz_id=quiz_id).order_by(
+                'order', 'id'
+            ).values_list('id', 'question_type', 'points')
+        ]
+        questions_by_id = {question.id: question for question in questions}
+        answers = Answer.objects.filter(question__quiz_id=quiz_id).values_list(
+            'id', 'question_id', 'text', 'is_correct'
+        )
+        for answer_id, question_id, text, is_correct in answers:
+            questions_by_id[question_id].add_answer(answer_id, text, is_correct)
+        return cls(quiz_id, questions)
+
+    @classmethod
+    def get(cls, quiz_id):
+        """
+        Return the cached key of a quiz, compiling it on a miss. Keys are
+        only cached in a shared cache, since grading against a key that an
+        edit in another process has outdated would give wrong scores.
+        """
+        return get_or_build(ANSWER_KEY_CACHE_NAMESPACE, quiz_id, lambda: cls.build(quiz_id), shared_only=True)
+
+    @classmethod
+    def compose(cls, questions):
+        """
+        Return a key for questions drawn from several quizzes, given as
+        (question ID, quiz ID) pairs, from the cached keys of their quizzes.
+        Questions that no longer exist are left out.
+        """
+        quiz_keys = {}
+        picked = []
+        for question_id, quiz_id in questions:
+            if quiz_id not in quiz_keys:
+                quiz_keys[quiz_id] = cls.get(quiz_id)
+            question = quiz_keys[quiz_id].questions.get(question_id)
+            if question is not None:
+                picked.append(question)
+        return cls(None, picked)
+
+    @classmethod
+    def invalidate(cls, quiz_id):
+        bump_version(ANSWER_KEY_CACHE_NAMESPACE, quiz_id)
+
+    @property
+    def max_score(self):
+        return sum(question.points for question in self.questions.values())
+
+    def grade(self, submission, prefix='question_'):
+        """
+        Grade a submission mapping '<prefix><question ID>' to an answer ID or
+        short answer text, such as request.POST.
+        """
+        score = 0
+        responses = []
+        for question in self.questions.values():
+            value = submission.get(f'{prefix}{question.id}')
+            if value in (None, ''):
+                continue
+            is_correct, answer_id = question.check(value)
+            if is_correct:
+                score += question.points
+            responses.append((question.id, answer_id, is_correct))
+        return QuizGrade(score, self.max_score, responses)
+
+
+def save_responses(attempt, responses, batch_size=500):
+    """
+    Insert or update the QuizAnswer rows of an attempt from graded responses,
+    keyed on (attempt, question).
+    """
+    return QuizAnswer.objects.bulk_create(
+        [
+            QuizAnswer(quiz_attempt=attempt, question_id=question_id, answer_id=answer_id, is_correct=is_correct)
+            for question_id, answer_id, is_correct in responses
+        ],
+        batch_size=batch_size,
+        update_conflicts=True,
+        unique_fields=['quiz_attempt', 'question'],
+        update_fields=['answer', 'is_correct']
+    )
@@ -0,0 +1,32 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from courses.archive import archive_attempts, archive_horizon
+from courses.models import QuizAttemptSummary
+
+
+class Command(BaseCommand):
+    help = 'Move completed quiz attempts older than the archive horizon out of the live tables'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days', type=int, help='Archive attempts completed this many days ago or earlier '
+            '(default: QUIZ_ATTEMPT_ARCHIVE_AFTER_DAYS)'
+        )
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument('--limit', type=int, help='Stop after archiving this many attempts')
+        parser.add_argument(
+            '--rebuild-summaries', action='store_true',
+            help='Recompute every attempt summary from the live and archived attempts first'
+        )
+
+    def handle(self, *args, **options):
+        if options['rebuild_summaries']:
+            rebuilt = QuizAttemptSummary.objects.rebuild()
+            self.stdout.write(f'Rebuilt {rebuilt} attempt summaries')
+
+        before = timezone.now() - timedelta(days=options['days']) if options['days'] is not None else archive_horizon()
+        archived = archive_attempts(before=before, batch_size=options['batch_size'], limit=options['limit'])
+        self.stdout.write(self.style.SUCCESS(f'Archived {archived} quiz attempts completed before {before:%Y-%m-%d}'))
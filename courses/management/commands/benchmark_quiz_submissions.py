@@ -0,0 +1,153 @@
+import random
+import statistics
+import threading
+import time
+import uuid
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.utils import timezone
+
+from courses.completion import complete_item, quiz_completion_points
+from courses.enrollment import enroll_students
+from courses.exam import submit_attempt, drain
+from courses.grading import AnswerKey
+from courses.models import Course, Module, Quiz, Question, Answer, QuizAttempt
+
+
+class Command(BaseCommand):
+    help = 'Measure quiz submission throughput with N concurrent students, directly and in exam mode'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--submissions', type=int, default=200, help='Number of students submitting')
+        parser.add_argument('--concurrency', type=int, default=20, help='Number of concurrent submitters')
+        parser.add_argument('--questions', type=int, default=20)
+        parser.add_argument('--mode', choices=['direct', 'exam', 'both'], default='both')
+        parser.add_argument('--keep', action='store_true', help='Keep the generated course and students')
+
+    def handle(self, *args, **options):
+        tag = uuid.uuid4().hex[:8]
+        course, quiz = self.create_fixture(tag, options['questions'])
+        answer_key = AnswerKey.get(quiz.id)
+        students = []
+        try:
+            modes = ['direct', 'exam'] if options['mode'] == 'both' else [options['mode']]
+            for mode in modes:
+                # Fresh students per mode, so no mode finds the quiz already completed by another
+                mode_students = self.create_students(course, f'{tag}-{mode}', options['submissions'])
+                students.extend(mode_students)
+                self.run(mode, quiz, answer_key, mode_students, options['concurrency'])
+        finally:
+            if not options['keep']:
+                get_user_model().objects.filter(pk__in=[student.pk for student in students]).delete()
+                instructor = course.instructor
+                course.delete()
+                instructor.delete()
+
+    def create_fixture(self, tag, questions):
+        instructor = get_user_model().objects.create_user(username=f'bench-instructor-{tag}', password=None)
+        course = Course.objects.create(
+            title=f'Submission benchmark {tag}', slug=f'submission-benchmark-{tag}',
+            description='Generated by benchmark_quiz_submissions', instructor=instructor
+        )
+        module = Module.objects.create(course=course, title='Benchmark module', order=1)
+        quiz = Quiz.objects.create(module=module, title='Benchmark quiz', description='Benchmark', passing_score=50)
+        for number in range(questions):
+            question = Question.objects.create(quiz=quiz, text=f'Question {number + 1}', order=number, points=1)
+            Answer.objects.bulk_create([
+                Answer(question=question, text='Right', is_correct=True),
+                Answer(question=question, text='Wrong', is_correct=False),
+            ])
+        return course, quiz
+
+    def create_students(self, course, tag, submissions):
+        # One by one, so the profile, streak and leaderboard signals run as for real students
+        User = get_user_model()
+        students = [
+            User.objects.create_user(username=f'bench-student-{tag}-{number}', password=None)
+            for number in range(submissions)
+        ]
+        enroll_students(course, students, points=0)
+        return students
+
+    def submission(self, answer_key):
+        """A random answer sheet that passes about half the time."""
+        return {
+            f'question_{question.id}': str(random.choice(sorted(question.answer_ids)))
+            for question in answer_key.questions.values()
+        }
+
+    def submit(self, mode, attempt, quiz, grade):
+        # What take_quiz does when the quiz is submitted
+        attempt.score = grade.score
+        attempt.max_score = grade.max_score
+        attempt.passed = grade.percentage >= quiz.passing_score
+        if mode == 'exam':
+            submit_attempt(attempt)
+            return
+        with transaction.atomic():
+            attempt.completed = True
+            attempt.completed_at = timezone.now()
+            attempt.save()
+            if attempt.passed:
+                complete_item(attempt.user, quiz, points=quiz_completion_points(grade.percentage))
+
+    def run(self, mode, quiz, answer_key, students, concurrency):
+        latencies = []
+        errors = []
+        lock = threading.Lock()
+        # Attempts are started when the quiz page is first opened, before the timed submission
+        attempts = [QuizAttempt.objects.create(user=student, quiz=quiz) for student in students]
+        chunks = [attempts[index::concurrency] for index in range(concurrency)]
+
+        def worker(chunk):
+            try:
+                for attempt in chunk:
+                    grade = answer_key.grade(self.submission(answer_key))
+                    started = time.perf_counter()
+                    try:
+                        self.submit(mode, attempt, quiz, grade)
+                    except Exception as error:
+                        with lock:
+                            errors.append(error)
+                        continue
+                    with lock:
+                        latencies.append(time.perf_counter() - started)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=worker, args=(chunk,)) for chunk in chunks if chunk]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+
+        self.report(mode, len(latencies), errors, elapsed, latencies)
+
+        if mode == 'exam':
+            started = time.perf_counter()
+            processed, failed = drain()
+            drain_elapsed = time.perf_counter() - started
+            self.stdout.write(
+                f'  worker: {processed} tasks applied ({failed} failed) in {drain_elapsed:.2f}s, '
+                f'{processed / drain_elapsed if drain_elapsed else 0:.1f}/s'
+            )
+
+    def report(self, mode, completed, errors, elapsed, latencies):
+        self.stdout.write(self.style.MIGRATE_HEADING(f'{mode}:'))
+        self.stdout.write(
+            f'  {completed} submissions in {elapsed:.2f}s, {completed / elapsed if elapsed else 0:.1f}/s, '
+            f'{len(errors)} errors'
+        )
+        if latencies:
+            latencies.sort()
+            p95 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))]
+            self.stdout.write(
+                f'  latency: median {statistics.median(latencies) * 1000:.1f}ms, '
+                f'p95 {p95 * 1000:.1f}ms, max {latencies[-1] * 1000:.1f}ms'
+            )
+        if errors:
+            self.stdout.write(self.style.WARNING(f'  first error: {errors[0]!r}'))
@@ -0,0 +1,45 @@
+from django.core.management.base import BaseCommand
+
+from courses.bitmaps import CompletionBitset, ContentIndex
+from courses.models import Course, CourseCompletion, Progress
+
+
+class Command(BaseCommand):
+    help = 'Build per-course completion bitmaps from the Progress completion tables'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--course', type=int, help='Only rebuild this course ID')
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        courses = Course.objects.all()
+        if options['course']:
+            courses = courses.filter(pk=options['course'])
+
+        for course in courses.iterator():
+            index = ContentIndex.build(course.id)
+            bitsets = {}
+            for kind, field in (('lesson', 'completed_lessons'), ('video', 'completed_videos'), ('quiz', 'completed_quizzes')):
+                through = getattr(Progress, field).through
+                rows = through.objects.filter(progress__course=course).values_list(
+                    'progress__student_id', f'{kind}_id'
+                )
+                for student_id, object_id in rows.iterator():
+                    position = index.position(kind, object_id)
+                    if position is not None:
+                        bitsets.setdefault(student_id, CompletionBitset()).add(position)
+
+            completions = [
+                CourseCompletion(student_id=student_id, course=course, bits=bitset.to_bytes())
+                for student_id, bitset in bitsets.items()
+            ]
+            CourseCompletion.objects.bulk_create(
+                completions,
+                batch_size=options['batch_size'],
+                update_conflicts=True,
+                unique_fields=['student', 'course'],
+                update_fields=['bits']
+            )
+            self.stdout.write(f'{course.title}: {len(completions)} bitmaps')
+
+        self.stdout.write(self.style.SUCCESS('Completion bitmaps built'))
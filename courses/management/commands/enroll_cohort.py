@@ -0,0 +1,51 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from courses.enrollment import ENROLLMENT_POINTS, enroll_students
+from courses.models import Course
+
+
+class Command(BaseCommand):
+    help = 'Enroll a cohort of students in a course in one batch'
+
+    def add_arguments(self, parser):
+        parser.add_argument('course', help='Slug of the course')
+        parser.add_argument('--usernames-file', help='File with one username per line')
+        parser.add_argument('--ids', type=int, nargs='+', help='User IDs to enroll')
+        parser.add_argument('--all-students', action='store_true', help='Enroll every user marked as a student')
+        parser.add_argument('--points', type=int, default=ENROLLMENT_POINTS)
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        User = get_user_model()
+
+        try:
+            course = Course.objects.get(slug=options['course'])
+        except Course.DoesNotExist:
+            raise CommandError(f"Course '{options['course']}' does not exist")
+
+        student_ids = set(options['ids'] or [])
+        if options['usernames_file']:
+            with open(options['usernames_file']) as f:
+                usernames = [line.strip() for line in f if line.strip()]
+            found = dict(User.objects.filter(username__in=usernames).values_list('username', 'pk'))
+            missing = set(usernames) - set(found)
+            if missing:
+                self.stderr.write(f"Unknown usernames skipped: {', '.join(sorted(missing))}")
+            student_ids.update(found.values())
+        if options['all_students']:
+            student_ids.update(User.objects.filter(is_student=True).values_list('pk', flat=True))
+
+        if not student_ids:
+            raise CommandError('No students given; use --ids, --usernames-file or --all-students')
+
+        enrollments = enroll_students(
+            course,
+            sorted(student_ids),
+            points=options['points'],
+            batch_size=options['batch_size']
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f'Enrolled {len(enrollments)} students in {course.title} '
+            f'({len(student_ids) - len(enrollments)} skipped)'
+        ))
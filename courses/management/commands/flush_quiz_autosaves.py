@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from courses.autosave import flush_pending
+
+
+class Command(BaseCommand):
+    help = 'Write autosaved quiz answers still waiting in the cache to the database'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        flushed = flush_pending(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Flushed autosaved answers of {flushed} attempts'))
@@ -0,0 +1,55 @@
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from courses.authoring import apply_questions, read_quiz_file
+from courses.models import Module, Quiz
+
+
+class Command(BaseCommand):
+    help = 'Create or update a quiz and its questions from a JSON or CSV file'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='JSON or CSV file of questions')
+        target = parser.add_mutually_exclusive_group(required=True)
+        target.add_argument('--module', type=int, help='Create a new quiz in this module')
+        target.add_argument('--quiz', type=int, help='Update this existing quiz')
+        parser.add_argument('--title', help='Quiz title (defaults to the file title or name)')
+        parser.add_argument('--replace', action='store_true', help='Delete questions of the quiz not in the file')
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        try:
+            quiz_fields, questions = read_quiz_file(options['path'])
+        except (OSError, ValueError) as error:
+            raise CommandError(str(error))
+        if options['title']:
+            quiz_fields['title'] = options['title']
+
+        try:
+            with transaction.atomic():
+                if options['module']:
+                    try:
+                        module = Module.objects.get(pk=options['module'])
+                    except Module.DoesNotExist:
+                        raise CommandError(f"Module {options['module']} does not exist")
+                    quiz_fields.setdefault('title', os.path.splitext(os.path.basename(options['path']))[0])
+                    quiz_fields.setdefault('description', '')
+                    quiz = Quiz.objects.create(module=module, **quiz_fields)
+                else:
+                    try:
+                        quiz = Quiz.objects.get(pk=options['quiz'])
+                    except Quiz.DoesNotExist:
+                        raise CommandError(f"Quiz {options['quiz']} does not exist")
+                    if quiz_fields:
+                        for field, value in quiz_fields.items():
+                            setattr(quiz, field, value)
+                        quiz.save()
+                result = apply_questions(
+                    quiz, questions, replace=options['replace'], batch_size=options['batch_size']
+                )
+        except ValueError as error:
+            raise CommandError(str(error))
+
+        self.stdout.write(self.style.SUCCESS(f'{quiz.title} (quiz {quiz.pk}): {result}'))
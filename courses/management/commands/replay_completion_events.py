@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+
+from courses.completion import replay_events
+
+
+class Command(BaseCommand):
+    help = 'Rebuild Progress, course roll-ups and completion points from the completion event log'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--course', type=int, nargs='+', help='Only replay these course IDs')
+        parser.add_argument('--student', type=int, nargs='+', help='Only replay these user IDs')
+        parser.add_argument('--chunk-size', type=int, default=500,
+                            help='Student/course pairs written per transaction')
+
+    def handle(self, *args, **options):
+        rebuilt = replay_events(
+            course_ids=options['course'],
+            student_ids=options['student'],
+            chunk_size=options['chunk_size'],
+            stdout=self.stdout
+        )
+        self.stdout.write(self.style.SUCCESS(f'Replayed completion events for {rebuilt} student/course pairs'))
@@ -0,0 +1,29 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from courses.exam import drain, requeue_stale
+
+
+class Command(BaseCommand):
+    help = 'Apply the queued progress and gamification updates of exam-mode quiz submissions'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='Drain the queue once and exit')
+        parser.add_argument('--batch-size', type=int, default=100)
+        parser.add_argument('--sleep', type=float, default=1.0, help='Seconds to wait when the queue is empty')
+
+    def handle(self, *args, **options):
+        while True:
+            requeued = requeue_stale()
+            if requeued:
+                self.stdout.write(f'Requeued {requeued} stale tasks')
+
+            processed, failed = drain(batch_size=options['batch_size'])
+            if processed or failed:
+                self.stdout.write(f'Processed {processed} submissions, {failed} failed')
+
+            if options['once']:
+                break
+            if not processed and not failed:
+                time.sleep(options['sleep'])
@@ -0,0 +1,56 @@
+# Generated by Django 4.2.7 on 2026-10-18 02:33
+
+from collections import Counter
+
+from django.db import migrations, models
+
+
+def backfill_progress_counters(apps, schema_editor):
+    """
+    Fill the new counters from the existing content and completion tables.
+    """
+    Progress = apps.get_model('courses', 'Progress')
+    
+    module_totals = Counter()
+    for model_name in ('Lesson', 'Video', 'Quiz'):
+        model = apps.get_model('courses', model_name)
+        for row in model.objects.values('module_id').annotate(n=models.Count('id')).order_by():
+            module_totals[row['module_id']] += row['n']
+    
+    completed = Counter()
+    for field_name in ('completed_lessons', 'completed_videos', 'completed_quizzes'):
+        through = getattr(Progress, field_name).through
+        for row in through.objects.values('progress_id').annotate(n=models.Count('id')).order_by():
+            completed[row['progress_id']] += row['n']
+    
+    batch = []
+    for progress in Progress.objects.only('id', 'module_id').iterator(chunk_size=1000):
+        progress.items_total = module_totals[progress.module_id]
+        progress.items_completed = completed[progress.id]
+        batch.append(progress)
+        if len(batch) >= 1000:
+            Progress.objects.bulk_update(batch, ['items_total', 'items_completed'])
+            batch = []
+    if batch:
+        Progress.objects.bulk_update(batch, ['items_total', 'items_completed'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0007_video_description'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='progress',
+            name='items_completed',
+            field=models.PositiveIntegerField(default=0, verbose_name='Items Completed'),
+        ),
+        migrations.AddField(
+            model_name='progress',
+            name='items_total',
+            field=models.PositiveIntegerField(default=0, verbose_name='Items Total'),
+        ),
+        migrations.RunPython(backfill_progress_counters, migrations.RunPython.noop),
+    ]
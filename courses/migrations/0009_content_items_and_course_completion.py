@@ -0,0 +1,74 @@
+# Generated by Django 4.2.7 on 2026-10-18 02:40
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def assign_content_positions(apps, schema_editor):
+    """
+    Give existing content positions in outline order: module, then lessons,
+    videos and quizzes.
+    """
+    Module = apps.get_model('courses', 'Module')
+    ContentItem = apps.get_model('courses', 'ContentItem')
+    next_position = {}
+    batch = []
+    for module in Module.objects.order_by('course_id', 'order', 'id').iterator():
+        for kind, model_name in (('lesson', 'Lesson'), ('video', 'Video'), ('quiz', 'Quiz')):
+            model = apps.get_model('courses', model_name)
+            for object_id in model.objects.filter(module_id=module.id).order_by('order', 'id').values_list('id', flat=True):
+                position = next_position.get(module.course_id, 0)
+                next_position[module.course_id] = position + 1
+                batch.append(ContentItem(
+                    course_id=module.course_id, kind=kind, object_id=object_id, position=position
+                ))
+        if len(batch) >= 1000:
+            ContentItem.objects.bulk_create(batch)
+            batch = []
+    if batch:
+        ContentItem.objects.bulk_create(batch)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('courses', '0008_progress_items_completed_progress_items_total'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CourseCompletion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('bits', models.BinaryField(default=bytes, verbose_name='Completion Bits')),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('course', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='completions', to='courses.course')),
+                ('student', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='course_completions', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Course Completion',
+                'verbose_name_plural': 'Course Completions',
+                'unique_together': {('student', 'course')},
+            },
+        ),
+        migrations.CreateModel(
+            name='ContentItem',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('lesson', 'Lesson'), ('video', 'Video'), ('quiz', 'Quiz')], max_length=10, verbose_name='Kind')),
+                ('object_id', models.PositiveIntegerField(verbose_name='Object ID')),
+                ('position', models.PositiveIntegerField(verbose_name='Position')),
+                ('is_active', models.BooleanField(default=True, verbose_name='Active')),
+                ('course', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='content_items', to='courses.course')),
+            ],
+            options={
+                'verbose_name': 'Content Item',
+                'verbose_name_plural': 'Content Items',
+                'ordering': ['course', 'position'],
+                'unique_together': {('kind', 'object_id'), ('course', 'position')},
+            },
+        ),
+        migrations.RunPython(assign_content_positions, migrations.RunPython.noop),
+    ]
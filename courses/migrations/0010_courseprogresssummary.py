@@ -0,0 +1,72 @@
+# Generated by Django 4.2.7 on 2026-10-18 02:43
+
+from collections import Counter
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def backfill_progress_summaries(apps, schema_editor):
+    """
+    Build a roll-up for every existing enrollment from the Progress counters.
+    """
+    Enrollment = apps.get_model('courses', 'Enrollment')
+    Progress = apps.get_model('courses', 'Progress')
+    CourseProgressSummary = apps.get_model('courses', 'CourseProgressSummary')
+    
+    course_totals = Counter()
+    for model_name in ('Lesson', 'Video', 'Quiz'):
+        model = apps.get_model('courses', model_name)
+        for row in model.objects.values('module__course_id').annotate(n=models.Count('id')).order_by():
+            course_totals[row['module__course_id']] += row['n']
+    
+    progress = {
+        (row['student_id'], row['course_id']): row
+        for row in Progress.objects.values('student_id', 'course_id').annotate(
+            done=models.Sum('items_completed'), last=models.Max('last_accessed')
+        ).order_by()
+    }
+    
+    batch = []
+    for enrollment in Enrollment.objects.only('id', 'student_id', 'course_id').iterator(chunk_size=1000):
+        row = progress.get((enrollment.student_id, enrollment.course_id), {})
+        items_total = course_totals[enrollment.course_id]
+        items_completed = row.get('done') or 0
+        batch.append(CourseProgressSummary(
+            enrollment_id=enrollment.id,
+            items_total=items_total,
+            items_completed=items_completed,
+            percentage=min(items_completed / items_total, 1) * 100 if items_total else 0,
+            last_activity=row.get('last')
+        ))
+        if len(batch) >= 1000:
+            CourseProgressSummary.objects.bulk_create(batch)
+            batch = []
+    if batch:
+        CourseProgressSummary.objects.bulk_create(batch)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0009_content_items_and_course_completion'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CourseProgressSummary',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('items_completed', models.PositiveIntegerField(default=0, verbose_name='Items Completed')),
+                ('items_total', models.PositiveIntegerField(default=0, verbose_name='Items Total')),
+                ('percentage', models.FloatField(default=0, verbose_name='Completion Percentage')),
+                ('last_activity', models.DateTimeField(blank=True, null=True, verbose_name='Last Activity')),
+                ('enrollment', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='progress_summary', to='courses.enrollment')),
+            ],
+            options={
+                'verbose_name': 'Course Progress Summary',
+                'verbose_name_plural': 'Course Progress Summaries',
+            },
+        ),
+        migrations.RunPython(backfill_progress_summaries, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,65 @@
+# Generated by Django 4.2.7 on 2026-10-18 02:45
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+def seed_completion_events(apps, schema_editor):
+    """
+    Log one event per existing completion join row. Historical points are
+    already in users' totals, so the seeded events carry none.
+    """
+    Progress = apps.get_model('courses', 'Progress')
+    CompletionEvent = apps.get_model('courses', 'CompletionEvent')
+    batch = []
+    for kind, field_name in (('lesson', 'completed_lessons'), ('video', 'completed_videos'), ('quiz', 'completed_quizzes')):
+        through = getattr(Progress, field_name).through
+        rows = through.objects.values_list(
+            'progress__student_id', 'progress__course_id', 'progress__module_id',
+            f'{kind}_id', 'progress__last_accessed'
+        ).order_by('id')
+        for student_id, course_id, module_id, object_id, timestamp in rows.iterator(chunk_size=1000):
+            batch.append(CompletionEvent(
+                student_id=student_id, course_id=course_id, module_id=module_id,
+                kind=kind, object_id=object_id, timestamp=timestamp
+            ))
+            if len(batch) >= 1000:
+                CompletionEvent.objects.bulk_create(batch)
+                batch = []
+    if batch:
+        CompletionEvent.objects.bulk_create(batch)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('gamification', '0004_badge_badge_type_progressbadge'),
+        ('courses', '0010_courseprogresssummary'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CompletionEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('lesson', 'Lesson'), ('video', 'Video'), ('quiz', 'Quiz'), ('module', 'Module')], max_length=10, verbose_name='Kind')),
+                ('object_id', models.PositiveIntegerField(verbose_name='Object ID')),
+                ('points', models.IntegerField(default=0, verbose_name='Points')),
+                ('timestamp', models.DateTimeField(db_index=True, default=django.utils.timezone.now, verbose_name='Timestamp')),
+                ('course', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='completion_events', to='courses.course')),
+                ('module', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='completion_events', to='courses.module')),
+                ('points_transaction', models.OneToOneField(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='completion_event', to='gamification.pointstransaction')),
+                ('student', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='completion_events', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Completion Event',
+                'verbose_name_plural': 'Completion Events',
+                'ordering': ['timestamp'],
+                'indexes': [models.Index(fields=['student', 'course'], name='courses_com_student_2c9901_idx')],
+            },
+        ),
+        migrations.RunPython(seed_completion_events, migrations.RunPython.noop),
+    ]
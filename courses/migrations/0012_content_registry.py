@@ -0,0 +1,48 @@
+# Generated by Django 4.2.7 on 2026-10-18 02:48
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def copy_module_and_order(apps, schema_editor):
+    """
+    Fill in the module and order of existing registry entries from their content.
+    """
+    ContentItem = apps.get_model('courses', 'ContentItem')
+    for kind, model_name in (('lesson', 'Lesson'), ('video', 'Video'), ('quiz', 'Quiz')):
+        model = apps.get_model('courses', model_name)
+        placement = {
+            object_id: (module_id, order)
+            for object_id, module_id, order in model.objects.values_list('id', 'module_id', 'order').iterator()
+        }
+        batch = []
+        for item in ContentItem.objects.filter(kind=kind).iterator():
+            if item.object_id in placement:
+                item.module_id, item.order = placement[item.object_id]
+                batch.append(item)
+        ContentItem.objects.bulk_update(batch, ['module', 'order'], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0011_completionevent'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='contentitem',
+            name='module',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='content_items', to='courses.module'),
+        ),
+        migrations.AddField(
+            model_name='contentitem',
+            name='order',
+            field=models.PositiveIntegerField(default=0, verbose_name='Order'),
+        ),
+        migrations.AddIndex(
+            model_name='contentitem',
+            index=models.Index(fields=['module', 'order'], name='courses_con_module__ff26d8_idx'),
+        ),
+        migrations.RunPython(copy_module_and_order, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 4.2.7 on 2026-10-18 02:52
+
+from django.db import migrations
+from django.db.models import Count, Max
+
+
+def remove_duplicate_answers(apps, schema_editor):
+    """
+    Keep only the latest answer to each question of an attempt.
+    """
+    QuizAnswer = apps.get_model('courses', 'QuizAnswer')
+    duplicates = QuizAnswer.objects.values('quiz_attempt_id', 'question_id').annotate(
+        latest=Max('id'), count=Count('id')
+    ).filter(count__gt=1).order_by()
+    for row in list(duplicates):
+        QuizAnswer.objects.filter(
+            quiz_attempt_id=row['quiz_attempt_id'], question_id=row['question_id'], id__lt=row['latest']
+        ).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0012_content_registry'),
+    ]
+
+    operations = [
+        migrations.RunPython(remove_duplicate_answers, migrations.RunPython.noop),
+        migrations.AlterUniqueTogether(
+            name='quizanswer',
+            unique_together={('quiz_attempt', 'question')},
+        ),
+    ]
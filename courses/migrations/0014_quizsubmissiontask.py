@@ -0,0 +1,34 @@
+# Generated by Django 4.2.7 on 2026-10-18 02:55
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0013_quizanswer_unique_attempt_question'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='QuizSubmissionTask',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('replay_post_save', models.BooleanField(default=False, verbose_name='Replay post_save')),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('processing', 'Processing'), ('done', 'Done'), ('failed', 'Failed')], default='pending', max_length=20, verbose_name='Status')),
+                ('tries', models.PositiveIntegerField(default=0, verbose_name='Tries')),
+                ('last_error', models.TextField(blank=True, verbose_name='Last Error')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Created At')),
+                ('claimed_at', models.DateTimeField(blank=True, null=True, verbose_name='Claimed At')),
+                ('processed_at', models.DateTimeField(blank=True, null=True, verbose_name='Processed At')),
+                ('attempt', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='submission_task', to='courses.quizattempt')),
+            ],
+            options={
+                'verbose_name': 'Quiz Submission Task',
+                'verbose_name_plural': 'Quiz Submission Tasks',
+                'ordering': ['id'],
+                'indexes': [models.Index(fields=['status', 'id'], name='courses_qui_status_65465f_idx')],
+            },
+        ),
+    ]
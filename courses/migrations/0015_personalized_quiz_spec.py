@@ -0,0 +1,44 @@
+# Generated by Django 4.2.7 on 2026-10-18 03:04
+
+from django.db import migrations, models
+import django.db.models.deletion
+from django.db.models import F
+
+
+def mark_existing_completed(apps, schema_editor):
+    """
+    Attempts saved before quizzes were generated as specs were all submitted ones.
+    """
+    PersonalizedQuizAttempt = apps.get_model('courses', 'PersonalizedQuizAttempt')
+    PersonalizedQuizAttempt.objects.filter(completed_at__isnull=True).update(completed_at=F('created_at'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0014_quizsubmissiontask'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='personalizedquizattempt',
+            name='completed_at',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='Completed At'),
+        ),
+        migrations.AddField(
+            model_name='personalizedquizattempt',
+            name='course',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='personalized_quiz_attempts', to='courses.course'),
+        ),
+        migrations.AddField(
+            model_name='personalizedquizattempt',
+            name='question_ids',
+            field=models.JSONField(blank=True, default=list, verbose_name='Question IDs'),
+        ),
+        migrations.AddField(
+            model_name='personalizedquizattempt',
+            name='seed',
+            field=models.PositiveIntegerField(default=0, verbose_name='Seed'),
+        ),
+        migrations.RunPython(mark_existing_completed, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,89 @@
+# Generated by Django 4.2.7 on 2026-10-18 03:14
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+from django.db.models import Case, Count, F, FloatField, IntegerField, Max, Sum, Value, When
+
+
+def build_attempt_summaries(apps, schema_editor):
+    """
+    Summarize the completed attempts so far, one row per user and quiz.
+    """
+    QuizAttempt = apps.get_model('courses', 'QuizAttempt')
+    QuizAttemptSummary = apps.get_model('courses', 'QuizAttemptSummary')
+    percentage = Case(
+        When(max_score__gt=0, then=F('score') * 100.0 / F('max_score')),
+        default=Value(0.0),
+        output_field=FloatField()
+    )
+    rows = QuizAttempt.objects.filter(completed=True).values('user_id', 'quiz_id').annotate(
+        attempts=Count('id'),
+        passes=Sum(Case(When(passed=True, then=Value(1)), default=Value(0), output_field=IntegerField())),
+        best=Max(percentage),
+        last=Max('completed_at')
+    ).order_by()
+    QuizAttemptSummary.objects.bulk_create(
+        [
+            QuizAttemptSummary(
+                user_id=row['user_id'],
+                quiz_id=row['quiz_id'],
+                attempt_count=row['attempts'],
+                passed_count=row['passes'] or 0,
+                best_percentage=row['best'] or 0,
+                last_completed_at=row['last']
+            )
+            for row in rows.iterator()
+        ],
+        batch_size=1000
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('courses', '0015_personalized_quiz_spec'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='QuizAttemptSummary',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('attempt_count', models.PositiveIntegerField(default=0, verbose_name='Attempt Count')),
+                ('passed_count', models.PositiveIntegerField(default=0, verbose_name='Passed Count')),
+                ('best_percentage', models.FloatField(default=0, verbose_name='Best Score (%)')),
+                ('last_completed_at', models.DateTimeField(blank=True, null=True, verbose_name='Last Completed')),
+                ('quiz', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='attempt_summaries', to='courses.quiz')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='quiz_attempt_summaries', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Quiz Attempt Summary',
+                'verbose_name_plural': 'Quiz Attempt Summaries',
+                'unique_together': {('user', 'quiz')},
+            },
+        ),
+        migrations.CreateModel(
+            name='QuizAttemptArchive',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('score', models.FloatField(default=0.0)),
+                ('max_score', models.FloatField(default=0.0)),
+                ('passed', models.BooleanField(default=False)),
+                ('started_at', models.DateTimeField()),
+                ('completed_at', models.DateTimeField(blank=True, null=True)),
+                ('period', models.PositiveIntegerField(db_index=True, verbose_name='Period')),
+                ('answers', models.BinaryField(blank=True, verbose_name='Packed Answers')),
+                ('quiz', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archived_attempts', to='courses.quiz')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archived_quiz_attempts', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Archived Quiz Attempt',
+                'verbose_name_plural': 'Archived Quiz Attempts',
+                'ordering': ['-started_at'],
+                'indexes': [models.Index(fields=['user', 'quiz', 'started_at'], name='courses_qui_user_id_405c82_idx')],
+            },
+        ),
+        migrations.RunPython(build_attempt_summaries, migrations.RunPython.noop),
+    ]
@@ -1,11 +1,20 @@
-from django.db import models
+import json
+import zlib
+
+from django.db import models, transaction, IntegrityError
+from django.db.models import Avg, Case, ExpressionWrapper, F, FloatField, Value, When
+from django.db.models.functions import Greatest, Least
+from django.db.models.lookups import LessThanOrEqual
 from django.conf import settings
 from django.utils.translation import gettext_lazy as _
 from django.urls import reverse
 from django.utils.text import slugify
+from django.utils.functional import cached_property
 from django.utils import timezone
 from django.contrib.auth.models import User
 
+from .fields import CompletionManyToManyField
+
 
 class Category(models.Model):
     """
@@ -108,6 +117,15 @@ class Course(models.Model):
     def total_students(self):
         return self.students.count()
     
+    @property
+    def total_items(self):
+        """Number of lessons, videos and quizzes in this course."""
+        return (
+            Lesson.objects.filter(module__course=self).count() +
+            Video.objects.filter(module__course=self).count() +
+            Quiz.objects.filter(module__course=self).count()
+        )
+    
     @property
     def rating(self):
         reviews = self.reviews.all()
@@ -136,6 +154,11 @@ class Module(models.Model):
     
     def __str__(self):
         return f"{self.course.title} - {self.title}"
+    
+    @property
+    def total_items(self):
+        """Number of lessons, videos and quizzes in this module."""
+        return self.lessons.count() + self.videos.count() + self.quizzes.count()
 
 
 class Content(models.Model):
@@ -289,6 +312,12 @@ class Enrollment(models.Model):
     def __str__(self):
         return f"{self.student.username} enrolled in {self.course.title}"
     
+    @property
+    def overall_completion(self):
+        """Course completion percentage from the roll-up, 0 if there is none yet."""
+        summary = getattr(self, 'progress_summary', None)
+        return summary.percentage if summary else 0
+    
     def save(self, *args, **kwargs):
         # Set completed_at when status changes to completed
         if self.status == 'completed' and not self.completed_at:
@@ -296,6 +325,42 @@ class Enrollment(models.Model):
         super().save(*args, **kwargs)
 
 
+class ProgressQuerySet(models.QuerySet):
+    """
+    Queries over the stored completion counters of Progress rows.
+    """
+    
+    def with_completion(self):
+        """Annotate each row with its completion percentage as `completion`."""
+        return self.annotate(
+            completion=Case(
+                When(items_total=0, then=Value(0.0)),
+                default=ExpressionWrapper(
+                    F('items_completed') * 100.0 / F('items_total'),
+                    output_field=FloatField()
+                ),
+                output_field=FloatField()
+            )
+        )
+    
+    def completed(self):
+        """Rows whose module has content and all of it is completed."""
+        return self.filter(items_total__gt=0, items_completed__gte=F('items_total'))
+    
+    def for_module(self, student, course, module):
+        """
+        Return the student's Progress row for a module, or an EmptyProgress
+        stand-in if nothing has been completed there yet.
+        """
+        progress = self.filter(student=student, course=course, module=module).first()
+        return progress or EmptyProgress(student, course, module)
+    
+    def completion_by_course(self):
+        """Return a dict of course_id -> average module completion percentage."""
+        rows = self.with_completion().values('course_id').annotate(avg=Avg('completion')).order_by()
+        return {row['course_id']: row['avg'] or 0 for row in rows}
+
+
 class Progress(models.Model):
     """
     Tracking student progress through course content.
@@ -315,24 +380,30 @@ class Progress(models.Model):
         on_delete=models.CASCADE,
         related_name='progress'
     )
-    completed_lessons = models.ManyToManyField(
+    completed_lessons = CompletionManyToManyField(
         Lesson,
         blank=True,
         related_name='completed_by'
     )
-    completed_videos = models.ManyToManyField(
+    completed_videos = CompletionManyToManyField(
         Video,
         related_name='completed_by',
         verbose_name=_('Completed Videos'),
         blank=True
     )
-    completed_quizzes = models.ManyToManyField(
+    completed_quizzes = CompletionManyToManyField(
         Quiz,
         blank=True,
         related_name='completed_by'
     )
     last_accessed = models.DateTimeField(auto_now=True)
     
+    # Denormalized counters, kept current by the handlers in courses.signals
+    items_total = models.PositiveIntegerField(_('Items Total'), default=0)
+    items_completed = models.PositiveIntegerField(_('Items Completed'), default=0)
+    
+    objects = ProgressQuerySet.as_manager()
+    
     class Meta:
         verbose_name = _('Progress')
         verbose_name_plural = _('Progress')
@@ -341,15 +412,366 @@ class Progress(models.Model):
     def __str__(self):
         return f"{self.student.username} - {self.course.title} - {self.module.title}"
     
+    def save(self, *args, **kwargs):
+        # Snapshot the module size when the row is first created; content
+        # signals keep it current afterwards.
+        if self._state.adding and not self.items_total:
+            self.items_total = self.module.total_items
+        super().save(*args, **kwargs)
+    
     @property
     def completion_percentage(self):
         """Calculate the completion percentage for this module."""
-        total_items = self.module.lessons.count() + self.module.quizzes.count()
-        if total_items == 0:
+        if self.items_total == 0:
             return 0
-        
-        completed_items = self.completed_lessons.count() + self.completed_quizzes.count()
-        return (completed_items / total_items) * 100
+        return min(self.items_completed / self.items_total, 1) * 100
+    
+    def refresh_counters(self):
+        """
+        Recount the stored counters from the module content and the completion tables.
+        """
+        self.items_total = self.module.total_items
+        self.items_completed = (
+            self.completed_lessons.count() +
+            self.completed_videos.count() +
+            self.completed_quizzes.count()
+        )
+        Progress.objects.filter(pk=self.pk).update(
+            items_total=self.items_total,
+            items_completed=self.items_completed
+        )
+
+
+class EmptyCompletionSet:
+    """
+    Completed-items manager of an EmptyProgress. Reads see nothing completed;
+    the first add creates the Progress row and writes through to it.
+    """
+    
+    def __init__(self, progress, field_name):
+        self.progress = progress
+        self.field_name = field_name
+        self.model = Progress._meta.get_field(field_name).related_model
+    
+    def all(self):
+        return self.model.objects.none()
+    
+    def filter(self, *args, **kwargs):
+        return self.all()
+    
+    def count(self):
+        return 0
+    
+    def exists(self):
+        return False
+    
+    def add(self, *objs):
+        getattr(self.progress.materialize(), self.field_name).add(*objs)
+    
+    def remove(self, *objs):
+        pass
+    
+    def clear(self):
+        pass
+
+
+class EmptyProgress:
+    """
+    In-memory stand-in for a Progress row that has not been written yet.
+    
+    Page views read it like a Progress; the row is only created by the first
+    completion write, via materialize().
+    """
+    pk = None
+    id = None
+    items_completed = 0
+    
+    def __init__(self, student, course, module):
+        self.student = student
+        self.course = course
+        self.module = module
+        self._progress = None
+    
+    def __str__(self):
+        return f"{self.student.username} - {self.course.title} - {self.module.title}"
+    
+    @property
+    def items_total(self):
+        return self.module.total_items
+    
+    @property
+    def completion_percentage(self):
+        return 0
+    
+    def materialize(self):
+        """Create (or fetch) the real Progress row."""
+        if self._progress is None:
+            self._progress, _ = Progress.objects.get_or_create(
+                student=self.student,
+                course=self.course,
+                module=self.module
+            )
+        return self._progress
+    
+    def _completion_set(self, field_name):
+        if self._progress is not None:
+            return getattr(self._progress, field_name)
+        return EmptyCompletionSet(self, field_name)
+    
+    @property
+    def completed_lessons(self):
+        return self._completion_set('completed_lessons')
+    
+    @property
+    def completed_videos(self):
+        return self._completion_set('completed_videos')
+    
+    @property
+    def completed_quizzes(self):
+        return self._completion_set('completed_quizzes')
+
+
+def completion_expression(completed, total):
+    """Percentage of `total` that `completed` represents, as a database expression."""
+    return Case(
+        When(LessThanOrEqual(total, 0), then=Value(0.0)),
+        default=Least(
+            ExpressionWrapper(completed * 100.0 / total, output_field=FloatField()),
+            Value(100.0)
+        ),
+        output_field=FloatField()
+    )
+
+
+class CourseProgressSummaryQuerySet(models.QuerySet):
+    """
+    Incremental maintenance of the per-enrollment completion roll-ups.
+    """
+    
+    def for_student(self, student_id, course_id):
+        return self.filter(enrollment__student_id=student_id, enrollment__course_id=course_id)
+    
+    def record_completions(self, student_id, course_id, delta):
+        """
+        Apply a change in a student's completed item count for a course.
+        """
+        if not delta:
+            return
+        self.for_student(student_id, course_id).update(
+            items_completed=F('items_completed') + delta,
+            percentage=completion_expression(F('items_completed') + delta, F('items_total')),
+            last_activity=timezone.now()
+        )
+        if delta > 0:
+            self.complete_finished_enrollments(student_id, course_id)
+    
+    def adjust_totals(self, course_id, delta):
+        """
+        Apply a change in the number of items in a course to all its enrollments.
+        """
+        self.filter(enrollment__course_id=course_id).update(
+            items_total=F('items_total') + delta,
+            percentage=completion_expression(F('items_completed'), F('items_total') + delta)
+        )
+    
+    def recount(self, course_id, student_ids=None):
+        """
+        Recompute roll-ups of a course from its content and Progress counters.
+        """
+        course = Course.objects.get(pk=course_id)
+        items_total = course.total_items
+        completed = dict(
+            Progress.objects.filter(course_id=course_id).values('student_id').annotate(
+                done=models.Sum('items_completed')
+            ).order_by().values_list('student_id', 'done')
+        )
+        summaries = self.filter(enrollment__course_id=course_id).select_related('enrollment')
+        if student_ids is not None:
+            summaries = summaries.filter(enrollment__student_id__in=student_ids)
+        summaries = list(summaries)
+        for summary in summaries:
+            summary.items_total = items_total
+            summary.items_completed = completed.get(summary.enrollment.student_id, 0)
+            summary.percentage = summary.calculate_percentage()
+        self.bulk_update(summaries, ['items_total', 'items_completed', 'percentage'], batch_size=1000)
+    
+    def complete_finished_enrollments(self, student_id, course_id):
+        """
+        Move the enrollment to 'completed' once its roll-up reaches 100%.
+        """
+        enrollment = Enrollment.objects.filter(
+            student_id=student_id,
+            course_id=course_id,
+            status='enrolled',
+            progress_summary__percentage__gte=100
+        ).first()
+        if enrollment:
+            enrollment.status = 'completed'
+            enrollment.save()
+
+
+class CourseProgressSummary(models.Model):
+    """
+    Course-level completion roll-up for an enrollment, updated on completion events.
+    """
+    enrollment = models.OneToOneField(
+        Enrollment,
+        on_delete=models.CASCADE,
+        related_name='progress_summary'
+    )
+    items_completed = models.PositiveIntegerField(_('Items Completed'), default=0)
+    items_total = models.PositiveIntegerField(_('Items Total'), default=0)
+    percentage = models.FloatField(_('Completion Percentage'), default=0)
+    last_activity = models.DateTimeField(_('Last Activity'), null=True, blank=True)
+    
+    objects = CourseProgressSummaryQuerySet.as_manager()
+    
+    class Meta:
+        verbose_name = _('Course Progress Summary')
+        verbose_name_plural = _('Course Progress Summaries')
+    
+    def __str__(self):
+        return f"{self.enrollment} - {self.percentage:.0f}%"
+    
+    def calculate_percentage(self):
+        if self.items_total <= 0:
+            return 0
+        return min(self.items_completed / self.items_total, 1) * 100
+
+
+class CompletionEvent(models.Model):
+    """
+    Append-only log of content completions, the source of truth for
+    rebuilding Progress, course roll-ups and completion points.
+    """
+    KIND_CHOICES = (
+        ('lesson', _('Lesson')),
+        ('video', _('Video')),
+        ('quiz', _('Quiz')),
+        ('module', _('Module')),
+    )
+    
+    student = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='completion_events'
+    )
+    course = models.ForeignKey(
+        Course,
+        on_delete=models.CASCADE,
+        related_name='completion_events'
+    )
+    module = models.ForeignKey(
+        Module,
+        on_delete=models.SET_NULL,
+        related_name='completion_events',
+        null=True,
+        blank=True
+    )
+    kind = models.CharField(_('Kind'), max_length=10, choices=KIND_CHOICES)
+    object_id = models.PositiveIntegerField(_('Object ID'))
+    points = models.IntegerField(_('Points'), default=0)
+    points_transaction = models.OneToOneField(
+        'gamification.PointsTransaction',
+        on_delete=models.SET_NULL,
+        related_name='completion_event',
+        null=True,
+        blank=True
+    )
+    timestamp = models.DateTimeField(_('Timestamp'), default=timezone.now, db_index=True)
+    
+    class Meta:
+        verbose_name = _('Completion Event')
+        verbose_name_plural = _('Completion Events')
+        ordering = ['timestamp']
+        indexes = [
+            models.Index(fields=['student', 'course']),
+        ]
+    
+    def __str__(self):
+        return f"{self.student_id} completed {self.kind} {self.object_id}"
+
+
+class ContentItem(models.Model):
+    """
+    Registry entry for a lesson, video or quiz.
+    
+    Gives every piece of content one global ID that resolves to its type,
+    object, module and order in a single query, and a stable bit position
+    within its course. Positions are append-only: deleted content is
+    deactivated rather than removed, so a position is never reused for a
+    different item.
+    """
+    KIND_CHOICES = (
+        ('lesson', _('Lesson')),
+        ('video', _('Video')),
+        ('quiz', _('Quiz')),
+    )
+    
+    course = models.ForeignKey(
+        Course,
+        on_delete=models.CASCADE,
+        related_name='content_items'
+    )
+    module = models.ForeignKey(
+        Module,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='content_items'
+    )
+    kind = models.CharField(_('Kind'), max_length=10, choices=KIND_CHOICES)
+    object_id = models.PositiveIntegerField(_('Object ID'))
+    order = models.PositiveIntegerField(_('Order'), default=0)
+    position = models.PositiveIntegerField(_('Position'))
+    is_active = models.BooleanField(_('Active'), default=True)
+    
+    class Meta:
+        verbose_name = _('Content Item')
+        verbose_name_plural = _('Content Items')
+        ordering = ['course', 'position']
+        unique_together = [('course', 'position'), ('kind', 'object_id')]
+        indexes = [
+            models.Index(fields=['module', 'order']),
+        ]
+    
+    def __str__(self):
+        return f"{self.course_id}:{self.position} {self.kind} {self.object_id}"
+    
+    @property
+    def content_model(self):
+        return {'lesson': Lesson, 'video': Video, 'quiz': Quiz}[self.kind]
+    
+    @cached_property
+    def content_object(self):
+        """The lesson, video or quiz this entry stands for."""
+        return self.content_model.objects.filter(pk=self.object_id).first()
+
+
+class CourseCompletion(models.Model):
+    """
+    Completed content of a student in a course, as a bitset over ContentItem positions.
+    """
+    student = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='course_completions'
+    )
+    course = models.ForeignKey(
+        Course,
+        on_delete=models.CASCADE,
+        related_name='completions'
+    )
+    bits = models.BinaryField(_('Completion Bits'), default=bytes)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        verbose_name = _('Course Completion')
+        verbose_name_plural = _('Course Completions')
+        unique_together = ('student', 'course')
+    
+    def __str__(self):
+        return f"{self.student_id} - {self.course_id}"
 
 
 class QuizAttempt(models.Model):
@@ -396,6 +818,46 @@ class QuizAttempt(models.Model):
         return (self.score / self.max_score) * 100
 
 
+class QuizSubmissionTask(models.Model):
+    """
+    Deferred side effects of a quiz submission made in exam mode.
+    
+    The graded attempt is written at submission time; progress, points,
+    streaks and badges are applied later by the submission worker.
+    """
+    STATUS_CHOICES = (
+        ('pending', _('Pending')),
+        ('processing', _('Processing')),
+        ('done', _('Done')),
+        ('failed', _('Failed')),
+    )
+    
+    attempt = models.OneToOneField(
+        QuizAttempt,
+        on_delete=models.CASCADE,
+        related_name='submission_task'
+    )
+    # The attempt was written without post_save, so the worker sends it
+    replay_post_save = models.BooleanField(_('Replay post_save'), default=False)
+    status = models.CharField(_('Status'), max_length=20, choices=STATUS_CHOICES, default='pending')
+    tries = models.PositiveIntegerField(_('Tries'), default=0)
+    last_error = models.TextField(_('Last Error'), blank=True)
+    created_at = models.DateTimeField(_('Created At'), auto_now_add=True)
+    claimed_at = models.DateTimeField(_('Claimed At'), null=True, blank=True)
+    processed_at = models.DateTimeField(_('Processed At'), null=True, blank=True)
+    
+    class Meta:
+        verbose_name = _('Quiz Submission Task')
+        verbose_name_plural = _('Quiz Submission Tasks')
+        ordering = ['id']
+        indexes = [
+            models.Index(fields=['status', 'id']),
+        ]
+    
+    def __str__(self):
+        return f"Submission task for attempt {self.attempt_id} ({self.status})"
+
+
 class QuizAnswer(models.Model):
     """
     Model to store user's answers to quiz questions.
@@ -422,11 +884,186 @@ class QuizAnswer(models.Model):
     class Meta:
         verbose_name = _('Quiz Answer')
         verbose_name_plural = _('Quiz Answers')
+        unique_together = [['quiz_attempt', 'question']]
     
     def __str__(self):
         return f"Answer to {self.question.text} by {self.quiz_attempt.user.username}"
 
 
+def attempt_percentage(score, max_score):
+    return (score / max_score) * 100 if max_score else 0
+
+
+class QuizAttemptSummaryQuerySet(models.QuerySet):
+    """
+    Incremental maintenance of per-user, per-quiz attempt aggregates.
+    """
+    
+    def record_attempt(self, attempt):
+        """
+        Add a completed attempt to its user's summary for the quiz.
+        """
+        percentage = attempt.score_percentage
+        completed_at = attempt.completed_at or timezone.now()
+        changes = {
+            'attempt_count': F('attempt_count') + 1,
+            'passed_count': F('passed_count') + int(attempt.passed),
+            'best_percentage': Greatest(F('best_percentage'), Value(percentage)),
+            'last_completed_at': completed_at,
+        }
+        if self.filter(user_id=attempt.user_id, quiz_id=attempt.quiz_id).update(**changes):
+            return
+        try:
+            with transaction.atomic():
+                self.create(
+                    user_id=attempt.user_id, quiz_id=attempt.quiz_id, attempt_count=1,
+                    passed_count=int(attempt.passed), best_percentage=percentage, last_completed_at=completed_at
+                )
+        except IntegrityError:
+            # Another attempt created the row first
+            self.filter(user_id=attempt.user_id, quiz_id=attempt.quiz_id).update(**changes)
+    
+    def rebuild(self, user_ids=None):
+        """
+        Recompute summaries from the live and archived attempts, for all
+        users or the given ones. Returns the number of rows written.
+        """
+        totals = {}
+        sources = (
+            QuizAttempt.objects.filter(completed=True),
+            QuizAttemptArchive.objects.all(),
+        )
+        for attempts in sources:
+            if user_ids is not None:
+                attempts = attempts.filter(user_id__in=user_ids)
+            rows = attempts.values_list('user_id', 'quiz_id', 'score', 'max_score', 'passed', 'completed_at')
+            for user_id, quiz_id, score, max_score, passed, completed_at in rows.iterator():
+                entry = totals.setdefault((user_id, quiz_id), [0, 0, 0.0, None])
+                entry[0] += 1
+                entry[1] += int(passed)
+                entry[2] = max(entry[2], attempt_percentage(score, max_score))
+                if completed_at and (entry[3] is None or completed_at > entry[3]):
+                    entry[3] = completed_at
+        
+        with transaction.atomic():
+            stale = self.all() if user_ids is None else self.filter(user_id__in=user_ids)
+            stale.delete()
+            return len(self.bulk_create(
+                [
+                    self.model(
+                        user_id=user_id, quiz_id=quiz_id, attempt_count=count, passed_count=passed,
+                        best_percentage=best, last_completed_at=last
+                    )
+                    for (user_id, quiz_id), (count, passed, best, last) in totals.items()
+                ],
+                batch_size=1000
+            ))
+
+
+class QuizAttemptSummary(models.Model):
+    """
+    A user's completed attempts at a quiz, live and archived, rolled up.
+    """
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='quiz_attempt_summaries'
+    )
+    quiz = models.ForeignKey(
+        Quiz,
+        on_delete=models.CASCADE,
+        related_name='attempt_summaries'
+    )
+    attempt_count = models.PositiveIntegerField(_('Attempt Count'), default=0)
+    passed_count = models.PositiveIntegerField(_('Passed Count'), default=0)
+    best_percentage = models.FloatField(_('Best Score (%)'), default=0)
+    last_completed_at = models.DateTimeField(_('Last Completed'), null=True, blank=True)
+    
+    objects = QuizAttemptSummaryQuerySet.as_manager()
+    
+    class Meta:
+        verbose_name = _('Quiz Attempt Summary')
+        verbose_name_plural = _('Quiz Attempt Summaries')
+        unique_together = [['user', 'quiz']]
+    
+    def __str__(self):
+        return f"{self.user.username} - {self.quiz.title}: best {self.best_percentage:.0f}% of {self.attempt_count}"
+
+
+def pack_responses(responses):
+    """
+    Pack (question_id, answer_id, is_correct) rows into a compressed blob.
+    """
+    rows = [[question_id, answer_id, int(is_correct)] for question_id, answer_id, is_correct in responses]
+    return zlib.compress(json.dumps(rows, separators=(',', ':')).encode())
+
+
+def unpack_responses(blob):
+    if not blob:
+        return []
+    return [
+        (question_id, answer_id, bool(is_correct))
+        for question_id, answer_id, is_correct in json.loads(zlib.decompress(bytes(blob)))
+    ]
+
+
+class QuizAttemptArchive(models.Model):
+    """
+    A completed quiz attempt moved out of QuizAttempt by archive_quiz_attempts,
+    with its answers packed into one blob.
+    """
+    # The ID the attempt had in QuizAttempt, so old result links still resolve
+    id = models.BigIntegerField(primary_key=True)
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='archived_quiz_attempts'
+    )
+    quiz = models.ForeignKey(
+        Quiz,
+        on_delete=models.CASCADE,
+        related_name='archived_attempts'
+    )
+    score = models.FloatField(default=0.0)
+    max_score = models.FloatField(default=0.0)
+    passed = models.BooleanField(default=False)
+    started_at = models.DateTimeField()
+    completed_at = models.DateTimeField(null=True, blank=True)
+    # Year and month of completion (YYYYMM), the unit in which the archive is pruned or exported
+    period = models.PositiveIntegerField(_('Period'), db_index=True)
+    answers = models.BinaryField(_('Packed Answers'), blank=True)
+    
+    class Meta:
+        verbose_name = _('Archived Quiz Attempt')
+        verbose_name_plural = _('Archived Quiz Attempts')
+        ordering = ['-started_at']
+        indexes = [
+            models.Index(fields=['user', 'quiz', 'started_at']),
+        ]
+    
+    # Archived attempts are always complete
+    completed = True
+    archived = True
+    
+    def __str__(self):
+        return f"{self.user.username}'s archived attempt on {self.quiz.title}"
+    
+    @property
+    def duration(self):
+        if not self.completed_at:
+            return None
+        return (self.completed_at - self.started_at).total_seconds() / 60
+    
+    @property
+    def score_percentage(self):
+        return attempt_percentage(self.score, self.max_score)
+    
+    @property
+    def responses(self):
+        """The attempt's (question_id, answer_id, is_correct) answers."""
+        return unpack_responses(self.answers)
+
+
 class PersonalizedQuizAttempt(models.Model):
     """
     Model to store attempts at personalized quizzes.
@@ -436,11 +1073,22 @@ class PersonalizedQuizAttempt(models.Model):
         on_delete=models.CASCADE,
         related_name='personalized_quiz_attempts'
     )
+    course = models.ForeignKey(
+        Course,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='personalized_quiz_attempts'
+    )
     title = models.CharField(max_length=200)
+    # The quiz itself is virtual: its ordered question IDs and the seed that shuffles their answers
+    question_ids = models.JSONField(_('Question IDs'), default=list, blank=True)
+    seed = models.PositiveIntegerField(_('Seed'), default=0)
     score = models.FloatField(default=0)
     total_questions = models.PositiveIntegerField(default=0)
     correct_answers = models.PositiveIntegerField(default=0)
     created_at = models.DateTimeField(auto_now_add=True)
+    completed_at = models.DateTimeField(_('Completed At'), null=True, blank=True)
     
     class Meta:
         verbose_name = _('Personalized Quiz Attempt')
@@ -0,0 +1,309 @@
+"""
+Course outline service.
+
+Loads the module/lesson/video/quiz structure of a course and the student's
+completed items in a fixed number of queries, independent of course size.
+Content is ordered within each module by the content registry
+(ContentItem), so lessons, videos and quizzes interleave by their order.
+The structure itself is cached per course and invalidated by version bumps
+whenever a module, lesson, video, quiz or question changes.
+"""
+from django.db.models import Count
+from django.utils.html import strip_tags
+from django.utils.text import Truncator
+
+from . import bitmaps
+from .cache import get_or_build, bump_version
+from .models import Module, Lesson, Video, Quiz, Progress, ContentItem
+
+
+OUTLINE_CACHE_NAMESPACE = 'course_outline'
+NAVIGATION_CACHE_NAMESPACE = 'course_navigation'
+
+
+class OutlineItem:
+    """
+    A lesson, video or quiz as it appears in the course outline.
+    """
+    def __init__(self, kind, id, title, order, module_id, content_id=None, is_completed=False, **details):
+        self.kind = kind
+        self.id = id
+        self.title = title
+        self.order = order
+        self.module_id = module_id
+        # Registry ID, as used by the view_content URL
+        self.content_id = content_id
+        self.is_completed = is_completed
+        # Kind specific display fields, e.g. a lesson excerpt or quiz question count
+        self.details = details
+        self.__dict__.update(details)
+
+    def __repr__(self):
+        return f"<OutlineItem {self.kind} {self.id}: {self.title}>"
+
+    def with_completion(self, completed_ids):
+        return OutlineItem(
+            self.kind, self.id, self.title, self.order, self.module_id, self.content_id,
+            is_completed=self.id in completed_ids, **self.details
+        )
+
+
+class OutlineModule:
+    """
+    A module with its ordered lessons, videos and quizzes.
+    """
+    def __init__(self, id, title, description, order, items=None, is_completed=False):
+        self.id = id
+        self.title = title
+        self.description = description
+        self.order = order
+        # All content of the module, in registry order
+        self.items = items or []
+        self.is_completed = is_completed
+
+    def __repr__(self):
+        return f"<OutlineModule {self.id}: {self.title}>"
+
+    def _of_kind(self, kind):
+        return [item for item in self.items if item.kind == kind]
+
+    @property
+    def lessons(self):
+        return self._of_kind('lesson')
+
+    @property
+    def videos(self):
+        return self._of_kind('video')
+
+    @property
+    def quizzes(self):
+        return self._of_kind('quiz')
+
+    @property
+    def total_items(self):
+        return len(self.items)
+
+    @property
+    def completed_items(self):
+        return sum(1 for item in self.items if item.is_completed)
+
+    def with_completion(self, completed):
+        """
+        Return a copy of this module flagged against the given completed ID sets.
+        """
+        module = OutlineModule(
+            self.id, self.title, self.description, self.order,
+            items=[item.with_completion(completed[item.kind]) for item in self.items],
+        )
+        module.is_completed = module.total_items > 0 and module.completed_items == module.total_items
+        return module
+
+
+class CourseOutline:
+    """
+    The ordered structure of a course.
+    """
+    # Content model, module attribute and Progress relation for each outline item kind
+    CONTENT_MODELS = (
+        ('lesson', Lesson, 'lessons', 'completed_lessons'),
+        ('video', Video, 'videos', 'completed_videos'),
+        ('quiz', Quiz, 'quizzes', 'completed_quizzes'),
+    )
+
+    def __init__(self, course_id, modules):
+        self.course_id = course_id
+        self.modules = modules
+
+    @classmethod
+    def build(cls, course):
+        """
+        Load the outline of a course: one query for modules, one for the
+        content registry and one per content type.
+        """
+        modules = [
+            OutlineModule(m['id'], m['title'], m['description'], m['order'])
+            for m in Module.objects.filter(course=course).order_by('order', 'id').values(
+                'id', 'title', 'description', 'order'
+            )
+        ]
+        modules_by_id = {module.id: module for module in modules}
+
+        lessons = Lesson.objects.filter(module__course=course).values(
+            'id', 'title', 'order', 'module_id', 'content'
+        )
+        videos = Video.objects.filter(module__course=course).values(
+            'id', 'title', 'order', 'module_id', 'duration'
+        )
+        quizzes = Quiz.objects.filter(module__course=course).annotate(
+            question_count=Count('questions')
+        ).values(
+            'id', 'title', 'order', 'module_id', 'description', 'time_limit',
+            'passing_score', 'question_count'
+        )
+
+        rows = {}
+        for (kind, _model, _attr, _field), kind_rows in zip(cls.CONTENT_MODELS, (lessons, videos, quizzes)):
+            for row in kind_rows.order_by('order', 'id'):
+                if kind == 'lesson':
+                    row['excerpt'] = Truncator(strip_tags(row.pop('content'))).chars(100)
+                rows[(kind, row['id'])] = row
+
+        registry = ContentItem.objects.filter(course=course, is_active=True).order_by(
+            'order', 'position'
+        ).values_list('id', 'kind', 'object_id')
+        for content_id, kind, object_id in registry:
+            row = rows.pop((kind, object_id), None)
+            if row is not None:
+                modules_by_id[row['module_id']].items.append(OutlineItem(kind, content_id=content_id, **row))
+
+        # Content missing from the registry, e.g. bulk-created, goes last
+        for (kind, _object_id), row in rows.items():
+            modules_by_id[row['module_id']].items.append(OutlineItem(kind, **row))
+
+        return cls(course.id, modules)
+
+    @classmethod
+    def get(cls, course):
+        """
+        Return the cached outline of a course, building it on a miss.
+        """
+        return get_or_build(OUTLINE_CACHE_NAMESPACE, course.id, lambda: cls.build(course))
+
+    @classmethod
+    def invalidate(cls, course_id):
+        bump_version(OUTLINE_CACHE_NAMESPACE, course_id)
+        bump_version(NAVIGATION_CACHE_NAMESPACE, course_id)
+
+    def get_module(self, module_id):
+        return next((module for module in self.modules if module.id == module_id), None)
+
+    @property
+    def total_lessons(self):
+        return sum(len(module.lessons) for module in self.modules)
+
+    @property
+    def total_videos(self):
+        return sum(len(module.videos) for module in self.modules)
+
+    @property
+    def total_quizzes(self):
+        return sum(len(module.quizzes) for module in self.modules)
+
+    def completed_ids(self, student):
+        """
+        Return the IDs of the student's completed items in this course, keyed by kind.
+        """
+        if bitmaps.bitmap_storage_enabled():
+            return bitmaps.completed_ids(student, self.course_id)
+        
+        completed = {}
+        for kind, _model, _attr, field in self.CONTENT_MODELS:
+            through = getattr(Progress, field).through
+            completed[kind] = set(
+                through.objects.filter(
+                    progress__student=student,
+                    progress__course_id=self.course_id
+                ).values_list(f'{kind}_id', flat=True)
+            )
+        return completed
+
+    def for_student(self, student):
+        return StudentOutline(self, self.completed_ids(student))
+
+
+class StudentOutline:
+    """
+    A course outline flagged with one student's progress.
+    """
+    def __init__(self, outline, completed):
+        self.modules = [module.with_completion(completed) for module in outline.modules]
+        self.next_content = None
+        self.next_quiz = None
+
+        total_contents = 0
+        completed_contents = 0
+        for module in self.modules:
+            total_contents += module.total_items
+            completed_contents += module.completed_items
+
+            # First unfinished lesson or video, in course order
+            if not self.next_content:
+                self.next_content = next(
+                    (item for item in module.items if item.kind != 'quiz' and not item.is_completed),
+                    None
+                )
+
+            # First unfinished quiz, in course order
+            if not self.next_quiz:
+                self.next_quiz = next((quiz for quiz in module.quizzes if not quiz.is_completed), None)
+
+        self.all_quizzes_completed = self.next_quiz is None
+        self.overall_progress = (completed_contents / total_contents * 100) if total_contents > 0 else 0
+
+    def get_module(self, module_id):
+        return next((module for module in self.modules if module.id == module_id), None)
+
+
+class ModuleNavigation:
+    """
+    A module's place in its course: its neighbours and content counts.
+    """
+    def __init__(self, id, title, order, lesson_count=0, video_count=0, quiz_count=0):
+        self.id = id
+        self.title = title
+        self.order = order
+        self.lesson_count = lesson_count
+        self.video_count = video_count
+        self.quiz_count = quiz_count
+        self.prev_id = None
+        self.next_id = None
+
+    def __repr__(self):
+        return f"<ModuleNavigation {self.id}: {self.prev_id} <- -> {self.next_id}>"
+
+    @property
+    def total_items(self):
+        return self.lesson_count + self.video_count + self.quiz_count
+
+
+class CourseNavigation:
+    """
+    Precomputed module order of a course, for previous/next links.
+
+    Much smaller than the outline, and cached and invalidated alongside it.
+    """
+    def __init__(self, course_id, modules):
+        self.course_id = course_id
+        self.modules = {module.id: module for module in modules}
+        for prev_module, next_module in zip(modules, modules[1:]):
+            prev_module.next_id = next_module.id
+            next_module.prev_id = prev_module.id
+
+    @classmethod
+    def build(cls, course):
+        outline = CourseOutline.get(course)
+        return cls(course.id, [
+            ModuleNavigation(
+                module.id, module.title, module.order,
+                lesson_count=len(module.lessons),
+                video_count=len(module.videos),
+                quiz_count=len(module.quizzes)
+            )
+            for module in outline.modules
+        ])
+
+    @classmethod
+    def get(cls, course):
+        return get_or_build(NAVIGATION_CACHE_NAMESPACE, course.id, lambda: cls.build(course))
+
+    def get_module(self, module_id):
+        return self.modules.get(module_id)
+
+    def neighbours(self, module_id):
+        """
+        Return the modules before and after the given one, or None at either end.
+        """
+        module = self.modules.get(module_id)
+        if module is None:
+            return None, None
+        return self.modules.get(module.prev_id), self.modules.get(module.next_id)
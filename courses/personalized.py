@@ -0,0 +1,77 @@
+"""
+Virtual personalized quizzes.
+
+A personalized quiz is never stored as a Quiz. Its spec, the ordered list
+of sampled question IDs and a seed that fixes the order of their answers,
+is kept on the PersonalizedQuizAttempt, so generating one writes a single
+row. PersonalizedQuiz renders the spec from the existing questions and
+grades it with the cached answer keys of the quizzes they belong to.
+"""
+import random
+
+from .grading import AnswerKey
+from .models import PersonalizedQuizAttempt, Question
+
+
+PERSONALIZED_QUIZ_DESCRIPTION = "This quiz is tailored to help you improve in areas where you need practice."
+PERSONALIZED_QUIZ_TIME_LIMIT = 15
+PERSONALIZED_QUIZ_PASSING_SCORE = 70
+
+
+def create_personalized_quiz(user, question_ids, course=None):
+    """
+    Store the spec of a new personalized quiz and return its attempt.
+    """
+    if course is not None:
+        title = f"Personalized Quiz: {course.title}"
+    else:
+        title = f"Personalized Quiz for {user.username}"
+    return PersonalizedQuizAttempt.objects.create(
+        user=user,
+        course=course,
+        title=title,
+        question_ids=[int(question_id) for question_id in question_ids],
+        seed=random.randrange(2 ** 31),
+        total_questions=len(question_ids)
+    )
+
+
+class PersonalizedQuiz:
+    """
+    The quiz described by a PersonalizedQuizAttempt, shaped like a Quiz for templates.
+    """
+    description = PERSONALIZED_QUIZ_DESCRIPTION
+    time_limit = PERSONALIZED_QUIZ_TIME_LIMIT
+    passing_score = PERSONALIZED_QUIZ_PASSING_SCORE
+
+    def __init__(self, attempt, questions):
+        self.attempt = attempt
+        self.id = attempt.pk
+        self.title = attempt.title
+        # Questions in spec order; questions deleted since generation are dropped
+        self.questions = questions
+
+    @classmethod
+    def load(cls, attempt, with_answers=True):
+        """
+        Load the questions of an attempt's spec. With answers, each question
+        gets a `choices` list in the attempt's seeded order.
+        """
+        questions = Question.objects.filter(id__in=attempt.question_ids)
+        if with_answers:
+            questions = questions.prefetch_related('answers')
+        by_id = {question.id: question for question in questions}
+        ordered = [by_id[question_id] for question_id in attempt.question_ids if question_id in by_id]
+
+        if with_answers:
+            shuffler = random.Random(attempt.seed)
+            for question in ordered:
+                question.choices = sorted(question.answers.all(), key=lambda answer: answer.id)
+                shuffler.shuffle(question.choices)
+        return cls(attempt, ordered)
+
+    def answer_key(self):
+        return AnswerKey.compose((question.id, question.quiz_id) for question in self.questions)
+
+    def grade(self, submission):
+        return self.answer_key().grade(submission)
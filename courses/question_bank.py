@@ -0,0 +1,180 @@
+"""
+Question bank index for sampling quiz questions.
+
+Random question selection with ORDER BY RANDOM() sorts the whole question
+table on every request. Instead, each course's question IDs are loaded once
+into a cached index, grouped by module and by difficulty bucket (from
+ContentDifficulty ratings of questions, or else from the p-values in
+QuestionStatistics), and samples are drawn from those arrays by random
+position. Sampling across the whole bank, for requests not
+scoped to a course, probes random primary keys and never scans or sorts.
+"""
+import random
+from array import array
+
+from django.db.models import Max, Min
+
+from analytics.models import ContentDifficulty, QuestionStatistics
+from .cache import get_or_build, bump_version
+from .models import Question
+
+
+QUESTION_BANK_CACHE_NAMESPACE = 'question_bank'
+
+# Upper bounds (exclusive) of the average 1-5 difficulty rating per bucket
+DIFFICULTY_BUCKETS = (
+    ('easy', 2.5),
+    ('moderate', 3.5),
+    ('difficult', None),
+)
+
+
+# Lower bounds (inclusive) of the share of correct answers per bucket
+P_VALUE_BUCKETS = (
+    ('easy', 0.75),
+    ('moderate', 0.4),
+    ('difficult', None),
+)
+
+# Attempts a question needs before its statistics are trusted
+MIN_STATISTICS_EXPOSURE = 20
+
+
+def difficulty_bucket(score):
+    for bucket, upper in DIFFICULTY_BUCKETS:
+        if upper is None or score < upper:
+            return bucket
+
+
+def p_value_bucket(p_value):
+    for bucket, lower in P_VALUE_BUCKETS:
+        if lower is None or p_value >= lower:
+            return bucket
+
+
+def sample_ids(ids, k, exclude=()):
+    """
+    Return up to k distinct IDs from a sequence, skipping excluded ones,
+    by drawing random positions instead of shuffling the sequence.
+    """
+    exclude = set(exclude)
+    if len(ids) <= 2 * (k + len(exclude)):
+        # Small pools are cheaper to filter than to probe
+        pool = [question_id for question_id in ids if question_id not in exclude]
+        return random.sample(pool, min(k, len(pool)))
+
+    chosen = []
+    seen = set(exclude)
+    while len(chosen) < k:
+        question_id = ids[random.randrange(len(ids))]
+        if question_id not in seen:
+            seen.add(question_id)
+            chosen.append(question_id)
+    return chosen
+
+
+class QuestionBank:
+    """
+    The question IDs of one course, by module and by difficulty bucket.
+    """
+
+    def __init__(self, course_id, by_module, difficulty, flagged=()):
+        self.course_id = course_id
+        # Module ID -> array of question IDs
+        self.by_module = by_module
+        # Question ID -> difficulty bucket, for rated or analysed questions only
+        self.difficulty = difficulty
+        # Questions that stronger students get wrong more often (negative point-biserial)
+        self.flagged = frozenset(flagged)
+
+    def __len__(self):
+        return sum(len(ids) for ids in self.by_module.values())
+
+    @classmethod
+    def build(cls, course_id):
+        by_module = {}
+        rows = Question.objects.filter(quiz__module__course_id=course_id).order_by('id').values_list(
+            'quiz__module_id', 'id'
+        )
+        for module_id, question_id in rows.iterator():
+            by_module.setdefault(module_id, array('L')).append(question_id)
+
+        question_ids = [question_id for ids in by_module.values() for question_id in ids]
+        difficulty = {}
+        for start in range(0, len(question_ids), 5000):
+            ratings = ContentDifficulty.objects.filter(
+                content_type='question',
+                content_id__in=question_ids[start:start + 5000],
+                rating_count__gt=0
+            ).values_list('content_id', 'difficulty_score')
+            for question_id, score in ratings:
+                difficulty[question_id] = difficulty_bucket(score)
+
+        flagged = set()
+        for start in range(0, len(question_ids), 5000):
+            statistics = QuestionStatistics.objects.filter(
+                question_id__in=question_ids[start:start + 5000],
+                exposure_count__gte=MIN_STATISTICS_EXPOSURE
+            ).values_list('question_id', 'p_value', 'point_biserial')
+            for question_id, p_value, point_biserial in statistics:
+                # Ratings from students take precedence over measured difficulty
+                if question_id not in difficulty and p_value is not None:
+                    difficulty[question_id] = p_value_bucket(p_value)
+                if point_biserial is not None and point_biserial < 0:
+                    flagged.add(question_id)
+        return cls(course_id, by_module, difficulty, flagged)
+
+    @classmethod
+    def get(cls, course_id):
+        return get_or_build(QUESTION_BANK_CACHE_NAMESPACE, course_id, lambda: cls.build(course_id))
+
+    @classmethod
+    def invalidate(cls, course_id):
+        bump_version(QUESTION_BANK_CACHE_NAMESPACE, course_id)
+
+    def question_ids(self, module_ids=None, difficulty=None):
+        """
+        Return the question IDs of the given modules (or the whole course),
+        optionally limited to one difficulty bucket ('unrated' for questions
+        without ratings).
+        """
+        if module_ids is None:
+            module_ids = self.by_module.keys()
+        ids = array('L')
+        for module_id in module_ids:
+            ids.extend(self.by_module.get(module_id, ()))
+        if difficulty is not None:
+            ids = array('L', (
+                question_id for question_id in ids
+                if self.difficulty.get(question_id, 'unrated') == difficulty
+            ))
+        return ids
+
+    def sample(self, k, module_ids=None, difficulty=None, exclude=(), skip_flagged=False):
+        if skip_flagged:
+            exclude = self.flagged.union(exclude)
+        return sample_ids(self.question_ids(module_ids, difficulty), k, exclude)
+
+
+def sample_any(k, exclude=(), max_probes=None):
+    """
+    Return up to k random question IDs from the whole bank, by probing
+    random points of the primary key range through the index.
+
+    IDs that follow gaps in the key range are slightly more likely to be
+    picked, which is acceptable for practice quizzes.
+    """
+    bounds = Question.objects.aggregate(low=Min('id'), high=Max('id'))
+    if bounds['low'] is None:
+        return []
+    chosen = []
+    seen = set(exclude)
+    probes = max_probes or k * 10
+    while len(chosen) < k and probes > 0:
+        probes -= 1
+        pivot = random.randint(bounds['low'], bounds['high'])
+        question_id = Question.objects.filter(id__gte=pivot).order_by('id').values_list('id', flat=True).first()
+        if question_id is not None and question_id not in seen:
+            seen.add(question_id)
+            chosen.append(question_id)
+    return chosen
@@ -0,0 +1,353 @@
+from django.db.models import F
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+
+from .models import (
+    Module, Lesson, Video, Quiz, Question, Answer, Enrollment, Progress, CourseProgressSummary,
+    QuizAttempt, QuizAttemptSummary
+)
+from .outline import CourseOutline
+from .grading import AnswerKey
+from .question_bank import QuestionBank
+from analytics.models import ContentDifficulty
+from .authoring import invalidation_deferred
+from . import bitmaps
+
+
+# Completed item relation for each content model, as named on Progress
+COMPLETION_FIELDS = {
+    Lesson: 'completed_lessons',
+    Video: 'completed_videos',
+    Quiz: 'completed_quizzes',
+}
+
+
+def recount_completed_items(progress_ids):
+    """
+    Recount items_completed for the given Progress rows from the completion
+    tables, and the course roll-ups they feed.
+    """
+    students_by_course = {}
+    for progress in Progress.objects.filter(pk__in=progress_ids):
+        progress.refresh_counters()
+        students_by_course.setdefault(progress.course_id, set()).add(progress.student_id)
+    for course_id, student_ids in students_by_course.items():
+        CourseProgressSummary.objects.recount(course_id, student_ids)
+
+
+@receiver(m2m_changed, sender=Progress.completed_lessons.through)
+@receiver(m2m_changed, sender=Progress.completed_videos.through)
+@receiver(m2m_changed, sender=Progress.completed_quizzes.through)
+def update_completed_items_count(sender, instance, action, reverse, pk_set, **kwargs):
+    """
+    Keep Progress.items_completed in step with the completed_* relations.
+    """
+    if action == 'post_add' and pk_set:
+        # Django only reports the rows that were actually inserted
+        if reverse:
+            progress_rows = Progress.objects.filter(pk__in=pk_set)
+            progress_rows.update(items_completed=F('items_completed') + 1)
+            for student_id, course_id in progress_rows.values_list('student_id', 'course_id'):
+                CourseProgressSummary.objects.record_completions(student_id, course_id, 1)
+        else:
+            Progress.objects.filter(pk=instance.pk).update(
+                items_completed=F('items_completed') + len(pk_set)
+            )
+            instance.items_completed += len(pk_set)
+            CourseProgressSummary.objects.record_completions(instance.student_id, instance.course_id, len(pk_set))
+
+    elif action == 'pre_clear' and reverse:
+        # The reverse side has no pk_set on clear, so remember who is affected
+        instance._cleared_progress_ids = list(instance.completed_by.values_list('pk', flat=True))
+
+    elif action in ('post_remove', 'post_clear'):
+        if not reverse:
+            instance.refresh_counters()
+            CourseProgressSummary.objects.recount(instance.course_id, [instance.student_id])
+        elif action == 'post_remove':
+            recount_completed_items(pk_set)
+        else:
+            recount_completed_items(getattr(instance, '_cleared_progress_ids', []))
+
+
+@receiver(post_save, sender=Lesson)
+@receiver(post_save, sender=Video)
+@receiver(post_save, sender=Quiz)
+def increment_module_items_total(sender, instance, created, **kwargs):
+    """
+    Count new content in the totals of every Progress row for its module.
+    """
+    if created:
+        Progress.objects.filter(module_id=instance.module_id).update(items_total=F('items_total') + 1)
+        course_id = Module.objects.filter(pk=instance.module_id).values_list('course_id', flat=True).first()
+        CourseProgressSummary.objects.adjust_totals(course_id, 1)
+
+
+@receiver(pre_save, sender=Lesson)
+@receiver(pre_save, sender=Video)
+@receiver(pre_save, sender=Quiz)
+def note_previous_module(sender, instance, raw=False, **kwargs):
+    """
+    Remember the module that existing content is saved from, to detect moves.
+    """
+    instance._previous_module_id = None
+    if not raw and not instance._state.adding and instance.pk:
+        instance._previous_module_id = sender.objects.filter(pk=instance.pk).values_list(
+            'module_id', flat=True
+        ).first()
+
+
+@receiver(post_save, sender=Lesson)
+@receiver(post_save, sender=Video)
+@receiver(post_save, sender=Quiz)
+def move_content_progress(sender, instance, created, **kwargs):
+    """
+    Carry the totals and completions of content moved to another module.
+    """
+    previous_module_id = getattr(instance, '_previous_module_id', None)
+    if created or previous_module_id is None or previous_module_id == instance.module_id:
+        return
+    courses = dict(
+        Module.objects.filter(pk__in=[previous_module_id, instance.module_id]).values_list('pk', 'course_id')
+    )
+    previous_course_id, course_id = courses.get(previous_module_id), courses.get(instance.module_id)
+
+    Progress.objects.filter(module_id=previous_module_id, items_total__gt=0).update(
+        items_total=F('items_total') - 1
+    )
+    Progress.objects.filter(module_id=instance.module_id).update(items_total=F('items_total') + 1)
+    if previous_course_id != course_id:
+        CourseProgressSummary.objects.adjust_totals(previous_course_id, -1)
+        CourseProgressSummary.objects.adjust_totals(course_id, 1)
+
+    # Students who completed the content keep it completed in its new module
+    if bitmaps.bitmap_storage_enabled():
+        # Move the registry entry, and with it the completion bits, to the new course first
+        bitmaps.sync_content(instance)
+        student_ids = bitmaps.completed_student_ids(instance, course_id) if course_id else []
+        completions = None
+    else:
+        through = Progress._meta.get_field(COMPLETION_FIELDS[sender]).remote_field.through
+        item_field = f'{sender._meta.model_name}_id'
+        completions = through.objects.filter(**{item_field: instance.pk}, progress__module_id=previous_module_id)
+        student_ids = list(completions.values_list('progress__student_id', flat=True))
+    if not student_ids:
+        return
+
+    moved_to = {}
+    for student_id in student_ids:
+        # New rows snapshot the module size, which already includes the content
+        progress, _ = Progress.objects.get_or_create(
+            student_id=student_id, course_id=course_id, module_id=instance.module_id
+        )
+        moved_to[student_id] = progress.pk
+    if completions is not None:
+        completions.delete()
+        through.objects.bulk_create([
+            through(progress_id=progress_id, **{item_field: instance.pk}) for progress_id in moved_to.values()
+        ])
+    recount_completed_items(
+        list(Progress.objects.filter(
+            student_id__in=student_ids, module_id__in=[previous_module_id, instance.module_id]
+        ).values_list('pk', flat=True))
+    )
+
+
+@receiver(pre_delete, sender=Lesson)
+@receiver(pre_delete, sender=Video)
+@receiver(pre_delete, sender=Quiz)
+def discount_deleted_completions(sender, instance, **kwargs):
+    """
+    Drop deleted content from the completed counts before its join rows disappear.
+    """
+    # Remember the course while the module still exists, for the roll-up recount
+    instance._course_id = Module.objects.filter(pk=instance.module_id).values_list('course_id', flat=True).first()
+
+    if bitmaps.bitmap_storage_enabled():
+        bitmaps.discount_deleted_content(instance)
+        return
+
+    field_name = COMPLETION_FIELDS[sender]
+    Progress.objects.filter(
+        **{field_name: instance},
+        items_completed__gt=0
+    ).update(items_completed=F('items_completed') - 1)
+
+
+@receiver(post_delete, sender=Lesson)
+@receiver(post_delete, sender=Video)
+@receiver(post_delete, sender=Quiz)
+def decrement_module_items_total(sender, instance, **kwargs):
+    """
+    Remove deleted content from the totals of its module's Progress rows.
+    """
+    Progress.objects.filter(
+        module_id=instance.module_id,
+        items_total__gt=0
+    ).update(items_total=F('items_total') - 1)
+
+    course_id = getattr(instance, '_course_id', None)
+    if course_id:
+        CourseProgressSummary.objects.recount(course_id)
+
+
+@receiver(post_save, sender=Enrollment)
+def create_progress_summary(sender, instance, created, **kwargs):
+    """
+    Start a completion roll-up for each new enrollment.
+    """
+    if created:
+        CourseProgressSummary.objects.get_or_create(
+            enrollment=instance,
+            defaults={'items_total': instance.course.total_items}
+        )
+
+
+@receiver(post_save, sender=Lesson)
+@receiver(post_save, sender=Video)
+@receiver(post_save, sender=Quiz)
+def register_content_position(sender, instance, created, **kwargs):
+    """
+    Register new content with a stable bit position in its course, and keep
+    the registry's module and order in step with later edits.
+    """
+    if created:
+        bitmaps.register_content(instance)
+    else:
+        bitmaps.sync_content(instance)
+
+
+@receiver(post_delete, sender=Lesson)
+@receiver(post_delete, sender=Video)
+@receiver(post_delete, sender=Quiz)
+def retire_content_position(sender, instance, **kwargs):
+    """
+    Deactivate the bit position of deleted content.
+    """
+    bitmaps.deactivate_content(instance)
+
+
+@receiver(post_save, sender=Module)
+@receiver(post_delete, sender=Module)
+def invalidate_outline_for_module(sender, instance, **kwargs):
+    """
+    Drop the cached outline when a module changes.
+    """
+    CourseOutline.invalidate(instance.course_id)
+
+
+@receiver(post_save, sender=Lesson)
+@receiver(post_save, sender=Video)
+@receiver(post_save, sender=Quiz)
+@receiver(post_delete, sender=Lesson)
+@receiver(post_delete, sender=Video)
+@receiver(post_delete, sender=Quiz)
+def invalidate_outline_for_content(sender, instance, **kwargs):
+    """
+    Drop the cached outline when a lesson, video or quiz changes.
+    """
+    course_id = Module.objects.filter(pk=instance.module_id).values_list('course_id', flat=True).first()
+    if course_id:
+        CourseOutline.invalidate(course_id)
+
+
+@receiver(post_save, sender=Question)
+@receiver(post_delete, sender=Question)
+def invalidate_outline_for_question(sender, instance, **kwargs):
+    """
+    Drop the cached outline when a question changes, since it carries question counts.
+    """
+    if invalidation_deferred():
+        return
+    course_id = Quiz.objects.filter(pk=instance.quiz_id).values_list('module__course_id', flat=True).first()
+    if course_id:
+        CourseOutline.invalidate(course_id)
+
+
+@receiver(post_save, sender=Question)
+@receiver(post_delete, sender=Question)
+def invalidate_answer_key_for_question(sender, instance, **kwargs):
+    """
+    Recompile a quiz's answer key when one of its questions changes.
+    """
+    if invalidation_deferred():
+        return
+    AnswerKey.invalidate(instance.quiz_id)
+
+
+@receiver(post_save, sender=Answer)
+@receiver(post_delete, sender=Answer)
+def invalidate_answer_key_for_answer(sender, instance, **kwargs):
+    """
+    Recompile a quiz's answer key when one of its answers changes.
+    """
+    if invalidation_deferred():
+        return
+    quiz_id = Question.objects.filter(pk=instance.question_id).values_list('quiz_id', flat=True).first()
+    if quiz_id:
+        AnswerKey.invalidate(quiz_id)
+
+
+@receiver(post_save, sender=Quiz)
+@receiver(post_delete, sender=Quiz)
+def invalidate_question_bank_for_quiz(sender, instance, **kwargs):
+    """
+    Rebuild the question bank when a quiz, and so its questions' module, changes.
+    """
+    course_id = Module.objects.filter(pk=instance.module_id).values_list('course_id', flat=True).first()
+    if course_id:
+        QuestionBank.invalidate(course_id)
+
+
+@receiver(post_save, sender=Question)
+@receiver(post_delete, sender=Question)
+def invalidate_question_bank_for_question(sender, instance, **kwargs):
+    """
+    Rebuild the question bank of a course when one of its questions changes.
+    """
+    if invalidation_deferred():
+        return
+    course_id = Quiz.objects.filter(pk=instance.quiz_id).values_list('module__course_id', flat=True).first()
+    if course_id:
+        QuestionBank.invalidate(course_id)
+
+
+@receiver(post_save, sender=ContentDifficulty)
+def invalidate_question_bank_for_difficulty(sender, instance, **kwargs):
+    """
+    Rebuild the question bank when a question's difficulty rating changes.
+    """
+    if instance.content_type == 'question':
+        course_id = Question.objects.filter(pk=instance.content_id).values_list(
+            'quiz__module__course_id', flat=True
+        ).first()
+        if course_id:
+            QuestionBank.invalidate(course_id)
+
+
+def attempt_just_completed(instance, created):
+    """
+    Whether this save completed the attempt: it was created complete, or
+    note_attempt_completion saw it go from in progress to complete.
+    """
+    return instance.completed and (created or getattr(instance, '_completes_now', False))
+
+
+@receiver(pre_save, sender=QuizAttempt)
+def note_attempt_completion(sender, instance, raw=False, **kwargs):
+    """
+    Remember whether this save is the one that completes an existing attempt.
+    """
+    instance._completes_now = bool(
+        not raw and instance.pk and instance.completed
+        and QuizAttempt.objects.filter(pk=instance.pk, completed=False).exists()
+    )
+
+
+@receiver(post_save, sender=QuizAttempt)
+def update_attempt_summary(sender, instance, created, raw=False, **kwargs):
+    """
+    Add each attempt to the user's summary for the quiz once, when it completes.
+    """
+    if not raw and attempt_just_completed(instance, created):
+        QuizAttemptSummary.objects.record_attempt(instance)
@@ -0,0 +1,554 @@
+import tempfile
+from datetime import timedelta
+from unittest import mock
+
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from accounts.models import CustomUser
+from gamification.models import PointsTransaction
+from . import bitmaps
+from .cache import get_cache, get_or_build, versioned_key
+from . import exam
+from .archive import archive_attempts, attempt_history, get_attempt, latest_attempt
+from .authoring import apply_questions
+from .completion import complete_item, replay_events
+from .grading import AnswerKey
+from .models import (
+    Answer, CompletionEvent, ContentItem, Course, CourseCompletion, CourseProgressSummary, Enrollment, Lesson,
+    Module, Progress, Question, Quiz, QuizAnswer, QuizAttempt, QuizAttemptArchive, QuizAttemptSummary,
+    QuizSubmissionTask, pack_responses, unpack_responses
+)
+
+
+class EditQuizViewTests(TestCase):
+    """
+    Posting the quiz editor applies the question set through apply_questions.
+    """
+
+    def setUp(self):
+        self.instructor = CustomUser.objects.create_user(
+            username='instructor', password='password', is_instructor=True
+        )
+        course = Course.objects.create(
+            title='Course', slug='course', description='Description',
+            instructor=self.instructor, learning_outcomes='Outcomes'
+        )
+        module = Module.objects.create(course=course, title='Module')
+        self.quiz = Quiz.objects.create(module=module, title='Quiz')
+        self.question = Question.objects.create(
+            quiz=self.quiz, title='Capital', text='Capital of France?', question_type='true_false',
+            explanation='Paris has been the capital since 987.', points=2, order=0
+        )
+        self.paris = Answer.objects.create(question=self.question, text='Paris', is_correct=True)
+        Answer.objects.create(question=self.question, text='Lyon', is_correct=False)
+        self.removed = Question.objects.create(quiz=self.quiz, text='Removed?', order=1)
+        Answer.objects.create(question=self.removed, text='Yes', is_correct=True)
+        self.client.force_login(self.instructor)
+
+    def test_post_applies_edited_questions(self):
+        question_key = f'questions[{self.question.id}]'
+        response = self.client.post(reverse('courses:edit_quiz', args=[self.quiz.id]), {
+            'title': 'Renamed quiz',
+            'description': 'Quiz on French cities',
+            'time_limit': 30,
+            'passing_score': 70,
+            'order': 0,
+            f'{question_key}[title]': 'Capital city',
+            f'{question_key}[text]': 'What is the capital of France?',
+            f'{question_key}[points]': 3,
+            f'{question_key}[order]': 0,
+            f'{question_key}[answers][]': ['Paris', 'Marseille'],
+            f'{question_key}[correct_answer]': 0,
+            'questions[new_1][title]': 'Largest',
+            'questions[new_1][text]': 'Largest French city?',
+            'questions[new_1][points]': 1,
+            'questions[new_1][order]': 1,
+            'questions[new_1][answers][]': ['Lille', 'Paris'],
+            'questions[new_1][correct_answer]': 1,
+            'deleted_questions[]': [self.removed.id],
+        })
+
+        self.assertRedirects(
+            response, reverse('courses:module_content_list', args=[self.quiz.module_id]),
+            fetch_redirect_response=False
+        )
+        self.quiz.refresh_from_db()
+        self.assertEqual(self.quiz.title, 'Renamed quiz')
+        self.assertFalse(Question.objects.filter(pk=self.removed.pk).exists())
+
+        self.question.refresh_from_db()
+        self.assertEqual(self.question.text, 'What is the capital of France?')
+        self.assertEqual(self.question.points, 3)
+        # Fields the form does not submit keep their stored values
+        self.assertEqual(self.question.question_type, 'true_false')
+        self.assertEqual(self.question.explanation, 'Paris has been the capital since 987.')
+        self.assertEqual(
+            list(self.question.answers.order_by('id').values_list('text', 'is_correct')),
+            [('Paris', True), ('Marseille', False)]
+        )
+        # The unchanged answer keeps its row
+        self.assertTrue(self.question.answers.filter(pk=self.paris.pk).exists())
+
+        new_question = Question.objects.get(quiz=self.quiz, title='Largest')
+        self.assertEqual(new_question.question_type, 'multiple_choice')
+        self.assertEqual(
+            list(new_question.answers.order_by('id').values_list('text', 'is_correct')),
+            [('Lille', False), ('Paris', True)]
+        )
+
+
+class CompletionBitsetTests(TestCase):
+    """
+    The bitset codec behind bitmap completion storage.
+    """
+
+    def test_bytes_round_trip(self):
+        bitset = bitmaps.CompletionBitset.from_positions([0, 7, 8, 130])
+        self.assertEqual(bitmaps.CompletionBitset.from_bytes(bitset.to_bytes()), bitset)
+        self.assertEqual(list(bitset), [0, 7, 8, 130])
+        self.assertEqual(len(bitset), 4)
+        self.assertEqual(bitmaps.CompletionBitset.from_bytes(None), bitmaps.CompletionBitset())
+        self.assertEqual(bitmaps.CompletionBitset().to_bytes(), b'')
+
+    def test_updates_report_changed_bits(self):
+        bitset = bitmaps.CompletionBitset.from_positions([1, 2])
+        self.assertEqual(bitset.update([2, 3, 4]), 2)
+        self.assertEqual(bitset.difference_update([1, 5]), 1)
+        self.assertEqual(list(bitset), [2, 3, 4])
+
+    def test_union_and_intersection(self):
+        bitsets = [bitmaps.CompletionBitset.from_positions(positions) for positions in ([1, 2, 3], [2, 3], [3, 9])]
+        self.assertEqual(list(bitmaps.CompletionBitset.union(bitsets)), [1, 2, 3, 9])
+        self.assertEqual(list(bitmaps.CompletionBitset.intersection(bitsets)), [3])
+        self.assertEqual(len(bitmaps.CompletionBitset.intersection([])), 0)
+
+
+@override_settings(COMPLETION_STORAGE='bitmap')
+class BitmapCompletionTests(TestCase):
+    """
+    Completions stored in course bitmaps through BitmapCompletionManager.
+    """
+
+    def setUp(self):
+        # Cached indexes would outlive the rolled back rows they describe
+        get_cache().clear()
+        instructor = CustomUser.objects.create_user(username='instructor', password='password')
+        self.student = CustomUser.objects.create_user(username='student', password='password', is_student=True)
+        self.course = Course.objects.create(
+            title='Course', slug='course', description='Description',
+            instructor=instructor, learning_outcomes='Outcomes'
+        )
+        self.module = Module.objects.create(course=self.course, title='Module')
+        self.lessons = [
+            Lesson.objects.create(module=self.module, title=f'Lesson {number}', content='Content', order=number)
+            for number in range(3)
+        ]
+
+    def progress(self, module=None):
+        return Progress.objects.get(student=self.student, module=module or self.module)
+
+    def test_add_and_remove(self):
+        complete_item(self.student, self.lessons[0])
+        complete_item(self.student, self.lessons[2])
+        progress = self.progress()
+        self.assertEqual(progress.items_completed, 2)
+        self.assertEqual(progress.completed_lessons.get_ids(), {self.lessons[0].pk, self.lessons[2].pk})
+        self.assertEqual(
+            bitmaps.completed_ids(self.student, self.course.pk)['lesson'], {self.lessons[0].pk, self.lessons[2].pk}
+        )
+
+        progress.completed_lessons.remove(self.lessons[0])
+        self.assertEqual(progress.completed_lessons.count(), 1)
+        self.assertEqual(self.progress().items_completed, 1)
+        progress.completed_lessons.clear()
+        self.assertEqual(self.progress().items_completed, 0)
+
+    def test_deleted_content_leaves_completions(self):
+        complete_item(self.student, self.lessons[0])
+        complete_item(self.student, self.lessons[1])
+        self.lessons[0].delete()
+        self.assertEqual(bitmaps.completed_ids(self.student, self.course.pk)['lesson'], {self.lessons[1].pk})
+        self.assertEqual(self.progress().items_completed, 1)
+
+    def test_unregistered_content_is_registered_on_completion(self):
+        ContentItem.objects.filter(kind='lesson', object_id=self.lessons[1].pk).delete()
+        bitmaps.ContentIndex.invalidate(self.course.pk)
+
+        self.assertIsNotNone(complete_item(self.student, self.lessons[1]))
+        self.assertTrue(ContentItem.objects.filter(kind='lesson', object_id=self.lessons[1].pk).exists())
+        self.assertEqual(self.progress().completed_lessons.get_ids(), {self.lessons[1].pk})
+
+    def test_stale_cached_index_rereads_registry(self):
+        # An index cached before the lesson was registered, as another process would hold
+        stale = bitmaps.ContentIndex(self.course.pk, {}, bitmaps.CompletionBitset())
+        get_cache().set(versioned_key(bitmaps.CONTENT_INDEX_CACHE_NAMESPACE, self.course.pk), stale)
+
+        self.assertIsNotNone(complete_item(self.student, self.lessons[0]))
+        self.assertEqual(self.progress().items_completed, 1)
+        self.assertEqual(bitmaps.completed_ids(self.student, self.course.pk)['lesson'], {self.lessons[0].pk})
+
+    def test_content_of_another_course_raises(self):
+        other_course = Course.objects.create(
+            title='Other', slug='other', description='Description',
+            instructor=self.course.instructor, learning_outcomes='Outcomes'
+        )
+        other_lesson = Lesson.objects.create(
+            module=Module.objects.create(course=other_course, title='Other'), title='Other', content='Content'
+        )
+        progress, _ = Progress.objects.get_or_create(student=self.student, course=self.course, module=self.module)
+        with self.assertRaises(ValueError):
+            progress.completed_lessons.add(other_lesson)
+
+    def test_content_moved_to_another_course_keeps_completions(self):
+        complete_item(self.student, self.lessons[0])
+        complete_item(self.student, self.lessons[1])
+        other_course = Course.objects.create(
+            title='Other', slug='other', description='Description',
+            instructor=self.course.instructor, learning_outcomes='Outcomes'
+        )
+        Lesson.objects.create(
+            module=Module.objects.create(course=other_course, title='Existing'), title='Existing', content='Content'
+        )
+        other_module = Module.objects.create(course=other_course, title='Other')
+
+        lesson = self.lessons[0]
+        lesson.module = other_module
+        lesson.save()
+
+        item = ContentItem.objects.get(kind='lesson', object_id=lesson.pk)
+        self.assertEqual((item.course_id, item.module_id, item.position), (other_course.pk, other_module.pk, 1))
+        self.assertEqual(bitmaps.completed_ids(self.student, self.course.pk)['lesson'], {self.lessons[1].pk})
+        self.assertEqual(bitmaps.completed_ids(self.student, other_course.pk)['lesson'], {lesson.pk})
+        self.assertEqual(self.progress().items_completed, 1)
+        self.assertEqual(self.progress(other_module).items_completed, 1)
+        self.assertEqual(
+            CourseCompletion.objects.filter(student=self.student).count(), 2
+        )
+
+
+class ReplayEventsTests(TestCase):
+    """
+    Rebuilding progress, roll-ups and points from the completion log.
+    """
+
+    def setUp(self):
+        instructor = CustomUser.objects.create_user(username='instructor', password='password')
+        self.student = CustomUser.objects.create_user(username='student', password='password', is_student=True)
+        self.course = Course.objects.create(
+            title='Course', slug='course', description='Description',
+            instructor=instructor, learning_outcomes='Outcomes'
+        )
+        self.modules = [Module.objects.create(course=self.course, title=f'Module {number}') for number in range(2)]
+        self.lessons = [
+            Lesson.objects.create(module=module, title=f'Lesson {number}', content='Content')
+            for number, module in enumerate(self.modules * 2)
+        ]
+        self.enrollment = Enrollment.objects.create(student=self.student, course=self.course)
+
+    def test_repeated_completion_is_ignored(self):
+        self.assertIsNotNone(complete_item(self.student, self.lessons[0], points=10))
+        self.assertIsNone(complete_item(self.student, self.lessons[0], points=10))
+        self.assertEqual(CompletionEvent.objects.filter(student=self.student).count(), 1)
+        self.assertEqual(PointsTransaction.objects.filter(user=self.student).count(), 1)
+
+    def test_replay_rebuilds_lost_state(self):
+        for lesson in self.lessons[:3]:
+            complete_item(self.student, lesson, points=10)
+        # An event whose points never reached the ledger
+        CompletionEvent.objects.filter(object_id=self.lessons[2].pk).update(points_transaction=None)
+        PointsTransaction.objects.filter(description__contains=self.lessons[2].title).delete()
+        Progress.objects.filter(student=self.student).delete()
+        CourseProgressSummary.objects.filter(enrollment=self.enrollment).update(items_completed=0, percentage=0)
+
+        self.assertEqual(replay_events(course_ids=[self.course.pk]), 1)
+
+        first, second = (Progress.objects.get(student=self.student, module=module) for module in self.modules)
+        self.assertEqual((first.items_total, first.items_completed), (2, 2))
+        self.assertEqual((second.items_total, second.items_completed), (2, 1))
+        self.assertEqual(set(first.completed_lessons.values_list('pk', flat=True)), {self.lessons[0].pk, self.lessons[2].pk})
+        summary = CourseProgressSummary.objects.get(enrollment=self.enrollment)
+        self.assertEqual((summary.items_total, summary.items_completed, summary.percentage), (4, 3, 75))
+        self.assertFalse(CompletionEvent.objects.filter(points__gt=0, points_transaction__isnull=True).exists())
+        self.student.refresh_from_db()
+        self.assertEqual(self.student.points, 30)
+
+        # Replaying again changes nothing
+        replay_events(student_ids=[self.student.pk])
+        self.assertEqual(PointsTransaction.objects.filter(user=self.student).count(), 3)
+        self.assertEqual(Progress.objects.get(pk=first.pk).items_completed, 2)
+
+    def test_replay_completes_finished_enrollments(self):
+        for lesson in self.lessons:
+            complete_item(self.student, lesson)
+        Enrollment.objects.filter(pk=self.enrollment.pk).update(status='enrolled')
+        Progress.objects.filter(student=self.student).delete()
+
+        replay_events()
+
+        self.enrollment.refresh_from_db()
+        self.assertEqual(self.enrollment.status, 'completed')
+        self.assertEqual(Progress.objects.get(student=self.student, module=self.modules[1]).items_completed, 2)
+
+
+class CourseContentViewTests(TestCase):
+    """
+    The course content page lists each module's items in registry order.
+    """
+
+    def test_items_interleave_by_order(self):
+        get_cache().clear()
+        instructor = CustomUser.objects.create_user(username='instructor', password='password')
+        student = CustomUser.objects.create_user(username='student', password='password', is_student=True)
+        course = Course.objects.create(
+            title='Course', slug='course', description='Description',
+            instructor=instructor, learning_outcomes='Outcomes'
+        )
+        module = Module.objects.create(course=course, title='Module')
+        Lesson.objects.create(module=module, title='Second lesson', content='Content', order=2)
+        Quiz.objects.create(module=module, title='First quiz', order=1)
+        Lesson.objects.create(module=module, title='Third lesson', content='Content', order=3)
+        Enrollment.objects.create(student=student, course=course)
+        self.client.force_login(student)
+
+        response = self.client.get(reverse('courses:course_content', args=[course.slug]))
+
+        content = response.content.decode()
+        positions = [content.index(title) for title in ('First quiz', 'Second lesson', 'Third lesson')]
+        self.assertEqual(positions, sorted(positions))
+
+
+class VersionedCacheTests(TestCase):
+    """
+    Versioned caching with per-process and shared cache backends.
+    """
+
+    def setUp(self):
+        instructor = CustomUser.objects.create_user(username='instructor', password='password')
+        course = Course.objects.create(
+            title='Course', slug='course', description='Description',
+            instructor=instructor, learning_outcomes='Outcomes'
+        )
+        self.quiz = Quiz.objects.create(module=Module.objects.create(course=course, title='Module'), title='Quiz')
+        question = Question.objects.create(quiz=self.quiz, text='Capital of France?', points=2)
+        self.paris = Answer.objects.create(question=question, text='Paris', is_correct=True)
+        self.lyon = Answer.objects.create(question=question, text='Lyon', is_correct=False)
+        self.submission = {f'question_{question.pk}': str(self.lyon.pk)}
+
+    def edit_in_another_process(self):
+        # A queryset update sends no signals, like an edit whose invalidation this process never sees
+        Answer.objects.filter(pk=self.paris.pk).update(is_correct=False)
+        Answer.objects.filter(pk=self.lyon.pk).update(is_correct=True)
+
+    def test_local_cache_never_serves_stale_answer_keys(self):
+        get_cache().clear()
+        self.assertEqual(AnswerKey.get(self.quiz.pk).grade(self.submission).score, 0)
+        self.edit_in_another_process()
+        self.assertEqual(AnswerKey.get(self.quiz.pk).grade(self.submission).score, 2)
+
+    @override_settings(COURSE_OUTLINE_CACHE_TIMEOUT=3600, COURSE_OUTLINE_LOCAL_CACHE_TIMEOUT=0)
+    def test_local_cache_caps_timeout(self):
+        builds = []
+
+        def build():
+            builds.append(1)
+            return len(builds)
+
+        get_or_build('test', 1, build)
+        get_or_build('test', 1, build)
+        self.assertEqual(len(builds), 2)
+
+    def test_shared_cache_keeps_answer_keys_until_invalidated(self):
+        with tempfile.TemporaryDirectory() as location:
+            backend = 'django.core.cache.backends.filebased.FileBasedCache'
+            with self.settings(CACHES={'default': {'BACKEND': backend, 'LOCATION': location}}):
+                self.assertEqual(AnswerKey.get(self.quiz.pk).grade(self.submission).score, 0)
+                self.edit_in_another_process()
+                self.assertEqual(AnswerKey.get(self.quiz.pk).grade(self.submission).score, 0)
+                AnswerKey.invalidate(self.quiz.pk)
+                self.assertEqual(AnswerKey.get(self.quiz.pk).grade(self.submission).score, 2)
+
+
+@override_settings(QUIZ_EXAM_MODE=True, QUIZ_SUBMISSION_MAX_TRIES=2)
+class ExamModeTests(TestCase):
+    """
+    Exam-mode submissions through take_quiz and the submission task queue.
+    """
+
+    def setUp(self):
+        instructor = CustomUser.objects.create_user(username='instructor', password='password')
+        self.student = CustomUser.objects.create_user(username='student', password='password', is_student=True)
+        course = Course.objects.create(
+            title='Course', slug='course', description='Description',
+            instructor=instructor, learning_outcomes='Outcomes'
+        )
+        self.quiz = Quiz.objects.create(
+            module=Module.objects.create(course=course, title='Module'), title='Quiz', passing_score=50
+        )
+        self.question = Question.objects.create(quiz=self.quiz, text='Capital of France?', points=2)
+        self.paris = Answer.objects.create(question=self.question, text='Paris', is_correct=True)
+        Enrollment.objects.create(student=self.student, course=course)
+        self.client.force_login(self.student)
+
+    def submit(self):
+        url = reverse('courses:take_quiz', args=[self.quiz.pk])
+        self.client.get(url)
+        return self.client.post(url, {f'question_{self.question.pk}': self.paris.pk, 'submit_quiz': '1'})
+
+    def test_take_quiz_defers_side_effects(self):
+        self.submit()
+
+        attempt = QuizAttempt.objects.get(user=self.student, quiz=self.quiz)
+        self.assertTrue(attempt.completed and attempt.passed)
+        self.assertEqual(attempt.score, 2)
+        task = QuizSubmissionTask.objects.get(attempt=attempt)
+        self.assertTrue(task.replay_post_save)
+        # Nothing that hangs off post_save or completion ran on the request
+        self.assertFalse(QuizAttemptSummary.objects.filter(user=self.student).exists())
+        self.assertFalse(CompletionEvent.objects.filter(student=self.student).exists())
+
+        self.assertEqual(exam.drain(), (1, 0))
+
+        self.assertEqual(QuizSubmissionTask.objects.get(pk=task.pk).status, 'done')
+        self.assertEqual(QuizAttemptSummary.objects.get(user=self.student, quiz=self.quiz).attempt_count, 1)
+        self.assertTrue(CompletionEvent.objects.filter(student=self.student, kind='quiz').exists())
+        self.assertEqual(exam.drain(), (0, 0))
+
+    def test_completed_attempt_is_not_submitted_twice(self):
+        attempt = QuizAttempt.objects.create(user=self.student, quiz=self.quiz, score=2, max_score=2, passed=True)
+        self.assertIsNotNone(exam.submit_attempt(attempt))
+        self.assertIsNone(exam.submit_attempt(attempt))
+        self.assertEqual(QuizSubmissionTask.objects.count(), 1)
+
+    def test_task_is_claimed_once(self):
+        self.submit()
+        claimed = exam.claim_tasks(10)
+        self.assertEqual(len(claimed), 1)
+        self.assertEqual(exam.claim_tasks(10), [])
+
+    def test_failed_task_is_retried_then_given_up(self):
+        self.submit()
+        with mock.patch('courses.exam.apply_attempt_effects', side_effect=RuntimeError('boom')):
+            self.assertEqual(exam.drain(), (0, 1))
+            task = QuizSubmissionTask.objects.get()
+            self.assertEqual((task.status, task.tries), ('pending', 1))
+            self.assertIn('boom', task.last_error)
+            self.assertEqual(exam.drain(), (0, 1))
+        self.assertEqual(QuizSubmissionTask.objects.get().status, 'failed')
+        self.assertEqual(exam.drain(), (0, 0))
+
+    def test_stale_claims_are_requeued(self):
+        self.submit()
+        task_id, = exam.claim_tasks(1)
+        self.assertEqual(exam.requeue_stale(), 0)
+        QuizSubmissionTask.objects.filter(pk=task_id).update(claimed_at=timezone.now() - timedelta(hours=1))
+        self.assertEqual(exam.requeue_stale(), 1)
+        self.assertEqual(exam.drain(), (1, 0))
+
+
+class ApplyQuestionsTests(TestCase):
+    """
+    Bulk question authoring through apply_questions.
+    """
+
+    def setUp(self):
+        instructor = CustomUser.objects.create_user(username='instructor', password='password')
+        course = Course.objects.create(
+            title='Course', slug='course', description='Description',
+            instructor=instructor, learning_outcomes='Outcomes'
+        )
+        self.quiz = Quiz.objects.create(module=Module.objects.create(course=course, title='Module'), title='Quiz')
+        self.existing = Question.objects.create(quiz=self.quiz, text='Existing?', order=0)
+        Answer.objects.create(question=self.existing, text='Yes', is_correct=True)
+
+    def questions(self):
+        return [
+            {'id': self.existing.pk, 'text': 'Existing?', 'answers': [{'text': 'Yes', 'is_correct': True}]},
+            {'text': 'First new?', 'answers': [{'text': 'A', 'is_correct': True}, {'text': 'B', 'is_correct': False}]},
+            {'text': 'Second new?', 'answers': [{'text': 'C', 'is_correct': False}, {'text': 'D', 'is_correct': True}]},
+        ]
+
+    def assert_new_answers(self):
+        for text, answers in (('First new?', [('A', True), ('B', False)]), ('Second new?', [('C', False), ('D', True)])):
+            question = Question.objects.get(quiz=self.quiz, text=text)
+            self.assertEqual(list(question.answers.order_by('id').values_list('text', 'is_correct')), answers)
+
+    def test_creates_questions_with_answers(self):
+        result = apply_questions(self.quiz, self.questions())
+        self.assertEqual((result.questions_created, result.answers_created), (2, 4))
+        self.assert_new_answers()
+
+    def test_backends_without_returned_ids(self):
+        features = type(connection.features)
+        with mock.patch.object(features, 'can_return_rows_from_bulk_insert', mock.PropertyMock(return_value=False)):
+            result = apply_questions(self.quiz, self.questions())
+        self.assertEqual((result.questions_created, result.answers_created), (2, 4))
+        self.assert_new_answers()
+
+
+class QuizAttemptArchiveTests(TestCase):
+    """
+    Moving old attempts into the archive and reading them back.
+    """
+
+    def setUp(self):
+        instructor = CustomUser.objects.create_user(username='instructor', password='password')
+        self.student = CustomUser.objects.create_user(username='student', password='password', is_student=True)
+        course = Course.objects.create(
+            title='Course', slug='course', description='Description',
+            instructor=instructor, learning_outcomes='Outcomes'
+        )
+        self.quiz = Quiz.objects.create(module=Module.objects.create(course=course, title='Module'), title='Quiz')
+        self.question = Question.objects.create(quiz=self.quiz, text='Capital of France?')
+        self.paris = Answer.objects.create(question=self.question, text='Paris', is_correct=True)
+        now = timezone.now()
+        self.attempts = [
+            QuizAttempt.objects.create(
+                user=self.student, quiz=self.quiz, score=score, max_score=1, completed=True, passed=bool(score),
+                completed_at=now - timedelta(days=days)
+            )
+            for score, days in ((1, 400), (0, 200), (1, 1))
+        ]
+        for attempt in self.attempts:
+            QuizAnswer.objects.create(
+                quiz_attempt=attempt, question=self.question, answer=self.paris, is_correct=bool(attempt.score)
+            )
+
+    def test_pack_round_trip(self):
+        responses = [(1, 10, True), (2, None, False), (3, 30, False)]
+        self.assertEqual(unpack_responses(pack_responses(responses)), responses)
+        self.assertEqual(unpack_responses(pack_responses([])), [])
+        self.assertEqual(unpack_responses(None), [])
+
+    def test_archive_moves_old_attempts(self):
+        summary = QuizAttemptSummary.objects.get(user=self.student, quiz=self.quiz)
+
+        self.assertEqual(archive_attempts(before=timezone.now() - timedelta(days=30)), 2)
+
+        self.assertEqual(list(QuizAttempt.objects.values_list('pk', flat=True)), [self.attempts[2].pk])
+        self.assertFalse(QuizAnswer.objects.filter(quiz_attempt_id__in=[a.pk for a in self.attempts[:2]]).exists())
+        archived = QuizAttemptArchive.objects.get(pk=self.attempts[0].pk)
+        self.assertEqual(archived.responses, [(self.question.pk, self.paris.pk, True)])
+        completed_at = self.attempts[0].completed_at
+        self.assertEqual(archived.period, completed_at.year * 100 + completed_at.month)
+        # The summary already covers both tables
+        self.assertEqual(QuizAttemptSummary.objects.get(pk=summary.pk).attempt_count, 3)
+        self.assertEqual(archive_attempts(before=timezone.now() - timedelta(days=30)), 0)
+
+    def test_reads_fall_through_to_archive(self):
+        archive_attempts(before=timezone.now() - timedelta(days=30))
+
+        history = attempt_history(self.student, self.quiz)
+        self.assertEqual([attempt.pk for attempt in history], [attempt.pk for attempt in reversed(self.attempts)])
+        self.assertEqual([attempt.pk for attempt in attempt_history(self.student, self.quiz, limit=2)],
+                         [self.attempts[2].pk, self.attempts[1].pk])
+        self.assertIsInstance(get_attempt(self.student, self.quiz, self.attempts[0].pk), QuizAttemptArchive)
+        self.assertIsInstance(get_attempt(self.student, self.quiz, self.attempts[2].pk), QuizAttempt)
+        self.assertEqual(latest_attempt(self.student, self.quiz).pk, self.attempts[2].pk)
+
+    def test_unapplied_exam_attempts_stay_live(self):
+        QuizSubmissionTask.objects.create(attempt=self.attempts[0])
+        self.assertEqual(archive_attempts(before=timezone.now() - timedelta(days=30)), 1)
+        self.assertTrue(QuizAttempt.objects.filter(pk=self.attempts[0].pk).exists())
@@ -15,6 +15,7 @@ urlpatterns = [
     path('<slug:course_slug>/video/<int:video_id>/', views.video_detail, name='video_detail'),
     path('<slug:course_slug>/quiz/<int:quiz_id>/', views.quiz_detail, name='quiz_detail'),
     path('quiz/<int:quiz_id>/take/', views.take_quiz, name='take_quiz'),
+    path('quiz/attempt/<int:attempt_id>/autosave/', views.autosave_quiz_attempt, name='autosave_quiz_attempt'),
     path('quiz/results/<int:attempt_id>/', views.quiz_results, name='quiz_results'),
     path('<slug:course_slug>/quiz/<int:quiz_id>/result/<int:attempt_id>/', views.quiz_result, name='quiz_result'),
     
@@ -60,9 +61,10 @@ urlpatterns = [
     path('personalized-recommendations/', views.personalized_recommendations, name='personalized_recommendations'),
 
     # Add personalized quiz URLs
+    path('personalized-quiz/generate/', views.generate_personalized_quiz, name='generate_personalized_quiz'),
     path('personalized-quiz/generate/<int:course_id>/', views.generate_personalized_quiz, name='generate_personalized_quiz'),
-    path('personalized-quiz/take/<int:quiz_id>/', views.take_personalized_quiz, name='take_personalized_quiz'),
-    path('personalized-quiz/results/<int:quiz_id>/', views.personalized_quiz_results, name='personalized_quiz_results'),
+    path('personalized-quiz/take/<int:attempt_id>/', views.take_personalized_quiz, name='take_personalized_quiz'),
+    path('personalized-quiz/results/<int:attempt_id>/', views.personalized_quiz_results, name='personalized_quiz_results'),
 
     # Add the learning path URL pattern
     path('learning-path/', views.learning_path, name='learning_path'),
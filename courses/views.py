@@ -6,7 +6,8 @@ from django.urls import reverse_lazy, reverse
 from django.http import JsonResponse, Http404
 from django.utils import timezone
 from django.contrib import messages
-from django.db.models import Q, Count, Avg, Sum
+from django.db import transaction
+from django.db.models import Q, Avg, Sum
 from django.utils.translation import gettext as _
 from django.utils.text import slugify
 from django.contrib.contenttypes.models import ContentType
@@ -15,19 +16,32 @@ import json
 from datetime import datetime, timedelta
 import random
 from django.forms import inlineformset_factory
-import re
 
 from .models import (
     Category, Course, Module, Lesson, Video, Quiz,
-    Question, Option, Answer, Enrollment, Progress, QuizAttempt,
-    PersonalizedQuizAttempt, Content, StudyPreference, StudySession, Deadline, FocusArea, StudyStreak, StudyGoal, QuizAnswer
+    Question, Enrollment, Progress, QuizAttempt,
+    PersonalizedQuizAttempt, Content, StudyPreference, StudySession, Deadline, FocusArea, StudyStreak, StudyGoal, QuizAnswer,
+    ContentItem, QuizAttemptSummary
 )
-from gamification.models import Point, Achievement, UserAchievement, UserBadge
+from gamification.models import Achievement, UserAchievement, UserBadge
+from gamification.points import award_points
 from .forms import (
     CourseForm, ModuleForm, ModuleFormSet, ContentForm, 
     QuizForm, QuestionForm, QuestionFormSet, AnswerForm, AnswerFormSet
 )
 from accounts.models import CustomUser, UserActivity
+from accounts.activity import record_activity
+from analytics.models import TopicMastery
+from .outline import CourseOutline, CourseNavigation
+from .enrollment import enroll_students
+from .completion import complete_item, quiz_completion_points
+from .grading import AnswerKey, save_responses
+from .autosave import buffer_answers, pending_answers, flush_attempt
+from .exam import exam_mode_enabled, record_attempt, submit_attempt
+from .question_bank import QuestionBank, sample_ids, sample_any
+from .authoring import parse_question_post, apply_questions
+from .archive import attempt_history, get_attempt, latest_attempt
+from .personalized import PersonalizedQuiz, create_personalized_quiz, PERSONALIZED_QUIZ_PASSING_SCORE
 
 
 class CourseListView(ListView):
@@ -93,18 +107,14 @@ class CourseDetailView(DetailView):
         else:
             context['is_enrolled'] = False
         
-        # Get course modules and their content counts
-        modules = course.modules.all().annotate(
-            lesson_count=Count('lessons'),
-            video_count=Count('videos'),
-            quiz_count=Count('quizzes')
-        )
-        context['modules'] = modules
+        # Get course modules and their content from the cached outline
+        outline = CourseOutline.get(course)
+        context['modules'] = outline.modules
         
         # Get total content count
-        context['total_lessons'] = sum(m.lesson_count for m in modules)
-        context['total_videos'] = sum(m.video_count for m in modules)
-        context['total_quizzes'] = sum(m.quiz_count for m in modules)
+        context['total_lessons'] = outline.total_lessons
+        context['total_videos'] = outline.total_videos
+        context['total_quizzes'] = outline.total_quizzes
         
         return context
 
@@ -123,19 +133,8 @@ def enroll_course(request, slug):
         messages.warning(request, "You cannot enroll in your own course")
         return redirect('courses:course_detail', slug=slug)
     
-    # Create enrollment
-    enrollment = Enrollment.objects.create(
-        student=request.user,
-        course=course,
-        status='enrolled'
-    )
-    
-    # Award points for enrolling
-    Point.objects.create(
-        user=request.user,
-        points=10,  # Adjust point value as needed
-        description=f"Enrolled in course: {course.title}"
-    )
+    # Create enrollment and progress records and award points for enrolling
+    enroll_students(course, [request.user], points=10)
     
     # Record user activity
     UserActivity.objects.create(
@@ -194,90 +193,17 @@ def course_content(request, slug):
     # Check if user is enrolled
     enrollment = get_object_or_404(Enrollment, student=request.user, course=course)
     
-    # Get all modules with their content
-    modules = course.modules.all().prefetch_related('lessons', 'videos', 'quizzes')
-    
-    # Get progress for each module
-    progress_records = Progress.objects.filter(
-        student=request.user,
-        course=course
-    )
-    
-    # Create a dictionary of module_id -> progress
-    progress_dict = {p.module_id: p for p in progress_records}
-    
-    # Calculate overall progress and mark modules as completed
-    total_contents = 0
-    completed_contents = 0
-    next_content = None
-    next_quiz = None
-    all_quizzes_completed = True
-    
-    for module in modules:
-        # Count total content items
-        module_total = module.lessons.count() + module.videos.count() + module.quizzes.count()
-        total_contents += module_total
-        
-        # Get progress for this module
-        module_progress = progress_dict.get(module.id)
-        module_completed = 0
-        
-        if module_progress:
-            # Count completed items in this module
-            module_completed = (
-                module_progress.completed_lessons.count() + 
-                module_progress.completed_videos.count() + 
-                module_progress.completed_quizzes.count()
-            )
-            completed_contents += module_completed
-            
-            # Check if module is completed
-            module.is_completed = (module_completed == module_total and module_total > 0)
-        else:
-            module.is_completed = False
-            
-        # Find next content if not found yet
-        if not next_content and module_completed < module_total:
-            # Check lessons
-            for lesson in module.lessons.all():
-                if not module_progress or lesson not in module_progress.completed_lessons.all():
-                    next_content = lesson
-                    break
-                    
-            # Check videos if still no next content
-            if not next_content:
-                for video in module.videos.all():
-                    if not module_progress or video not in module_progress.completed_videos.all():
-                        next_content = video
-                        break
-            
-            # Check quizzes for next quiz and all_quizzes_completed
-            for quiz in module.quizzes.all():
-                if not module_progress or quiz not in module_progress.completed_quizzes.all():
-                    if not next_quiz:
-                        next_quiz = quiz
-                    all_quizzes_completed = False
-    
-    # Check if next_content exists and has an id
-    if next_content and not hasattr(next_content, 'id'):
-        next_content = None
-        
-    # Check if next_quiz exists and has an id
-    if next_quiz and not hasattr(next_quiz, 'id'):
-        next_quiz = None
-    
-    # Calculate overall progress percentage
-    overall_progress = (completed_contents / total_contents * 100) if total_contents > 0 else 0
+    # Load the outline and the student's completed items in a fixed number of queries
+    outline = CourseOutline.get(course).for_student(request.user)
     
     context = {
         'course': course,
-        'modules': modules,
+        'modules': outline.modules,
         'enrollment': enrollment,
-        'progress_dict': progress_dict,
-        'overall_progress': overall_progress,
-        'next_content': next_content,
-        'next_quiz': next_quiz,
-        'all_quizzes_completed': all_quizzes_completed
+        'overall_progress': outline.overall_progress,
+        'next_content': outline.next_content,
+        'next_quiz': outline.next_quiz,
+        'all_quizzes_completed': outline.all_quizzes_completed
     }
     
     return render(request, 'courses/course_content.html', context)
@@ -295,21 +221,12 @@ def lesson_detail(request, course_slug, lesson_id):
     enrollment = get_object_or_404(Enrollment, student=request.user, course=course)
     
     # Get progress record for this module
-    progress, created = Progress.objects.get_or_create(
-        student=request.user,
-        course=course,
-        module=lesson.module
-    )
+    progress = Progress.objects.for_module(request.user, course, lesson.module)
     
     # Mark lesson as completed if not already
     if request.method == 'POST' and 'mark_completed' in request.POST:
-        if lesson not in progress.completed_lessons.all():
-            progress.completed_lessons.add(lesson)
-            
-            # Add points for completing a lesson (gamification)
-            request.user.points += 10
-            request.user.save()
-            
+        # Add points for completing a lesson (gamification)
+        if complete_item(request.user, lesson, points=10):
             messages.success(request, f"Lesson marked as completed. +10 points!")
         
         return redirect('courses:lesson_detail', course_slug=course_slug, lesson_id=lesson_id)
@@ -348,21 +265,12 @@ def video_detail(request, course_slug, video_id):
     enrollment = get_object_or_404(Enrollment, student=request.user, course=course)
     
     # Get progress record for this module
-    progress, created = Progress.objects.get_or_create(
-        student=request.user,
-        course=course,
-        module=video.module
-    )
+    progress = Progress.objects.for_module(request.user, course, video.module)
     
     # Mark video as completed if not already
     if request.method == 'POST' and 'mark_completed' in request.POST:
-        if video not in progress.completed_videos.all():
-            progress.completed_videos.add(video)
-            
-            # Add points for completing a video (gamification)
-            request.user.points += 15
-            request.user.save()
-            
+        # Add points for completing a video (gamification)
+        if complete_item(request.user, video, points=15):
             messages.success(request, f"Video marked as completed. +15 points!")
         
         return redirect('courses:video_detail', course_slug=course_slug, video_id=video_id)
@@ -390,20 +298,14 @@ def quiz_detail(request, course_slug, quiz_id):
     enrollment = get_object_or_404(Enrollment, student=request.user, course=course)
     
     # Get progress record for this module
-    progress, created = Progress.objects.get_or_create(
-        student=request.user,
-        course=course,
-        module=quiz.module
-    )
+    progress = Progress.objects.for_module(request.user, course, quiz.module)
     
     # Check if quiz is already completed
     is_completed = quiz in progress.completed_quizzes.all()
     
-    # Get previous attempts - Changed 'student' to 'user'
-    previous_attempts = QuizAttempt.objects.filter(
-        user=request.user,
-        quiz=quiz
-    ).order_by('-started_at')
+    # Get the most recent attempts, live or archived, and the totals over all of them
+    previous_attempts = attempt_history(request.user, quiz, limit=10)
+    attempt_summary = QuizAttemptSummary.objects.filter(user=request.user, quiz=quiz).first()
     
     context = {
         'course': course,
@@ -412,6 +314,7 @@ def quiz_detail(request, course_slug, quiz_id):
         'progress': progress,
         'is_completed': is_completed,
         'previous_attempts': previous_attempts,
+        'attempt_summary': attempt_summary,
         'questions': quiz.questions.all().prefetch_related('answers')
     }
     
@@ -426,65 +329,42 @@ def submit_quiz(request, course_slug, quiz_id):
     if request.method != 'POST':
         return redirect('courses:quiz_detail', course_slug=course_slug, quiz_id=quiz_id)
     
-    course = get_object_or_404(Course, slug=course_slug)
-    quiz = get_object_or_404(Quiz, id=quiz_id, module__course=course)
+    quiz = get_object_or_404(
+        Quiz.objects.select_related('module__course'), id=quiz_id, module__course__slug=course_slug
+    )
+    
+    # Grade the submission in memory against the compiled answer key
+    grade = AnswerKey.get(quiz.id).grade(request.POST)
+    percentage_score = grade.percentage
     
-    # Get all questions for this quiz
-    questions = quiz.questions.all()
-    
-    # Calculate score
-    score = 0
-    max_score = sum(q.points for q in questions)
-    
-    for question in questions:
-        # Get the submitted answer(s)
-        if question.question_type == 'multiple_choice':
-            answer_id = request.POST.get(f'question_{question.id}')
-            if answer_id:
-                answer = get_object_or_404(Answer, id=answer_id, question=question)
-                if answer.is_correct:
-                    score += question.points
-        elif question.question_type == 'true_false':
-            answer_id = request.POST.get(f'question_{question.id}')
-            if answer_id:
-                answer = get_object_or_404(Answer, id=answer_id, question=question)
-                if answer.is_correct:
-                    score += question.points
-        elif question.question_type == 'short_answer':
-            # For short answer, we'll need to implement more sophisticated checking
-            # This is a simplified version
-            user_answer = request.POST.get(f'question_{question.id}', '').strip().lower()
-            correct_answers = [a.text.strip().lower() for a in question.answers.filter(is_correct=True)]
-            if user_answer in correct_answers:
-                score += question.points
-    
-    # Calculate percentage score
-    percentage_score = (score / max_score * 100) if max_score > 0 else 0
+    # In exam mode, store the attempt and leave progress and points to the worker
+    if exam_mode_enabled():
+        attempt = record_attempt(request.user, quiz, grade)
+        messages.success(request, "Your answers have been submitted. Progress and points will be updated shortly.")
+        return redirect('courses:quiz_result', course_slug=course_slug, quiz_id=quiz_id, attempt_id=attempt.id)
     
     # Determine if passed
     passed = percentage_score >= quiz.passing_score
     
     # Create quiz attempt record
     attempt = QuizAttempt.objects.create(
-        student=request.user,
+        user=request.user,
         quiz=quiz,
-        score=score,
-        max_score=max_score,
+        score=grade.score,
+        max_score=grade.max_score,
+        completed=True,
         completed_at=timezone.now(),
         passed=passed
     )
     
     # If passed, mark quiz as completed in progress
     if passed:
-        progress = get_object_or_404(Progress, student=request.user, course=course, module=quiz.module)
-        progress.completed_quizzes.add(quiz)
-        
         # Add points for completing a quiz (gamification)
-        points_earned = 25 + int(percentage_score / 4)  # Base points + bonus based on score
-        request.user.points += points_earned
-        request.user.save()
-        
-        messages.success(request, f"Quiz completed successfully! You earned {points_earned} points!")
+        points_earned = quiz_completion_points(percentage_score)
+        if complete_item(request.user, quiz, points=points_earned):
+            messages.success(request, f"Quiz completed successfully! You earned {points_earned} points!")
+        else:
+            messages.success(request, "Quiz passed again!")
     else:
         messages.warning(request, f"You didn't pass the quiz. Required: {quiz.passing_score}%, Your score: {int(percentage_score)}%")
     
@@ -498,7 +378,11 @@ def quiz_result(request, course_slug, quiz_id, attempt_id):
     """
     course = get_object_or_404(Course, slug=course_slug)
     quiz = get_object_or_404(Quiz, id=quiz_id, module__course=course)
-    attempt = get_object_or_404(QuizAttempt, id=attempt_id, user=request.user, quiz=quiz)
+    
+    # Old attempts are read from the archive
+    attempt = get_attempt(request.user, quiz, attempt_id)
+    if attempt is None:
+        raise Http404("Quiz attempt not found")
     
     context = {
         'course': course,
@@ -522,157 +406,97 @@ def generate_personalized_quiz(request, course_id=None):
         messages.error(request, "Only students can access personalized quizzes.")
         return redirect('accounts:dashboard')
     
-    # Get user's quiz attempts to identify weak areas
-    quiz_attempts = QuizAttempt.objects.filter(user=user)
+    # Identify weak topics from the user's per-module mastery
+    mastery = TopicMastery.objects.filter(user=user)
     
     # If no quiz attempts, redirect to regular quizzes
-    if not quiz_attempts.exists():
+    if not mastery.exists():
         messages.info(request, "Complete some quizzes first to get personalized challenges.")
         if course_id:
             return redirect('courses:course_detail', slug=Course.objects.get(id=course_id).slug)
         return redirect('courses:course_list')
     
-    # Identify weak topics based on quiz performance
-    weak_topics = []
-    for attempt in quiz_attempts:
-        if attempt.score < 70:  # Consider topics with score below 70% as weak
-            weak_topics.append(attempt.quiz.module.id)
+    # Consider topics with a mean score below 70% as weak
+    weak_topics = list(TopicMastery.objects.weak(user, 70, course_id=course_id).values_list('module_id', 'course_id'))
     
     # If no weak topics found, use topics with lowest scores
     if not weak_topics:
-        lowest_score_attempts = quiz_attempts.order_by('score')[:3]
-        weak_topics = [attempt.quiz.module.id for attempt in lowest_score_attempts]
+        if course_id:
+            mastery = mastery.filter(course_id=course_id)
+        weak_topics = list(mastery.order_by('mean_score').values_list('module_id', 'course_id')[:3])
     
-    # Get questions from weak topics
-    questions = []
+    # Sample questions from the cached question bank index instead of sorting randomly
     if course_id:
         # If course_id is provided, get questions only from that course
-        questions = Question.objects.filter(
-            quiz__module__course_id=course_id,
-            quiz__module__id__in=weak_topics
-        ).order_by('?')[:10]  # Randomly select 10 questions
+        bank = QuestionBank.get(course_id)
+        question_ids = bank.sample(10, module_ids={module_id for module_id, _course_id in weak_topics}, skip_flagged=True)
     else:
-        # Otherwise, get questions from all weak topics
-        questions = Question.objects.filter(
-            quiz__module__id__in=weak_topics
-        ).order_by('?')[:10]  # Randomly select 10 questions
+        # Otherwise, get questions from all weak topics, course by course
+        question_ids = []
+        topics_by_course = {}
+        for module_id, topic_course_id in weak_topics:
+            topics_by_course.setdefault(topic_course_id, set()).add(module_id)
+        for topic_course_id, module_ids in topics_by_course.items():
+            topic_bank = QuestionBank.get(topic_course_id)
+            # Leave out questions the item statistics flag as misleading
+            question_ids += [
+                question_id for question_id in topic_bank.question_ids(module_ids)
+                if question_id not in topic_bank.flagged
+            ]
+        question_ids = sample_ids(question_ids, 10)
     
     # If not enough questions found, get random questions
-    if questions.count() < 5:
+    if len(question_ids) < 5:
         if course_id:
-            additional_questions = Question.objects.filter(
-                quiz__module__course_id=course_id
-            ).exclude(id__in=[q.id for q in questions]).order_by('?')[:10-questions.count()]
-            questions = list(questions) + list(additional_questions)
+            question_ids += bank.sample(10 - len(question_ids), exclude=question_ids)
         else:
-            additional_questions = Question.objects.all().exclude(
-                id__in=[q.id for q in questions]
-            ).order_by('?')[:10-questions.count()]
-            questions = list(questions) + list(additional_questions)
-    
-    # Create a personalized quiz in the database
-    from django.utils.text import slugify
+            question_ids += sample_any(10 - len(question_ids), exclude=question_ids)
     
-    # Create a title for the personalized quiz
-    title = f"Personalized Quiz for {user.username}"
-    course = None
-    if course_id:
-        course = Course.objects.get(id=course_id)
-        title = f"Personalized Quiz: {course.title}"
-    
-    # Get a default module to assign the quiz to
-    default_module = None
-    if course:
-        default_module = course.modules.first()
-    else:
-        # If no specific course, get the first module from any course
-        default_module = Module.objects.first()
-    
-    if not default_module:
-        messages.error(request, "Unable to create a quiz: no modules available.")
+    if not question_ids:
+        messages.info(request, "There are no questions available for a personalized quiz yet.")
         return redirect('courses:course_list')
     
-    # Create a new quiz object
-    personalized_quiz = Quiz.objects.create(
-        title=title,
-        description="This quiz is tailored to help you improve in areas where you need practice.",
-        time_limit=15,  # 15 minutes
-        passing_score=70,
-        module=default_module
-    )
-    
-    # Add the questions to the quiz
-    for q in questions:
-        personalized_quiz.questions.add(q)
+    # Store the quiz as a spec on its attempt; no Quiz or Question rows are written
+    course = Course.objects.get(id=course_id) if course_id else None
+    attempt = create_personalized_quiz(user, question_ids, course=course)
     
     # Record user activity
-    UserActivity.objects.create(
-        user=user,
-        activity_type='personalized_quiz_generation',
-        content_object=personalized_quiz
-    )
+    record_activity(user, 'personalized_quiz_attempt', attempt)
     
-    return redirect('courses:take_personalized_quiz', quiz_id=personalized_quiz.id)
+    return redirect('courses:take_personalized_quiz', attempt_id=attempt.id)
 
 
 @login_required
-def take_personalized_quiz(request, quiz_id):
-    quiz = get_object_or_404(Quiz, id=quiz_id)
+def take_personalized_quiz(request, attempt_id):
+    attempt = get_object_or_404(PersonalizedQuizAttempt, id=attempt_id, user=request.user)
     
-    # Record user activity
-    UserActivity.objects.create(
-        user=request.user,
-        activity_type='personalized_quiz_attempt',
-        content_object=quiz
-    )
+    if attempt.completed_at:
+        return redirect('courses:personalized_quiz_results', attempt_id=attempt.id)
     
     if request.method == 'POST':
-        # Process quiz submission
-        score = 0
-        correct_answers = 0
-        total_questions = quiz.questions.count()
-        
-        for question in quiz.questions.all():
-            # Get user's answer
-            if question.question_type == 'multiple_choice':
-                answer_id = request.POST.get(f'question_{question.id}')
-                if answer_id:
-                    selected_option = get_object_or_404(Option, id=answer_id)
-                    if selected_option.is_correct:
-                        score += question.points
-                        correct_answers += 1
-            elif question.question_type == 'true_false':
-                answer = request.POST.get(f'question_{question.id}')
-                correct_answer = question.options.filter(is_correct=True).first()
-                if answer and correct_answer and answer == str(correct_answer.id):
-                    score += question.points
-                    correct_answers += 1
-            elif question.question_type == 'short_answer':
-                user_answer = request.POST.get(f'question_{question.id}', '').strip().lower()
-                correct_option = question.options.filter(is_correct=True).first()
-                if correct_option and user_answer == correct_option.text.strip().lower():
-                    score += question.points
-                    correct_answers += 1
+        # Grade in memory against the answer keys of the questions' own quizzes
+        quiz = PersonalizedQuiz.load(attempt, with_answers=False)
+        answer_key = quiz.answer_key()
+        grade = answer_key.grade(request.POST)
         
-        # Create personalized quiz attempt record
-        attempt = PersonalizedQuizAttempt.objects.create(
-            user=request.user,
-            title=f"Personalized Quiz: {quiz.title}",
-            score=score,
-            total_questions=total_questions,
-            correct_answers=correct_answers
-        )
+        # Save the result on the attempt that holds the spec
+        attempt.score = grade.percentage
+        attempt.correct_answers = grade.correct_count
+        attempt.total_questions = len(answer_key)
+        attempt.completed_at = timezone.now()
+        attempt.save(update_fields=['score', 'correct_answers', 'total_questions', 'completed_at'])
         
         # Award points for completing personalized quiz
-        Point.objects.create(
-            user=request.user,
-            points=15,  # Adjust point value as needed
-            description=f"Completed personalized quiz: {quiz.title}"
+        award_points(
+            request.user,
+            15,  # Adjust point value as needed
+            f"Completed personalized quiz: {attempt.title}"
         )
         
         # Check for achievements
         personalized_quizzes_taken = PersonalizedQuizAttempt.objects.filter(
-            user=request.user
+            user=request.user,
+            completed_at__isnull=False
         ).count()
         
         # Example: Award achievement for taking first personalized quiz
@@ -686,48 +510,32 @@ def take_personalized_quiz(request, quiz_id):
             except Achievement.DoesNotExist:
                 pass  # Achievement doesn't exist yet
         
-        return redirect('courses:personalized_quiz_results', quiz_id=quiz_id)
-    
-    # Display quiz
-    # Get all questions for this quiz with their answers
-    questions = quiz.questions.all().prefetch_related('answers').order_by('?')[:10]  # Randomize and limit to 10 questions
+        return redirect('courses:personalized_quiz_results', attempt_id=attempt.id)
     
-    # For now, use the regular take_quiz template
-    # Calculate total points from questions
-    total_points = sum(question.points for question in questions)
+    # Display quiz from its spec, with answers in the attempt's seeded order
+    quiz = PersonalizedQuiz.load(attempt)
     
-    # Create a course attribute for the quiz if needed by the template
-    course = quiz.module.course
-    
-    # Prepare context
     context = {
         'quiz': quiz,
-        'questions': questions,
+        'questions': quiz.questions,
         'time_limit_seconds': quiz.time_limit * 60,
-        'course': course,
+        'course': attempt.course,
         'is_personalized': True
     }
     
-    # Use the existing quiz_detail.html template temporarily
-    return render(request, 'courses/quiz_detail.html', context)
+    return render(request, 'courses/personalized_quiz.html', context)
 
 
 @login_required
-def personalized_quiz_results(request, quiz_id):
-    quiz = get_object_or_404(Quiz, id=quiz_id)
+def personalized_quiz_results(request, attempt_id):
+    attempt = get_object_or_404(PersonalizedQuizAttempt, id=attempt_id, user=request.user)
     
-    # Get the latest attempt
-    attempt = PersonalizedQuizAttempt.objects.filter(
-        user=request.user,
-        title__contains=quiz.title
-    ).order_by('-created_at').first()
+    if not attempt.completed_at:
+        messages.error(request, "You haven't submitted this quiz yet.")
+        return redirect('courses:take_personalized_quiz', attempt_id=attempt.id)
     
-    if not attempt:
-        messages.error(request, "No attempt found for this quiz.")
-        return redirect('courses:course_list')
-    
-    # Calculate percentage score
-    percentage_score = (attempt.correct_answers / attempt.total_questions * 100) if attempt.total_questions > 0 else 0
+    # The attempt score is already a percentage
+    percentage_score = attempt.score
     
     # Generate some feedback based on score
     if percentage_score >= 80:
@@ -737,20 +545,15 @@ def personalized_quiz_results(request, quiz_id):
     else:
         feedback = "You need more practice with these concepts. Focus on reviewing the material."
     
-    # Get course from quiz's module
-    course = quiz.module.course
-    
     context = {
-        'quiz': quiz,
         'attempt': attempt,
         'score_percentage': percentage_score,
-        'passed': percentage_score >= 70,  # Assuming 70% is passing
+        'passed': percentage_score >= PERSONALIZED_QUIZ_PASSING_SCORE,
         'feedback': feedback,
-        'course': course
+        'course': attempt.course
     }
     
-    # Use the existing quiz_result.html template
-    return render(request, 'courses/quiz_result.html', context)
+    return render(request, 'courses/personalized_quiz_results.html', context)
 
 
 @login_required
@@ -758,11 +561,8 @@ def quiz_results(request, course_slug, quiz_id):
     course = get_object_or_404(Course, slug=course_slug)
     quiz = get_object_or_404(Quiz, id=quiz_id)
     
-    # Get the latest attempt
-    attempt = QuizAttempt.objects.filter(
-        user=request.user,
-        quiz=quiz
-    ).order_by('-completed_at').first()
+    # Get the latest attempt, live or archived
+    attempt = latest_attempt(request.user, quiz)
     
     if not attempt:
         messages.warning(request, "You haven't taken this quiz yet")
@@ -831,41 +631,32 @@ class ModuleDetailView(LoginRequiredMixin, DetailView):
     context_object_name = 'module'
     
     def get_object(self):
-        course_slug = self.kwargs.get('course_slug')
-        module_id = self.kwargs.get('module_id')
-        course = get_object_or_404(Course, slug=course_slug)
-        return get_object_or_404(Module, course=course, id=module_id)
+        return get_object_or_404(
+            Module.objects.select_related('course'),
+            course__slug=self.kwargs.get('course_slug'),
+            id=self.kwargs.get('module_id')
+        )
     
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        context['course'] = self.object.course
-        context['lessons'] = self.object.lessons.all().order_by('order')
-        context['quizzes'] = self.object.quizzes.all()
+        course = self.object.course
+        context['course'] = course
         
-        # Get previous and next modules
-        all_modules = list(Module.objects.filter(course=self.object.course).order_by('order'))
-        current_index = all_modules.index(self.object)
+        # Get the previous and next modules from the cached navigation index
+        navigation = CourseNavigation.get(course)
+        context['prev_module'], context['next_module'] = navigation.neighbours(self.object.id)
         
-        if current_index > 0:
-            context['prev_module'] = all_modules[current_index - 1]
-        if current_index < len(all_modules) - 1:
-            context['next_module'] = all_modules[current_index + 1]
+        # Get lessons and quizzes, flagged with the user's progress, from the cached outline
+        outline_module = CourseOutline.get(course).for_student(self.request.user).get_module(self.object.id)
+        context['progress'] = Progress.objects.for_module(self.request.user, course, self.object)
+        context['completed_lessons'] = sum(1 for lesson in outline_module.lessons if lesson.is_completed)
+        context['completed_quizzes'] = sum(1 for quiz in outline_module.quizzes if quiz.is_completed)
         
-        # Check if user has completed this module
-        if self.request.user.is_authenticated:
-            progress, created = Progress.objects.get_or_create(
-                student=self.request.user,
-                course=self.object.course,
-                module=self.object
-            )
-            context['progress'] = progress
-            
-            # Record user activity
-            UserActivity.objects.create(
-                user=self.request.user,
-                activity_type='module_view',
-                content_object=self.object
-            )
+        # Record user activity in the buffer, keeping the page read-only
+        record_activity(self.request.user, 'module_view', self.object)
+        
+        context['lessons'] = outline_module.lessons
+        context['quizzes'] = outline_module.quizzes
         
         return context 
 
@@ -875,12 +666,8 @@ def complete_module(request, course_slug, module_id):
     course = get_object_or_404(Course, slug=course_slug)
     module = get_object_or_404(Module, id=module_id, course=course)
     
-    # Get or create progress record
-    progress, created = Progress.objects.get_or_create(
-        student=request.user,
-        course=course,
-        module=module
-    )
+    # Get progress record, if any content has been completed
+    progress = Progress.objects.for_module(request.user, course, module)
     
     # Check if all lessons and quizzes are completed
     lessons = module.lessons.all()
@@ -902,18 +689,15 @@ def complete_module(request, course_slug, module_id):
                 break
     
     if all_completed:
-        # Award points for completing the module
-        Point.objects.create(
-            user=request.user,
-            points=50,  # Adjust point value as needed
-            description=f"Completed module: {module.title}"
-        )
+        # Award points for completing the module, once
+        if not complete_item(request.user, module, points=50):
+            messages.info(request, f"You have already completed the module '{module.title}'.")
+            return redirect('courses:module_detail', course_slug=course_slug, module_id=module_id)
         
         # Check for achievements
         modules_completed = Progress.objects.filter(
-            student=request.user,
-            completion_percentage=100
-        ).count()
+            student=request.user
+        ).completed().count()
         
         # Example: Award achievement for completing first module
         if modules_completed == 1:
@@ -935,12 +719,16 @@ def take_quiz(request, quiz_id):
     """
     View for taking a quiz.
     """
-    quiz = get_object_or_404(Quiz, id=quiz_id)
+    quiz = get_object_or_404(Quiz.objects.select_related('module__course'), id=quiz_id)
+    course = quiz.module.course
     user = request.user
     
     # Check if the user is enrolled in the course
-    if user not in quiz.module.course.students.all():
-        return redirect('course_detail', slug=quiz.module.course.slug)
+    if not course.enrollments.filter(student=user).exists():
+        return redirect('courses:course_detail', slug=course.slug)
+    
+    # The compiled answer key validates and grades answers without per-question queries
+    answer_key = AnswerKey.get(quiz.id)
     
     # Check if the user has already started this quiz
     active_attempt = QuizAttempt.objects.filter(
@@ -949,79 +737,72 @@ def take_quiz(request, quiz_id):
         completed=False
     ).first()
     
-    # Calculate total points from questions
-    total_points = sum(question.points for question in quiz.questions.all())
-    
     if not active_attempt:
         # Create a new quiz attempt
         active_attempt = QuizAttempt.objects.create(
             user=user,
             quiz=quiz,
-            max_score=total_points
+            max_score=answer_key.max_score
         )
     
-    # Get all questions for this quiz with their answers
-    questions = Question.objects.filter(quiz=quiz).prefetch_related('answers').order_by('order')
-    
-    # Add debug information
-    print(f"Quiz: {quiz.title}")
-    print(f"Questions count: {questions.count()}")
-    for q in questions:
-        print(f"Question: {q.text}")
-        print(f"Answers count: {q.answers.count()}")
+    # Answers autosaved since the last write are saved along with this request
+    if request.method == 'POST':
+        flush_attempt(active_attempt, answer_key)
+    
+    # Get the user's saved answers for this attempt
+    saved_answers = {
+        question_id: (answer_id, is_correct)
+        for question_id, answer_id, is_correct in QuizAnswer.objects.filter(
+            quiz_attempt=active_attempt
+        ).values_list('question_id', 'answer_id', 'is_correct')
+    }
     
     if request.method == 'POST':
-        # Process quiz submission
-        for question in questions:
-            answer_id = request.POST.get(f'question_{question.id}')
-            
-            if answer_id:
-                answer = Answer.objects.get(id=answer_id)
-                
-                # Check if the user has already answered this question
-                quiz_answer = QuizAnswer.objects.filter(
-                    quiz_attempt=active_attempt,
-                    question=question
-                ).first()
-                
-                if quiz_answer:
-                    # Update existing answer
-                    quiz_answer.answer = answer
-                    quiz_answer.is_correct = answer.is_correct
-                    quiz_answer.save()
-                else:
-                    # Create new answer
-                    QuizAnswer.objects.create(
-                        quiz_attempt=active_attempt,
-                        question=question,
-                        answer=answer,
-                        is_correct=answer.is_correct
-                    )
+        # Grade the submitted answers in memory and save them in one upsert
+        grade = answer_key.grade(request.POST)
+        save_responses(active_attempt, grade.responses)
+        for question_id, answer_id, is_correct in grade.responses:
+            saved_answers[question_id] = (answer_id, is_correct)
         
         # Check if the user wants to submit the quiz
         if 'submit_quiz' in request.POST:
-            # Calculate score
-            correct_answers = QuizAnswer.objects.filter(
-                quiz_attempt=active_attempt,
-                is_correct=True
-            ).count()
-            
-            total_questions = questions.count()
-            score_percentage = (correct_answers / total_questions) * 100 if total_questions > 0 else 0
+            # Calculate score from the saved and just submitted answers
+            score = sum(
+                answer_key.questions[question_id].points
+                for question_id, (_answer_id, is_correct) in saved_answers.items()
+                if is_correct and question_id in answer_key.questions
+            )
+            max_score = answer_key.max_score
+            score_percentage = (score / max_score * 100) if max_score > 0 else 0
             
             # Update quiz attempt
-            active_attempt.score = correct_answers * (total_points / total_questions) if total_questions > 0 else 0
-            active_attempt.completed = True
-            active_attempt.completed_at = datetime.now()
+            active_attempt.score = score
+            active_attempt.max_score = max_score
             active_attempt.passed = score_percentage >= quiz.passing_score
+            
+            # In exam mode, complete the attempt and leave progress and points to the worker
+            if exam_mode_enabled():
+                submit_attempt(active_attempt)
+                messages.success(request, "Your answers have been submitted. Progress and points will be updated shortly.")
+                return redirect('courses:quiz_result', course_slug=course.slug, quiz_id=quiz.id, attempt_id=active_attempt.id)
+            
+            active_attempt.completed = True
+            active_attempt.completed_at = timezone.now()
             active_attempt.save()
             
-            return redirect('courses:quiz_result', course_slug=quiz.module.course.slug, quiz_id=quiz.id, attempt_id=active_attempt.id)
+            # Mark the quiz as completed the first time it is passed
+            if active_attempt.passed:
+                complete_item(user, quiz, points=quiz_completion_points(score_percentage))
+            
+            return redirect('courses:quiz_result', course_slug=course.slug, quiz_id=quiz.id, attempt_id=active_attempt.id)
     
-    # Get user's answers for this attempt
-    user_answers = {}
-    for answer in QuizAnswer.objects.filter(quiz_attempt=active_attempt):
-        user_answers[answer.question.id] = answer.answer.id if answer.answer else None
+    # Get all questions for this quiz with their answers
+    questions = Question.objects.filter(quiz=quiz).prefetch_related('answers').order_by('order')
+    
+    # Show saved answers, overlaid with any still waiting in the autosave buffer
+    user_answers = {question_id: answer_id for question_id, (answer_id, _is_correct) in saved_answers.items()}
+    for question_id, value in pending_answers(active_attempt).items():
+        user_answers[question_id] = int(value) if value.isdigit() else None
     
     # Prepare context
     context = {
@@ -1030,16 +811,41 @@ def take_quiz(request, quiz_id):
         'user_answers': user_answers,
         'attempt': active_attempt,
         'content': quiz,  # Add the quiz as content for the template
-        'debug_info': {
-            'quiz_title': quiz.title,
-            'questions_count': questions.count(),
-            'has_questions': questions.exists(),
-        }
+        'content_item_id': ContentItem.objects.filter(kind='quiz', object_id=quiz.id).values_list(
+            'id', flat=True
+        ).first(),
     }
     
     return render(request, 'courses/content_types/quiz_take.html', context)
 
 
+@login_required
+def autosave_quiz_attempt(request, attempt_id):
+    """
+    AJAX endpoint to autosave changed answers of an in-progress quiz attempt.
+    
+    Expects a JSON body of the form {"answers": {"<question id>": <answer id or text>}}.
+    """
+    if request.method != 'POST':
+        return JsonResponse({'success': False, 'error': 'Invalid request method'}, status=405)
+    
+    attempt = QuizAttempt.objects.filter(id=attempt_id, user=request.user).first()
+    if attempt is None:
+        return JsonResponse({'success': False, 'error': 'Attempt not found'}, status=404)
+    if attempt.completed:
+        return JsonResponse({'success': False, 'error': 'Attempt already submitted'}, status=409)
+    
+    try:
+        answers = json.loads(request.body).get('answers')
+    except (ValueError, AttributeError):
+        answers = None
+    if not isinstance(answers, dict):
+        return JsonResponse({'success': False, 'error': 'Expected a JSON object of answers'}, status=400)
+    
+    saved, rejected = buffer_answers(attempt, answers)
+    return JsonResponse({'success': True, 'saved': saved, 'rejected': rejected})
+
+
 @login_required
 def add_study_session(request):
     """
@@ -1694,43 +1500,26 @@ def view_content(request, content_id):
     """
     View for displaying different types of content (lesson, video, quiz).
     """
-    # Try to find the content in different content types
-    content = None
-    content_type = None
-    
-    # Check if it's a lesson
-    try:
-        content = Lesson.objects.get(id=content_id)
-        content_type = 'lesson'
-    except Lesson.DoesNotExist:
-        pass
-    
-    # Check if it's a video
-    if not content:
-        try:
-            content = Video.objects.get(id=content_id)
-            content_type = 'video'
-        except Video.DoesNotExist:
-            pass
-    
-    # Check if it's a quiz
-    if not content:
-        try:
-            content = Quiz.objects.get(id=content_id)
-            content_type = 'quiz'
-        except Quiz.DoesNotExist:
-            pass
+    # Resolve the registry entry, with its module and course, in one query
+    item = get_object_or_404(
+        ContentItem.objects.select_related('module__course'),
+        pk=content_id,
+        is_active=True,
+        module__isnull=False
+    )
+    content = item.content_object
+    content_type = item.kind
     
     # If content not found, return 404
     if not content:
         raise Http404("Content not found")
     
     # Get the course and module
-    module = content.module
+    module = item.module
     course = module.course
     
     # Check if user is enrolled in the course
-    if request.user not in course.students.all():
+    if not course.enrollments.filter(student=request.user).exists():
         return redirect('courses:course_detail', slug=course.slug)
     
     # Render appropriate template based on content type
@@ -1987,84 +1776,20 @@ def create_quiz(request, module_id):
     if request.method == 'POST':
         form = QuizForm(request.POST)
         if form.is_valid():
-            quiz = form.save(commit=False)
-            quiz.module = module
-            quiz.save()
-            
-            # Process questions and answers
-            questions_data = {}
-            deleted_questions = request.POST.getlist('deleted_questions[]')
-            
-            # Delete questions marked for deletion
-            if deleted_questions:
-                Question.objects.filter(id__in=deleted_questions).delete()
-            
-            # Process form data to get questions
-            for key, value in request.POST.items():
-                if key.startswith('questions['):
-                    # Extract question ID/key and field name
-                    match = re.match(r'questions\[(new_\d+|\d+)\]\[(\w+)\](?:\[\])?', key)
-                    if match:
-                        q_id, field = match.groups()
-                        if q_id not in questions_data:
-                            questions_data[q_id] = {
-                                'title': '',
-                                'text': '',
-                                'points': 1,
-                                'order': 0,
-                                'answers': [],
-                                'correct_answer': 0
-                            }
-                        
-                        if field == 'answers':
-                            questions_data[q_id]['answers'].append(value)
-                        else:
-                            questions_data[q_id][field] = value
-            
-            # Create or update questions
-            for q_id, data in questions_data.items():
-                if not data.get('text') or not data.get('answers'):
-                    continue
-                
-                if q_id.startswith('new_'):
-                    # Create new question
-                    question = Question.objects.create(
-                        quiz=quiz,
-                        title=data['title'],
-                        text=data['text'],
-                        points=data['points'],
-                        order=data['order']
-                    )
-                else:
-                    # Update existing question
-                    question = Question.objects.get(id=q_id)
-                    question.title = data['title']
-                    question.text = data['text']
-                    question.points = data['points']
-                    question.order = data['order']
-                    question.save()
-                    # Delete existing answers
-                    question.answers.all().delete()
-                
-                # Create answers for the question
-                correct_answer_idx = int(data.get('correct_answer', 0))
-                
-                # Print debug information about answers
-                print(f"Creating answers for question: {question.text}")
-                print(f"Answer data: {data['answers']}")
-                print(f"Correct answer index: {correct_answer_idx}")
-                
-                for idx, answer_text in enumerate(data['answers']):
-                    if answer_text.strip():  # Only create answers with non-empty text
-                        Answer.objects.create(
-                            question=question,
-                            text=answer_text,
-                            is_correct=(idx == correct_answer_idx)
-                        )
-                        print(f"Created answer {idx+1}: {answer_text} (correct: {idx == correct_answer_idx})")
-                
-                # Verify answers were created
-                print(f"Answer count after creation: {question.answers.count()}")
+            # Create the quiz and its questions together, with one bulk insert per table
+            questions, _deleted_ids = parse_question_post(request.POST)
+            try:
+                with transaction.atomic():
+                    quiz = form.save(commit=False)
+                    quiz.module = module
+                    quiz.save()
+                    apply_questions(quiz, questions)
+            except ValueError as error:
+                messages.error(request, str(error))
+                return render(request, 'courses/instructor/quiz_form.html', {
+                    'form': form,
+                    'module': module
+                })
             
             messages.success(request, 'Quiz created successfully!')
             return redirect('courses:module_content_list', module_id=module.id)
@@ -2096,82 +1821,19 @@ def edit_quiz(request, quiz_id):
     if request.method == 'POST':
         form = QuizForm(request.POST, instance=quiz)
         if form.is_valid():
-            quiz = form.save()
-            
-            # Process questions and answers
-            questions_data = {}
-            deleted_questions = request.POST.getlist('deleted_questions[]')
-            
-            # Delete questions marked for deletion
-            if deleted_questions:
-                Question.objects.filter(id__in=deleted_questions).delete()
-            
-            # Process form data to get questions
-            for key, value in request.POST.items():
-                if key.startswith('questions['):
-                    # Extract question ID/key and field name
-                    match = re.match(r'questions\[(new_\d+|\d+)\]\[(\w+)\](?:\[\])?', key)
-                    if match:
-                        q_id, field = match.groups()
-                        if q_id not in questions_data:
-                            questions_data[q_id] = {
-                                'title': '',
-                                'text': '',
-                                'points': 1,
-                                'order': 0,
-                                'answers': [],
-                                'correct_answer': 0
-                            }
-                        
-                        if field == 'answers':
-                            questions_data[q_id]['answers'].append(value)
-                        else:
-                            questions_data[q_id][field] = value
-            
-            # Create or update questions
-            for q_id, data in questions_data.items():
-                if not data.get('text') or not data.get('answers'):
-                    continue
-                
-                if q_id.startswith('new_'):
-                    # Create new question
-                    question = Question.objects.create(
-                        quiz=quiz,
-                        title=data['title'],
-                        text=data['text'],
-                        points=data['points'],
-                        order=data['order']
-                    )
-                else:
-                    # Update existing question
-                    question = Question.objects.get(id=q_id)
-                    question.title = data['title']
-                    question.text = data['text']
-                    question.points = data['points']
-                    question.order = data['order']
-                    question.save()
-                    # Delete existing answers
-                    question.answers.all().delete()
-                
-                # Create answers for the question
-                correct_answer_idx = int(data.get('correct_answer', 0))
-                
-                # Print debug information about answers
-                print(f"Creating answers for question: {question.text}")
-                print(f"Answer data: {data['answers']}")
-                print(f"Correct answer index: {correct_answer_idx}")
-                
-                for idx, answer_text in enumerate(data['answers']):
-                    if answer_text.strip():  # Only create answers with non-empty text
-                        Answer.objects.create(
-                            question=question,
-                            text=answer_text,
-                            is_correct=(idx == correct_answer_idx)
-                        )
-                        print(f"Created answer {idx+1}: {answer_text} (correct: {idx == correct_answer_idx})")
-                
-                # Verify answers were created
-                print(f"Answer count after creation: {question.answers.count()}")
+            # Apply the submitted questions and answers as one bulk diff
+            questions, deleted_ids = parse_question_post(request.POST)
+            try:
+                with transaction.atomic():
+                    quiz = form.save()
+                    apply_questions(quiz, questions, deleted_ids)
+            except ValueError as error:
+                messages.error(request, str(error))
+                return render(request, 'courses/instructor/quiz_form.html', {
+                    'form': form,
+                    'quiz': quiz,
+                    'module': module
+                })
             
             messages.success(request, 'Quiz updated successfully!')
             return redirect('courses:module_content_list', module_id=module.id)
@@ -2199,10 +1861,10 @@ def quiz_questions_list(request, quiz_id):
     if request.user != quiz.module.course.instructor and not request.user.is_superuser:
         return redirect('courses:course_list')
     
-    # Prepare context
+    # Prepare context, with the item statistics computed by compute_question_statistics
     context = {
         'quiz': quiz,
-        'questions': quiz.questions.all().order_by('order'),
+        'questions': quiz.questions.select_related('statistics').order_by('order'),
         'module': module,
         'course': course,
     }
@@ -2368,45 +2030,6 @@ def edit_video(request, video_id):
     })
 
 
-@login_required
-def edit_quiz(request, quiz_id):
-    """Edit a quiz."""
-    quiz = get_object_or_404(Quiz, id=quiz_id)
-    module = quiz.module
-    
-    # Check if user is the instructor
-    if request.user != module.course.instructor and not request.user.is_superuser:
-        return redirect('courses:course_list')
-    
-    if request.method == 'POST':
-        form = ContentForm(request.POST)
-        if form.is_valid():
-            quiz.title = form.cleaned_data['title']
-            quiz.description = form.cleaned_data['description']
-            quiz.order = form.cleaned_data['order']
-            quiz.time_limit = form.cleaned_data['time_limit']
-            quiz.passing_score = form.cleaned_data['passing_score']
-            quiz.save()
-            messages.success(request, 'Quiz updated successfully!')
-            return redirect('courses:module_content_list', module_id=module.id)
-    else:
-        form = ContentForm(initial={
-            'content_type': 'quiz',
-            'title': quiz.title,
-            'description': quiz.description,
-            'order': quiz.order,
-            'time_limit': quiz.time_limit,
-            'passing_score': quiz.passing_score
-        })
-    
-    return render(request, 'courses/instructor/edit_content.html', {
-        'form': form,
-        'module': module,
-        'content': quiz,
-        'content_type': 'quiz'
-    })
-
-
 @login_required
 def delete_lesson(request, lesson_id):
     """Delete a lesson."""
@@ -72,6 +72,7 @@ MIDDLEWARE = [
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
     'allauth.account.middleware.AccountMiddleware',
+    'gamification.middleware.GamificationDispatchMiddleware',
 ]
 
 ROOT_URLCONF = 'edumate.urls'
@@ -106,6 +107,75 @@ DATABASES = {
 }
 
 
+# Cache
+# https://docs.djangoproject.com/en/4.2/topics/cache/
+
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv('CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.getenv('CACHE_LOCATION', 'edumate'),
+    }
+}
+
+# Cache alias and timeout (seconds) for serialized course outlines and the
+# other versioned caches in courses.cache (answer keys, content and question
+# bank indexes, badge rules). Edits invalidate them through version counters
+# kept in the same cache, which a per-process backend (LocMemCache) only
+# updates in the editing process: with one, values are kept for at most
+# COURSE_OUTLINE_LOCAL_CACHE_TIMEOUT seconds and answer keys are not cached.
+# Run more than one worker process only with a shared backend.
+COURSE_OUTLINE_CACHE = 'default'
+COURSE_OUTLINE_CACHE_TIMEOUT = 60 * 60 * 24
+COURSE_OUTLINE_LOCAL_CACHE_TIMEOUT = 10
+
+# Where Progress.completed_* sets are stored: 'm2m' join tables or a per-course
+# 'bitmap' (run build_completion_bitmaps before switching)
+COMPLETION_STORAGE = os.getenv('COMPLETION_STORAGE', 'm2m')
+
+# Buffered UserActivity writes (accounts.activity): cache alias, entries held
+# before an inline flush, and how long an unflushed entry is kept (seconds).
+# Run flush_activity_buffer periodically to drain quiet buffers. Buffering
+# needs a shared cache backend; with a per-process one (LocMemCache) activity
+# is written directly.
+ACTIVITY_BUFFER_CACHE = 'default'
+ACTIVITY_BUFFER_SIZE = 500
+ACTIVITY_BUFFER_TIMEOUT = 60 * 60 * 24
+
+# Quiz autosave buffer (courses.autosave): seconds before buffered answers are
+# written on the next autosave, and how long an unflushed buffer is kept.
+# Run flush_quiz_autosaves periodically during exam windows. Buffering needs
+# a shared cache backend; with a per-process one answers are written directly.
+QUIZ_AUTOSAVE_FLUSH_INTERVAL = 30
+QUIZ_AUTOSAVE_TIMEOUT = 60 * 60 * 6
+
+# Exam mode (courses.exam): quiz submissions store the graded attempt and queue
+# progress and gamification updates for run_submission_worker
+QUIZ_EXAM_MODE = os.getenv('QUIZ_EXAM_MODE', 'False') == 'True'
+QUIZ_SUBMISSION_MAX_TRIES = 5
+
+# Quiz attempt archive (courses.archive): completed attempts older than this
+# many days are moved out of the live tables by archive_quiz_attempts
+QUIZ_ATTEMPT_ARCHIVE_AFTER_DAYS = int(os.getenv('QUIZ_ATTEMPT_ARCHIVE_AFTER_DAYS', 180))
+
+# Leaderboard rank index (gamification.leaderboard): 'memory' keeps a sorted
+# index in each process, reloaded every LEADERBOARD_INDEX_TTL seconds; 'cache'
+# keeps one shared index in LEADERBOARD_CACHE for scores up to
+# LEADERBOARD_MAX_POINTS. Run snapshot_leaderboard_ranks periodically to
+# rebuild the shared index and store Leaderboard.rank.
+LEADERBOARD_INDEX = os.getenv('LEADERBOARD_INDEX', 'memory')
+LEADERBOARD_INDEX_TTL = 300
+LEADERBOARD_CACHE = 'default'
+LEADERBOARD_MAX_POINTS = 2 ** 20 - 1
+
+# Gamification checks (gamification.dispatch) are collapsed per user and run
+# once per transaction or request: 'inline' after it commits, or 'queue'd for
+# run_gamification_worker. Counters of checks requested and run are kept in
+# GAMIFICATION_DISPATCH_CACHE for gamification_dispatch_stats; they need a
+# shared cache backend, as a per-process one (LocMemCache) counts per process.
+GAMIFICATION_DISPATCH = os.getenv('GAMIFICATION_DISPATCH', 'inline')
+GAMIFICATION_DISPATCH_CACHE = 'default'
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators
 
@@ -1,16 +1,10 @@
 from django.contrib import admin
 from .models import (
-    Point, Badge, Achievement, UserBadge, UserAchievement,
-    Challenge, UserChallenge, Streak, PointsTransaction, ProgressBadge
+    Badge, Achievement, UserBadge, UserAchievement,
+    Challenge, UserChallenge, Streak, PointsTransaction, ProgressBadge,
+    BadgeProgress, PendingEvaluation
 )
 
-@admin.register(Point)
-class PointAdmin(admin.ModelAdmin):
-    list_display = ('user', 'points', 'description', 'timestamp')
-    list_filter = ('timestamp',)
-    search_fields = ('user__username', 'description')
-    date_hierarchy = 'timestamp'
-
 @admin.register(Badge)
 class BadgeAdmin(admin.ModelAdmin):
     list_display = ('name', 'description', 'badge_type', 'image', 'points_required')
@@ -68,4 +62,20 @@ class PointsTransactionAdmin(admin.ModelAdmin):
     list_display = ('user', 'points', 'transaction_type', 'description', 'timestamp')
     list_filter = ('transaction_type', 'timestamp')
     search_fields = ('user__username', 'description')
-    date_hierarchy = 'timestamp' 
\ No newline at end of file
+    date_hierarchy = 'timestamp' 
+
+
+@admin.register(BadgeProgress)
+class BadgeProgressAdmin(admin.ModelAdmin):
+    list_display = ('user', 'criteria', 'count', 'updated_at')
+    list_filter = ('criteria__progress_type',)
+    search_fields = ('user__username', 'criteria__badge__name')
+    raw_id_fields = ('user',)
+
+
+@admin.register(PendingEvaluation)
+class PendingEvaluationAdmin(admin.ModelAdmin):
+    list_display = ('user', 'evaluation', 'scope', 'tries', 'created_at')
+    list_filter = ('evaluation',)
+    search_fields = ('user__username',)
+    raw_id_fields = ('user',)
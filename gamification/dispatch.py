@@ -0,0 +1,272 @@
+"""
+Gamification side-effect dispatcher.
+
+Receivers that re-check a user's gamification state (points badges,
+achievements, the leaderboard index) do not run their checks as each
+signal fires. They call dispatch(), which adds the check for the user to
+the current batch, where duplicates collapse: a quiz submission that
+saves the attempt, the streak, the enrollment and several
+PointsTransactions runs each check once per user. A batch is the
+current transaction, or a whole request under
+GamificationDispatchMiddleware (any collect() block), and runs once it
+commits. Checks read the state they evaluate from the database, so
+running one once per batch gives the same result as running it per
+signal.
+
+GAMIFICATION_DISPATCH selects where checks run: 'inline', in the process
+that committed, or 'queue', which stores them in PendingEvaluation for
+run_gamification_worker. Leaderboard index updates always run inline,
+since the 'memory' index lives in each process.
+
+Counters of checks requested and run are kept in
+GAMIFICATION_DISPATCH_CACHE; gamification_dispatch_stats shows them and
+how many runs were saved. They are only meaningful in a cache shared by
+every process (Redis, Memcached): with a per-process cache such as the
+default LocMemCache each process counts on its own, and the command,
+running in a process of its own, reports zeros.
+"""
+import threading
+import traceback
+from collections import Counter
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.db import transaction
+from django.db.models import F
+
+from .leaderboard import update_index
+from .models import PendingEvaluation
+from .utils import (
+    check_course_completion_achievements, check_enrollment_achievements, check_points_badges,
+    check_quiz_achievements, check_streak_achievements
+)
+
+
+DISPATCH_CACHE_PREFIX = 'gamification_dispatch'
+QUEUE_BATCH_SIZE = 100
+QUEUE_MAX_TRIES = 5
+
+# Checks by name, called with the user and the scope they were requested for
+EVALUATIONS = {
+    'points': lambda user, scope: check_points_badges(user),
+    'quiz_score': lambda user, scope: check_quiz_achievements(user),
+    'enrollment': lambda user, scope: check_enrollment_achievements(user),
+    'course_completion': lambda user, scope: check_course_completion_achievements(user),
+    'streak': lambda user, scope: check_streak_achievements(user),
+}
+
+_local = threading.local()
+
+
+def dispatch_mode():
+    return getattr(settings, 'GAMIFICATION_DISPATCH', 'inline')
+
+
+def get_cache():
+    return caches[getattr(settings, 'GAMIFICATION_DISPATCH_CACHE', 'default')]
+
+
+class Batch:
+    """
+    The distinct checks requested in one transaction or collect() block.
+    """
+
+    def __init__(self):
+        self.checks = set()
+        self.requested = Counter()
+
+    def add(self, user_id, evaluation, scope=0):
+        self.requested[evaluation] += 1
+        self.checks.add((user_id, evaluation, scope))
+
+    def run(self):
+        if getattr(_local, 'transaction_batch', None) is self:
+            _local.transaction_batch = None
+        checks, self.checks = self.checks, set()
+        requested, self.requested = self.requested, Counter()
+        if not checks:
+            return
+
+        ran = Counter()
+        leaderboard_ids = {user_id for user_id, evaluation, _scope in checks if evaluation == 'leaderboard'}
+        if leaderboard_ids:
+            update_index(leaderboard_ids)
+            ran['leaderboard'] = len(leaderboard_ids)
+
+        by_user = {}
+        for user_id, evaluation, scope in checks:
+            if evaluation != 'leaderboard':
+                by_user.setdefault(user_id, set()).add((evaluation, scope))
+        if by_user and dispatch_mode() == 'queue':
+            PendingEvaluation.objects.bulk_create(
+                [
+                    PendingEvaluation(user_id=user_id, evaluation=evaluation, scope=scope)
+                    for user_id, user_checks in by_user.items()
+                    for evaluation, scope in user_checks
+                ],
+                ignore_conflicts=True
+            )
+        elif by_user:
+            for user in get_user_model().objects.filter(pk__in=by_user):
+                ran.update(run_evaluations(user, by_user[user.pk]))
+        record_counts(requested, ran)
+
+
+def current_batch():
+    """
+    The batch that collects checks here: the enclosing collect() block,
+    else the current transaction's, or None in autocommit mode.
+    """
+    batch = getattr(_local, 'batch', None)
+    if batch is not None:
+        return batch
+    connection = transaction.get_connection()
+    if not connection.in_atomic_block:
+        return None
+    batch = getattr(_local, 'transaction_batch', None)
+    # A rolled back transaction or savepoint drops the batch's callback with it
+    if batch is None or not any(callback[1] == batch.run for callback in connection.run_on_commit):
+        batch = _local.transaction_batch = Batch()
+        transaction.on_commit(batch.run)
+    return batch
+
+
+def dispatch(user_id, evaluation, scope=0):
+    """
+    Request a check for a user, run once the current batch commits.
+    """
+    batch = current_batch()
+    if batch is None:
+        batch = Batch()
+        batch.add(user_id, evaluation, scope)
+        batch.run()
+    else:
+        batch.add(user_id, evaluation, scope)
+
+
+def dispatch_many(user_ids, evaluation):
+    """
+    Request the same check for many users.
+    """
+    batch = current_batch()
+    run_now = batch is None
+    if run_now:
+        batch = Batch()
+    for user_id in user_ids:
+        batch.add(user_id, evaluation)
+    if run_now:
+        batch.run()
+
+
+@contextmanager
+def collect():
+    """
+    Collect the checks requested inside the block into one batch, run when
+    the block exits (or, inside a transaction, once it commits). Nested
+    blocks join the outermost one.
+    """
+    if getattr(_local, 'batch', None) is not None:
+        yield _local.batch
+        return
+    batch = _local.batch = Batch()
+    try:
+        yield batch
+    finally:
+        _local.batch = None
+        transaction.on_commit(batch.run)
+
+
+def run_evaluations(user, checks):
+    """
+    Run a user's checks in one transaction and return how many ran of each.
+    Checks they request in turn, such as a points check after a bonus,
+    form the next batch.
+    """
+    ran = Counter()
+    with collect(), transaction.atomic():
+        for evaluation, scope in sorted(checks):
+            EVALUATIONS[evaluation](user, scope)
+            ran[evaluation] += 1
+    return ran
+
+
+def _incr(cache, key, delta):
+    try:
+        cache.incr(key, delta)
+    except ValueError:
+        cache.add(key, 0, None)
+        cache.incr(key, delta)
+
+
+def record_counts(requested, ran):
+    cache = get_cache()
+    for name, counts in (('requested', requested), ('ran', ran)):
+        for evaluation, count in counts.items():
+            _incr(cache, f'{DISPATCH_CACHE_PREFIX}:{name}:{evaluation}', count)
+
+
+def dispatch_stats():
+    """
+    Map each check to (requested, ran, saved) since the counters were reset.
+    """
+    names = ['leaderboard', *EVALUATIONS]
+    cache = get_cache()
+    counts = cache.get_many(
+        [f'{DISPATCH_CACHE_PREFIX}:{name}:{evaluation}' for name in ('requested', 'ran') for evaluation in names]
+    )
+    stats = {}
+    for evaluation in names:
+        requested = counts.get(f'{DISPATCH_CACHE_PREFIX}:requested:{evaluation}', 0)
+        ran = counts.get(f'{DISPATCH_CACHE_PREFIX}:ran:{evaluation}', 0)
+        stats[evaluation] = (requested, ran, requested - ran)
+    return stats
+
+
+def reset_stats():
+    names = ['leaderboard', *EVALUATIONS]
+    get_cache().delete_many(
+        [f'{DISPATCH_CACHE_PREFIX}:{name}:{evaluation}' for name in ('requested', 'ran') for evaluation in names]
+    )
+
+
+def drain_queue(batch_size=QUEUE_BATCH_SIZE):
+    """
+    Run the queued checks, one transaction per user, until the queue is
+    empty. A user whose checks fail keeps them queued for the next pass,
+    up to QUEUE_MAX_TRIES times. Returns (users evaluated, users failed).
+    """
+    User = get_user_model()
+    evaluated = failed = 0
+    last_id = 0
+    while True:
+        rows = list(
+            PendingEvaluation.objects.filter(id__gt=last_id, tries__lt=QUEUE_MAX_TRIES).order_by('id').values_list(
+                'id', 'user_id'
+            )[:batch_size]
+        )
+        if not rows:
+            break
+        last_id = rows[-1][0]
+        for user_id in dict.fromkeys(user_id for _id, user_id in rows):
+            try:
+                with transaction.atomic():
+                    pending = list(
+                        PendingEvaluation.objects.select_for_update().filter(user_id=user_id, tries__lt=QUEUE_MAX_TRIES)
+                    )
+                    if not pending:
+                        # Another worker took them
+                        continue
+                    PendingEvaluation.objects.filter(pk__in=[row.pk for row in pending]).delete()
+                    ran = run_evaluations(
+                        User.objects.get(pk=user_id), {(row.evaluation, row.scope) for row in pending}
+                    )
+                record_counts(Counter(), ran)
+                evaluated += 1
+            except Exception:
+                PendingEvaluation.objects.filter(user_id=user_id).update(
+                    tries=F('tries') + 1, last_error=traceback.format_exc()
+                )
+                failed += 1
+    return evaluated, failed
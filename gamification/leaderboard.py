@@ -0,0 +1,348 @@
+"""
+Leaderboard ranks.
+
+Ranks are read from a score index instead of being rewritten on every
+Leaderboard save. The index has sorted-set semantics: students ordered by
+points, highest first, with ties sharing the best rank (1, 2, 2, 4). It
+answers a rank in O(log N) and serves the top K and the window around a
+student. Two implementations are selected by LEADERBOARD_INDEX:
+
+- 'memory': SortedScoreIndex, a bisect-maintained list per process,
+  loaded from the database on first use and reloaded every
+  LEADERBOARD_INDEX_TTL seconds to pick up other processes' writes.
+- 'cache': CacheScoreIndex, a Fenwick tree of per-points student counts
+  in LEADERBOARD_CACHE, shared by every process. Ranks take one get_many
+  of O(log LEADERBOARD_MAX_POINTS) keys; windows are keyset queries on
+  the (points, user) index of Leaderboard.
+
+Leaderboard saves update the index after commit. Like the activity
+buffer, the shared index is best-effort between rebuilds:
+snapshot_leaderboard_ranks rebuilds it and stores each entry's rank in
+Leaderboard.rank, which is a periodic snapshot rather than a live value.
+"""
+import threading
+import time
+from bisect import bisect_left, insort
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.db.models import Count, Q
+
+from .models import Leaderboard
+
+
+LEADERBOARD_CACHE_PREFIX = 'leaderboard'
+REBUILD_BATCH_SIZE = 1000
+
+
+def ranked_entries():
+    """
+    The Leaderboard entries that take part in the ranking.
+    """
+    return Leaderboard.objects.filter(user__is_student=True)
+
+
+class LeaderboardEntry:
+    """
+    A student's place on the leaderboard.
+    """
+
+    def __init__(self, rank, user_id, points):
+        self.rank = rank
+        self.user_id = user_id
+        self.points = points
+        self.user = None
+        # Set on the first entry of a window that does not follow the previous one
+        self.gap_before = False
+
+    def __repr__(self):
+        return f'<LeaderboardEntry {self.rank}: user {self.user_id}, {self.points} points>'
+
+
+class SortedScoreIndex:
+    """
+    In-process index: (-points, user_id) keys in a sorted list.
+    """
+    shared = False
+
+    def __init__(self, ttl=None):
+        self.ttl = ttl if ttl is not None else getattr(settings, 'LEADERBOARD_INDEX_TTL', 300)
+        self._keys = []
+        self._points = {}
+        self._loaded_at = None
+        self._lock = threading.RLock()
+
+    def _ensure_loaded(self):
+        if self._loaded_at is None or time.monotonic() - self._loaded_at > self.ttl:
+            self.rebuild()
+
+    def rebuild(self):
+        rows = ranked_entries().values_list('user_id', 'points')
+        points = dict(rows.iterator(chunk_size=REBUILD_BATCH_SIZE))
+        keys = sorted((-user_points, user_id) for user_id, user_points in points.items())
+        with self._lock:
+            self._points, self._keys = points, keys
+            self._loaded_at = time.monotonic()
+        return len(keys)
+
+    def _discard(self, user_id):
+        points = self._points.pop(user_id, None)
+        if points is not None:
+            position = bisect_left(self._keys, (-points, user_id))
+            if position < len(self._keys) and self._keys[position] == (-points, user_id):
+                del self._keys[position]
+
+    def update(self, user_id, points):
+        with self._lock:
+            if self._loaded_at is None:
+                # The first read loads everything, this write included
+                return
+            self._discard(user_id)
+            self._points[user_id] = points
+            insort(self._keys, (-points, user_id))
+
+    def remove(self, user_id):
+        with self._lock:
+            self._discard(user_id)
+
+    def _rank_of(self, points):
+        return bisect_left(self._keys, (-points,)) + 1
+
+    def points_of(self, user_id):
+        with self._lock:
+            self._ensure_loaded()
+            return self._points.get(user_id)
+
+    def rank(self, user_id):
+        with self._lock:
+            self._ensure_loaded()
+            points = self._points.get(user_id)
+            return None if points is None else self._rank_of(points)
+
+    def _entries(self, keys):
+        return [LeaderboardEntry(self._rank_of(-negated), user_id, -negated) for negated, user_id in keys]
+
+    def top(self, k):
+        with self._lock:
+            self._ensure_loaded()
+            return self._entries(self._keys[:k])
+
+    def around(self, user_id, n):
+        with self._lock:
+            self._ensure_loaded()
+            points = self._points.get(user_id)
+            if points is None:
+                return []
+            position = bisect_left(self._keys, (-points, user_id))
+            return self._entries(self._keys[max(position - n, 0):position + n + 1])
+
+
+class CacheScoreIndex:
+    """
+    Shared index: a Fenwick tree over points, counting students per score,
+    plus each student's indexed points. Keys carry a generation so a
+    rebuild replaces the whole tree at once.
+    """
+    shared = True
+
+    def __init__(self, cache_alias=None, max_points=None):
+        self.cache = caches[cache_alias or getattr(settings, 'LEADERBOARD_CACHE', 'default')]
+        max_points = max_points if max_points is not None else getattr(settings, 'LEADERBOARD_MAX_POINTS', 2 ** 20 - 1)
+        # Power of two, so the last node counts every student
+        self.size = 1 << max_points.bit_length()
+
+    def _key(self, generation, name):
+        return f'{LEADERBOARD_CACHE_PREFIX}:{generation}:{name}'
+
+    def _generation(self):
+        generation = self.cache.get(f'{LEADERBOARD_CACHE_PREFIX}:generation')
+        if generation is None:
+            generation = self.rebuild()
+        return generation
+
+    def _slot(self, points):
+        # Scores above the maximum share the top slot
+        return min(points, self.size - 1) + 1
+
+    def _add(self, generation, points, delta):
+        slot = self._slot(points)
+        while slot <= self.size:
+            key = self._key(generation, slot)
+            try:
+                self.cache.incr(key, delta)
+            except ValueError:
+                self.cache.add(key, 0, None)
+                self.cache.incr(key, delta)
+            slot += slot & -slot
+
+    def rebuild(self):
+        tree = {}
+        for points, count in ranked_entries().values('points').annotate(count=Count('id')).order_by().values_list('points', 'count'):
+            slot = self._slot(points)
+            while slot <= self.size:
+                tree[slot] = tree.get(slot, 0) + count
+                slot += slot & -slot
+
+        try:
+            generation = self.cache.incr(f'{LEADERBOARD_CACHE_PREFIX}:generations')
+        except ValueError:
+            self.cache.add(f'{LEADERBOARD_CACHE_PREFIX}:generations', int(time.time()), None)
+            generation = self.cache.incr(f'{LEADERBOARD_CACHE_PREFIX}:generations')
+        self.cache.set_many({self._key(generation, slot): count for slot, count in tree.items()}, None)
+        batch = {}
+        for user_id, points in ranked_entries().values_list('user_id', 'points').iterator(chunk_size=REBUILD_BATCH_SIZE):
+            batch[self._key(generation, f'user:{user_id}')] = points
+            if len(batch) >= REBUILD_BATCH_SIZE:
+                self.cache.set_many(batch, None)
+                batch = {}
+        self.cache.set_many(batch, None)
+        # Readers switch over only once the new tree is complete
+        self.cache.set(f'{LEADERBOARD_CACHE_PREFIX}:generation', generation, None)
+        return generation
+
+    def update(self, user_id, points):
+        generation = self._generation()
+        member_key = self._key(generation, f'user:{user_id}')
+        previous = self.cache.get(member_key)
+        if previous == points:
+            return
+        self.cache.set(member_key, points, None)
+        if previous is not None:
+            self._add(generation, previous, -1)
+        self._add(generation, points, 1)
+
+    def remove(self, user_id):
+        generation = self._generation()
+        member_key = self._key(generation, f'user:{user_id}')
+        previous = self.cache.get(member_key)
+        if previous is not None:
+            self.cache.delete(member_key)
+            self._add(generation, previous, -1)
+
+    def points_of(self, user_id):
+        return self.cache.get(self._key(self._generation(), f'user:{user_id}'))
+
+    def ranks_for_points(self, scores, generation=None):
+        """
+        Map each score to its rank with a single cache read.
+        """
+        generation = generation or self._generation()
+        paths = {}
+        for points in set(scores):
+            slot, path = self._slot(points), []
+            while slot > 0:
+                path.append(slot)
+                slot -= slot & -slot
+            paths[points] = path
+        slots = {slot for path in paths.values() for slot in path} | {self.size}
+        counts = self.cache.get_many([self._key(generation, slot) for slot in slots])
+
+        def count(slot):
+            return counts.get(self._key(generation, slot), 0)
+
+        total = count(self.size)
+        # Students above a score: everyone minus those at or below it
+        return {points: total - sum(count(slot) for slot in path) + 1 for points, path in paths.items()}
+
+    def rank(self, user_id):
+        generation = self._generation()
+        points = self.cache.get(self._key(generation, f'user:{user_id}'))
+        if points is None:
+            return None
+        return self.ranks_for_points([points], generation)[points]
+
+    def _entries(self, rows):
+        ranks = self.ranks_for_points([points for _user_id, points in rows])
+        return [LeaderboardEntry(ranks[points], user_id, points) for user_id, points in rows]
+
+    def top(self, k):
+        rows = list(ranked_entries().order_by('-points', 'user_id').values_list('user_id', 'points')[:k])
+        return self._entries(rows)
+
+    def around(self, user_id, n):
+        points = self.points_of(user_id)
+        if points is None:
+            return []
+        entries = ranked_entries().values_list('user_id', 'points')
+        above = entries.filter(Q(points__gt=points) | Q(points=points, user_id__lt=user_id))
+        below = entries.filter(Q(points__lt=points) | Q(points=points, user_id__gt=user_id))
+        rows = (
+            list(above.order_by('points', '-user_id')[:n])[::-1]
+            + [(user_id, points)]
+            + list(below.order_by('-points', 'user_id')[:n])
+        )
+        return self._entries(rows)
+
+
+INDEX_CLASSES = {
+    'memory': SortedScoreIndex,
+    'cache': CacheScoreIndex,
+}
+
+_index = None
+
+
+def get_leaderboard_index():
+    global _index
+    if _index is None:
+        _index = INDEX_CLASSES[getattr(settings, 'LEADERBOARD_INDEX', 'memory')]()
+    return _index
+
+
+def index_entries(user_ids):
+    """
+    Bring the index in line with the stored points of the given users
+    once the current transaction commits. Bulk point updates, which skip
+    the Leaderboard signals, call this for the users they touched.
+    """
+    from .dispatch import dispatch_many
+
+    # Collapsed per user with the other gamification checks of the transaction
+    dispatch_many(user_ids, 'leaderboard')
+
+
+def update_index(user_ids):
+    """
+    Update or remove the index entries of the given users from the database.
+    """
+    index = get_leaderboard_index()
+    user_ids = list(user_ids)
+    for start in range(0, len(user_ids), REBUILD_BATCH_SIZE):
+        chunk = user_ids[start:start + REBUILD_BATCH_SIZE]
+        ranked = dict(ranked_entries().filter(user_id__in=chunk).values_list('user_id', 'points'))
+        for user_id in chunk:
+            if user_id in ranked:
+                index.update(user_id, ranked[user_id])
+            else:
+                index.remove(user_id)
+
+
+def with_users(entries):
+    """
+    Attach the user of each entry with one query.
+    """
+    users = get_user_model().objects.select_related('profile').in_bulk([entry.user_id for entry in entries])
+    for entry in entries:
+        entry.user = users.get(entry.user_id)
+    return [entry for entry in entries if entry.user is not None]
+
+
+def snapshot_ranks(batch_size=REBUILD_BATCH_SIZE):
+    """
+    Store each entry's current rank in Leaderboard.rank and return how
+    many rows changed. Entries outside the ranking get rank 0.
+    """
+    changed = []
+    position, rank, previous_points = 0, 0, None
+    rows = ranked_entries().order_by('-points', 'user_id').values_list('id', 'points', 'rank')
+    for entry_id, points, stored_rank in rows.iterator(chunk_size=batch_size):
+        position += 1
+        if points != previous_points:
+            rank, previous_points = position, points
+        if stored_rank != rank:
+            changed.append(Leaderboard(id=entry_id, rank=rank))
+
+    Leaderboard.objects.bulk_update(changed, ['rank'], batch_size=batch_size)
+    unranked = Leaderboard.objects.exclude(user__is_student=True).exclude(rank=0).update(rank=0)
+    return len(changed) + unranked
@@ -0,0 +1,31 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from courses.cache import is_shared_cache
+from gamification.dispatch import dispatch_stats, reset_stats
+from gamification.models import PendingEvaluation
+
+
+class Command(BaseCommand):
+    help = 'Show how many gamification checks were requested, how many ran and how many were saved by collapsing'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--reset', action='store_true', help='Reset the counters after showing them')
+
+    def handle(self, *args, **options):
+        if not is_shared_cache(getattr(settings, 'GAMIFICATION_DISPATCH_CACHE', 'default')):
+            self.stdout.write(self.style.WARNING(
+                'GAMIFICATION_DISPATCH_CACHE is per-process, so these counters only cover this command'
+            ))
+        total_requested = total_ran = 0
+        for evaluation, (requested, ran, saved) in dispatch_stats().items():
+            self.stdout.write(f'{evaluation}: {requested} requested, {ran} ran, {saved} saved')
+            total_requested += requested
+            total_ran += ran
+        self.stdout.write(f'Queued: {PendingEvaluation.objects.count()}')
+
+        if options['reset']:
+            reset_stats()
+        self.stdout.write(self.style.SUCCESS(
+            f'{total_requested - total_ran} of {total_requested} checks saved'
+        ))
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from gamification.rules import rebuild_badge_progress
+
+
+class Command(BaseCommand):
+    help = 'Recount progress badge counters from their source tables and award the badges now earned'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--badge', type=int, nargs='+', dest='criteria_ids', help='Only rebuild these ProgressBadge IDs')
+        parser.add_argument('--user', type=int, nargs='+', dest='user_ids', help='Only rebuild these user IDs')
+
+    def handle(self, *args, **options):
+        awarded = rebuild_badge_progress(criteria_ids=options['criteria_ids'], user_ids=options['user_ids'])
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt badge progress counters; {awarded} badges awarded'))
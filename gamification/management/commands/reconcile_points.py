@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from gamification.points import reconcile_points
+
+
+class Command(BaseCommand):
+    help = 'Check every user\'s points, level and leaderboard entry against the points ledger and repair drift'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--dry-run', action='store_true', help='Report users whose totals differ without fixing them')
+
+    def handle(self, *args, **options):
+        checked, repaired = reconcile_points(batch_size=options['batch_size'], dry_run=options['dry_run'])
+        verb = 'would be repaired' if options['dry_run'] else 'repaired'
+        self.stdout.write(self.style.SUCCESS(f'Checked {checked} users; {repaired} {verb}'))
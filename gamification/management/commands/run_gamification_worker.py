@@ -0,0 +1,25 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from gamification.dispatch import drain_queue
+
+
+class Command(BaseCommand):
+    help = 'Run the gamification checks queued when GAMIFICATION_DISPATCH is "queue"'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='Drain the queue once and exit')
+        parser.add_argument('--batch-size', type=int, default=100)
+        parser.add_argument('--sleep', type=float, default=1.0, help='Seconds to wait when the queue is empty')
+
+    def handle(self, *args, **options):
+        while True:
+            evaluated, failed = drain_queue(batch_size=options['batch_size'])
+            if evaluated or failed:
+                self.stdout.write(f'Evaluated {evaluated} users, {failed} failed')
+
+            if options['once']:
+                break
+            if not evaluated and not failed:
+                time.sleep(options['sleep'])
@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from gamification.leaderboard import get_leaderboard_index, snapshot_ranks
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the shared leaderboard index and store every entry\'s current rank in Leaderboard.rank'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        index = get_leaderboard_index()
+        # A per-process index is rebuilt by the processes that read it
+        if index.shared:
+            index.rebuild()
+            self.stdout.write('Rebuilt the leaderboard index')
+
+        updated = snapshot_ranks(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Updated {updated} leaderboard ranks'))
@@ -0,0 +1,15 @@
+from .dispatch import collect
+
+
+class GamificationDispatchMiddleware:
+    """
+    Collect the gamification checks requested while handling a request into
+    one batch, so each runs once per user after the response is built.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        with collect():
+            return self.get_response(request)
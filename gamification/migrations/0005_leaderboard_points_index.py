@@ -0,0 +1,17 @@
+# Generated by Django 4.2.7 on 2026-10-18 03:18
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gamification', '0004_badge_badge_type_progressbadge'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='leaderboard',
+            index=models.Index(fields=['points', 'user'], name='gamificatio_points_b8419c_idx'),
+        ),
+    ]
@@ -0,0 +1,77 @@
+from django.db import migrations
+from django.db.models import Case, IntegerField, OuterRef, Subquery, Sum, Value, When
+from django.db.models.functions import Coalesce, Greatest
+
+
+BATCH_SIZE = 1000
+
+# gamification.points.LEVEL_THRESHOLDS when this migration was written
+LEVEL_THRESHOLDS = (
+    (1000, 5),
+    (500, 4),
+    (250, 3),
+    (100, 2),
+)
+
+
+def move_points_to_ledger(apps, schema_editor):
+    """
+    Copy every Point row into the PointsTransaction ledger and recompute
+    the points, level and leaderboard totals of the users they belong to.
+    """
+    Point = apps.get_model('gamification', 'Point')
+    PointsTransaction = apps.get_model('gamification', 'PointsTransaction')
+    Leaderboard = apps.get_model('gamification', 'Leaderboard')
+    User = apps.get_model('accounts', 'CustomUser')
+
+    user_ids = set()
+    last_id = 0
+    while True:
+        points = list(Point.objects.filter(id__gt=last_id).order_by('id')[:BATCH_SIZE])
+        if not points:
+            break
+        last_id = points[-1].id
+        transactions = PointsTransaction.objects.bulk_create([
+            PointsTransaction(
+                user_id=point.user_id,
+                points=point.points,
+                transaction_type='earned' if point.points >= 0 else 'penalty',
+                description=point.description
+            )
+            for point in points
+        ])
+        # Keep the original timestamps, which auto_now_add replaced on insert
+        for entry, point in zip(transactions, points):
+            entry.timestamp = point.timestamp
+        PointsTransaction.objects.bulk_update(transactions, ['timestamp'])
+        user_ids.update(point.user_id for point in points)
+
+    ledger_total = PointsTransaction.objects.filter(user=OuterRef('pk')).values('user').annotate(
+        total=Sum('points')
+    ).values('total')
+    user_level = Case(
+        *[When(points__gte=threshold, then=Value(level)) for threshold, level in LEVEL_THRESHOLDS],
+        default=Value(1),
+        output_field=IntegerField()
+    )
+    user_ids = sorted(user_ids)
+    for start in range(0, len(user_ids), BATCH_SIZE):
+        chunk = user_ids[start:start + BATCH_SIZE]
+        users = User.objects.filter(pk__in=chunk)
+        users.update(points=Greatest(Coalesce(Subquery(ledger_total, output_field=IntegerField()), 0), 0))
+        users.update(level=user_level)
+        Leaderboard.objects.filter(user_id__in=chunk).update(
+            points=Subquery(users.filter(pk=OuterRef('user_id')).values('points')[:1])
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0005_useractivity_timestamp_default'),
+        ('gamification', '0005_leaderboard_points_index'),
+    ]
+
+    operations = [
+        migrations.RunPython(move_points_to_ledger, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,16 @@
+# Generated by Django 4.2.7 on 2026-10-18 03:23
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gamification', '0006_move_points_to_ledger'),
+    ]
+
+    operations = [
+        migrations.DeleteModel(
+            name='Point',
+        ),
+    ]
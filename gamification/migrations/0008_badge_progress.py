@@ -0,0 +1,29 @@
+# Generated by Django 4.2.7 on 2026-10-18 03:26
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('gamification', '0007_delete_point'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BadgeProgress',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('count', models.PositiveIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('criteria', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='counters', to='gamification.progressbadge')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='badge_progress', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'unique_together': {('user', 'criteria')},
+            },
+        ),
+    ]
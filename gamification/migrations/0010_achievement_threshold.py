@@ -0,0 +1,18 @@
+# Generated by Django 4.2.7 on 2026-10-18 03:46
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gamification', '0009_pending_evaluation'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='achievement',
+            name='threshold',
+            field=models.PositiveIntegerField(default=1, help_text='Value to reach: a quiz score percentage, a streak length, or a number of courses or enrollments'),
+        ),
+    ]
@@ -1,27 +1,6 @@
-from django.db import models
+from django.db import IntegrityError, models, transaction
 from django.conf import settings
 from django.utils import timezone
-from django.utils.translation import gettext_lazy as _
-
-class Point(models.Model):
-    """
-    Points earned by users for various activities.
-    """
-    user = models.ForeignKey(
-        settings.AUTH_USER_MODEL,
-        on_delete=models.CASCADE,
-        related_name='points_earned'
-    )
-    points = models.IntegerField(default=0)
-    description = models.CharField(max_length=255)
-    timestamp = models.DateTimeField(auto_now_add=True)
-    
-    class Meta:
-        verbose_name = _('Point')
-        verbose_name_plural = _('Points')
-    
-    def __str__(self):
-        return f"{self.user.username}: {self.points} points - {self.description}"
 
 class Badge(models.Model):
     """Model for user badges"""
@@ -59,6 +38,7 @@ class Achievement(models.Model):
     icon = models.CharField(max_length=50, help_text="Font Awesome icon class")
     points_reward = models.PositiveIntegerField(default=10)
     achievement_type = models.CharField(max_length=20, choices=ACHIEVEMENT_TYPES, default='activity')
+    threshold = models.PositiveIntegerField(default=1, help_text="Value to reach: a quiz score percentage, a streak length, or a number of courses or enrollments")
     created_at = models.DateTimeField(auto_now_add=True)
     users = models.ManyToManyField(settings.AUTH_USER_MODEL, through='UserAchievement', related_name='achievement_set')
     
@@ -121,6 +101,134 @@ class ProgressBadge(models.Model):
     
     def __str__(self):
         return f"Progress criteria for {self.badge.name}"
+    
+    @property
+    def target(self):
+        """Count at which the badge is earned; a specific course or module only has to be completed"""
+        if self.progress_type == 'course_completion' and self.course_id:
+            return 1
+        if self.progress_type == 'module_completion' and self.module_id:
+            return 1
+        return self.threshold
+    
+    def matches(self, course_id=None, module_id=None, score=None):
+        """Whether an event in this course and module, with this score, counts towards the badge"""
+        if self.progress_type in ('activity_count', 'points_milestone'):
+            return True
+        if self.course_id and self.course_id != course_id:
+            return False
+        if self.module_id and self.module_id != module_id:
+            return False
+        if self.min_score and (score is None or score < self.min_score):
+            return False
+        return True
+
+class BadgeProgressQuerySet(models.QuerySet):
+    """Incremental maintenance of per-user progress counters for ProgressBadge criteria"""
+    
+    def record(self, user_id, criteria_ids, amount=1):
+        """
+        Add to a user's counters for the given criteria and return their
+        new values by criteria ID.
+        """
+        counters = self.filter(user_id=user_id, criteria_id__in=criteria_ids)
+        counters.update(count=models.F('count') + amount)
+        counts = dict(counters.values_list('criteria_id', 'count'))
+        missing = [criteria_id for criteria_id in criteria_ids if criteria_id not in counts]
+        if missing:
+            try:
+                with transaction.atomic():
+                    self.bulk_create([
+                        BadgeProgress(user_id=user_id, criteria_id=criteria_id, count=amount)
+                        for criteria_id in missing
+                    ])
+            except IntegrityError:
+                # Another event created the rows first
+                counters = self.filter(user_id=user_id, criteria_id__in=missing)
+                counters.update(count=models.F('count') + amount)
+                counts.update(counters.values_list('criteria_id', 'count'))
+            else:
+                counts.update((criteria_id, amount) for criteria_id in missing)
+        return counts
+    
+    def count_from_source(self, criteria, user_ids=None):
+        """
+        Count each user's progress towards the criteria from the tables
+        the events come from. Returns a dict of user ID -> count.
+        """
+        from courses.models import Enrollment, Progress, CompletionEvent, QuizAttempt, QuizAttemptArchive
+        from accounts.models import UserActivity as AccountActivity
+        from analytics.models import UserActivity, attempt_percentage_expression
+        
+        def scoped(rows, course_field, module_field=None):
+            if criteria.course_id:
+                rows = rows.filter(**{course_field: criteria.course_id})
+            if criteria.module_id and module_field:
+                rows = rows.filter(**{module_field: criteria.module_id})
+            return rows
+        
+        if criteria.progress_type == 'course_completion':
+            sources = [(scoped(Enrollment.objects.filter(status='completed'), 'course_id'), 'student_id')]
+        elif criteria.progress_type == 'module_completion':
+            sources = [(scoped(Progress.objects.completed(), 'course_id', 'module_id'), 'student_id')]
+        elif criteria.progress_type == 'lesson_completion':
+            sources = [(scoped(CompletionEvent.objects.filter(kind='lesson'), 'course_id', 'module_id'), 'student_id')]
+        elif criteria.progress_type == 'quiz_performance':
+            sources = [
+                (QuizAttempt.objects.filter(completed=True, passed=True), 'user_id'),
+                (QuizAttemptArchive.objects.filter(passed=True), 'user_id'),
+            ]
+            sources = [(scoped(rows, 'quiz__module__course_id', 'quiz__module_id'), field) for rows, field in sources]
+            if criteria.min_score:
+                sources = [
+                    (rows.annotate(percentage=attempt_percentage_expression()).filter(percentage__gte=criteria.min_score), field)
+                    for rows, field in sources
+                ]
+        elif criteria.progress_type == 'activity_count':
+            sources = [(UserActivity.objects.all(), 'user_id'), (AccountActivity.objects.all(), 'user_id')]
+        else:
+            # Points milestones are read from CustomUser.points
+            return {}
+        
+        counts = {}
+        for rows, field in sources:
+            if user_ids is not None:
+                rows = rows.filter(**{f'{field}__in': user_ids})
+            for user_id, count in rows.values(field).annotate(count=models.Count('id')).order_by().values_list(field, 'count'):
+                counts[user_id] = counts.get(user_id, 0) + count
+        return counts
+    
+    def rebuild(self, criteria, user_ids=None):
+        """
+        Recompute the counters of one criteria for all users, or the given
+        ones, and return the new counts by user ID.
+        """
+        counts = self.count_from_source(criteria, user_ids)
+        with transaction.atomic():
+            counters = self.filter(criteria=criteria)
+            if user_ids is not None:
+                counters = counters.filter(user_id__in=user_ids)
+            counters.delete()
+            self.bulk_create(
+                [BadgeProgress(user_id=user_id, criteria=criteria, count=count) for user_id, count in counts.items()],
+                batch_size=1000
+            )
+        return counts
+
+class BadgeProgress(models.Model):
+    """A user's progress counter towards one ProgressBadge"""
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='badge_progress')
+    criteria = models.ForeignKey(ProgressBadge, on_delete=models.CASCADE, related_name='counters')
+    count = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    objects = BadgeProgressQuerySet.as_manager()
+    
+    class Meta:
+        unique_together = ('user', 'criteria')
+    
+    def __str__(self):
+        return f"{self.user.username} - {self.criteria.badge.name}: {self.count}"
 
 class Challenge(models.Model):
     """Model for challenges that users can complete"""
@@ -205,6 +313,9 @@ class Leaderboard(models.Model):
     
     class Meta:
         ordering = ['-points']
+        indexes = [
+            models.Index(fields=['points', 'user']),
+        ]
     
     def __str__(self):
         return f"{self.user.username} - {self.points} points (Rank: {self.rank})"
@@ -225,4 +336,21 @@ class PointsTransaction(models.Model):
     timestamp = models.DateTimeField(auto_now_add=True)
     
     def __str__(self):
-        return f"{self.user.username} {self.transaction_type} {self.points} points" 
\ No newline at end of file
+        return f"{self.user.username} {self.transaction_type} {self.points} points"
+
+
+class PendingEvaluation(models.Model):
+    """Model for gamification checks queued for the gamification worker"""
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='pending_evaluations')
+    evaluation = models.CharField(max_length=30)
+    # Object a check is limited to, 0 for checks that cover the whole user
+    scope = models.PositiveIntegerField(default=0)
+    tries = models.PositiveIntegerField(default=0)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        unique_together = ('user', 'evaluation', 'scope')
+    
+    def __str__(self):
+        return f"{self.evaluation} check for {self.user_id}"
@@ -0,0 +1,192 @@
+"""
+Points service.
+
+The PointsTransaction ledger is the only record of points. Code that
+awards points calls award_points(), or award_points_to_users() for many
+users at once, which appends to the ledger and updates the materialized
+totals in the same transaction: CustomUser.points and level, and
+Leaderboard.points, which every leaderboard reads.
+
+apply_transaction() moves the totals by one transaction's points with
+in-place increments, so recording points costs the same number of
+queries however long a user's history is. reconcile_points() re-derives
+the totals from the ledger in chunks of users and repairs any that
+drifted.
+"""
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models import Case, F, IntegerField, OuterRef, Subquery, Sum, Value, When
+from django.db.models.functions import Coalesce, Greatest
+
+from .leaderboard import index_entries
+from .models import Leaderboard, PointsTransaction
+
+
+BATCH_SIZE = 1000
+RECONCILE_BATCH_SIZE = 1000
+
+# Minimum points for each level above 1, highest first
+LEVEL_THRESHOLDS = (
+    (1000, 5),
+    (500, 4),
+    (250, 3),
+    (100, 2),
+)
+
+
+def level_for_points(points):
+    """
+    Return the user level for a points total.
+    """
+    for threshold, level in LEVEL_THRESHOLDS:
+        if points >= threshold:
+            return level
+    return 1
+
+
+def level_expression(field='points'):
+    """
+    Database expression computing the user level from a points column, for
+    use in queryset updates.
+    """
+    return Case(
+        *[When(**{f'{field}__gte': threshold}, then=Value(level)) for threshold, level in LEVEL_THRESHOLDS],
+        default=Value(1),
+        output_field=IntegerField()
+    )
+
+
+def points_increment(points, field='points'):
+    """
+    Expression adding points to a column without taking it below zero.
+    """
+    if points >= 0:
+        return F(field) + points
+    return Greatest(F(field) + points, Value(0))
+
+
+def award_points(user, points, description, transaction_type='earned'):
+    """
+    Record points for a user and return the ledger entry. The user's
+    totals are updated in the same transaction by update_user_points.
+    """
+    with transaction.atomic():
+        return PointsTransaction.objects.create(
+            user=user,
+            points=points,
+            transaction_type=transaction_type,
+            description=description
+        )
+
+
+def award_points_to_users(user_ids, points, description, transaction_type='earned', batch_size=BATCH_SIZE):
+    """
+    Record the same points for many users with bulk inserts and in-place
+    increments of their totals rather than a signal per entry.
+    """
+    user_ids = list(user_ids)
+    with transaction.atomic():
+        PointsTransaction.objects.bulk_create(
+            [
+                PointsTransaction(
+                    user_id=user_id,
+                    points=points,
+                    transaction_type=transaction_type,
+                    description=description
+                )
+                for user_id in user_ids
+            ],
+            batch_size=batch_size
+        )
+        for start in range(0, len(user_ids), batch_size):
+            chunk = user_ids[start:start + batch_size]
+            users = get_user_model().objects.filter(pk__in=chunk)
+            users.update(points=points_increment(points))
+            users.update(level=level_expression())
+            Leaderboard.objects.filter(user_id__in=chunk).update(points=points_increment(points))
+            index_entries(chunk)
+
+
+def refresh_totals(user_ids):
+    """
+    Recompute the totals of the given users from their ledger, for writers
+    that insert ledger entries in bulk with different points per user.
+    """
+    ledger_total = PointsTransaction.objects.filter(user=OuterRef('pk')).values('user').annotate(
+        total=Sum('points')
+    ).values('total')
+    users = get_user_model().objects.filter(pk__in=user_ids)
+    users.update(points=Greatest(Coalesce(Subquery(ledger_total, output_field=IntegerField()), 0), 0))
+    users.update(level=level_expression())
+    Leaderboard.objects.filter(user_id__in=user_ids).update(
+        points=Subquery(users.filter(pk=OuterRef('user_id')).values('points')[:1])
+    )
+    index_entries(user_ids)
+
+
+def apply_transaction(user, points):
+    """
+    Add a transaction's points to the user's totals and refresh them on `user`.
+    """
+    users = get_user_model().objects.filter(pk=user.pk)
+    users.update(points=points_increment(points))
+    users.update(level=level_expression())
+    user.refresh_from_db(fields=['points', 'level'])
+
+    if not Leaderboard.objects.filter(user_id=user.pk).update(points=points_increment(points)):
+        Leaderboard.objects.get_or_create(user_id=user.pk, defaults={'points': user.points})
+    # Queryset updates skip the Leaderboard signals
+    index_entries([user.pk])
+
+
+def reconcile_points(batch_size=RECONCILE_BATCH_SIZE, dry_run=False):
+    """
+    Compare every user's totals with their ledger and repair the ones that
+    differ. Returns (users checked, users repaired).
+    """
+    User = get_user_model()
+    checked = repaired = 0
+    last_id = 0
+    while True:
+        with transaction.atomic():
+            # Locking the users holds off apply_transaction until the chunk is written
+            users = list(
+                User.objects.select_for_update().filter(pk__gt=last_id).order_by('pk').only('points', 'level')[:batch_size]
+            )
+            if not users:
+                break
+            last_id = users[-1].pk
+            user_ids = [user.pk for user in users]
+            ledger = dict(
+                PointsTransaction.objects.filter(user_id__in=user_ids).values('user_id').annotate(
+                    total=Sum('points')
+                ).order_by().values_list('user_id', 'total')
+            )
+            entries = {entry.user_id: entry for entry in Leaderboard.objects.filter(user_id__in=user_ids)}
+
+            changed_users, changed_entries, new_entries = [], [], []
+            for user in users:
+                total = max(ledger.get(user.pk) or 0, 0)
+                level = level_for_points(total)
+                entry = entries.get(user.pk)
+                if (user.points, user.level) != (total, level):
+                    user.points, user.level = total, level
+                    changed_users.append(user)
+                if entry is None:
+                    new_entries.append(Leaderboard(user_id=user.pk, points=total))
+                elif entry.points != total:
+                    entry.points = total
+                    changed_entries.append(entry)
+
+            checked += len(users)
+            repaired_ids = {user.pk for user in changed_users} | {
+                entry.user_id for entry in changed_entries + new_entries
+            }
+            repaired += len(repaired_ids)
+            if dry_run or not repaired_ids:
+                continue
+            User.objects.bulk_update(changed_users, ['points', 'level'])
+            Leaderboard.objects.bulk_update(changed_entries, ['points'])
+            Leaderboard.objects.bulk_create(new_entries)
+            index_entries(repaired_ids)
+    return checked, repaired
@@ -0,0 +1,141 @@
+"""
+Badge rule engine.
+
+Each ProgressBadge is a rule, indexed by the event type that can move it
+(its progress_type) in a cached rule table that is rebuilt when criteria
+change. Users have a BadgeProgress counter per rule. record_event()
+increments the counters of the rules an event matches and the user has
+not earned yet, then awards the badges whose counters reached their
+target, so an event costs O(affected rules) instead of a re-check of
+every badge. Points milestones compare CustomUser.points rather than a
+counter.
+
+Counters stop moving once their badge is earned. rebuild_badge_progress
+recomputes them from the source tables; it runs for a rule whenever its
+criteria are saved, and for every rule from the command of the same name.
+"""
+from django.contrib.auth import get_user_model
+
+from courses.cache import bump_version, get_or_build
+from .models import BadgeProgress, ProgressBadge, UserBadge
+from .points import award_points
+
+
+BADGE_RULES_NAMESPACE = 'badge_rules'
+
+
+def build_rules():
+    rules = {}
+    for criteria in ProgressBadge.objects.select_related('badge').order_by('id'):
+        rules.setdefault(criteria.progress_type, []).append(criteria)
+    return rules
+
+
+def get_rules():
+    """
+    The ProgressBadge rules by event type.
+    """
+    return get_or_build(BADGE_RULES_NAMESPACE, 'all', build_rules)
+
+
+def invalidate_rules():
+    bump_version(BADGE_RULES_NAMESPACE, 'all')
+
+
+def has_rules(event_type):
+    return bool(get_rules().get(event_type))
+
+
+def record_event(user, event_type, amount=1, course_id=None, module_id=None, score=None):
+    """
+    Apply an event to the user's counters and return the badges it earned.
+
+    event_type is a ProgressBadge progress type; course_id, module_id and
+    score (a percentage) are the event's scope for course, module and
+    minimum score criteria.
+    """
+    rules = [rule for rule in get_rules().get(event_type, ()) if rule.matches(course_id, module_id, score)]
+    if not rules:
+        return []
+    owned = set(
+        UserBadge.objects.filter(user_id=user.pk, badge_id__in=[rule.badge_id for rule in rules]).values_list(
+            'badge_id', flat=True
+        )
+    )
+    rules = [rule for rule in rules if rule.badge_id not in owned]
+    if not rules:
+        return []
+
+    if event_type == 'points_milestone':
+        met = [rule for rule in rules if user.points >= rule.target]
+    else:
+        counts = BadgeProgress.objects.record(user.pk, [rule.pk for rule in rules], amount)
+        met = [rule for rule in rules if counts.get(rule.pk, 0) >= rule.target]
+    return award_rule_badges(user, met)
+
+
+def evaluate_rules(user):
+    """
+    Award every badge whose rule the user's stored counters already meet.
+    """
+    rules = [rule for rules in get_rules().values() for rule in rules]
+    if not rules:
+        return []
+    owned = set(UserBadge.objects.filter(user_id=user.pk).values_list('badge_id', flat=True))
+    counts = dict(BadgeProgress.objects.filter(user_id=user.pk).values_list('criteria_id', 'count'))
+    met = [
+        rule for rule in rules
+        if rule.badge_id not in owned and (
+            user.points if rule.progress_type == 'points_milestone' else counts.get(rule.pk, 0)
+        ) >= rule.target
+    ]
+    return award_rule_badges(user, met)
+
+
+def award_rule_badges(user, rules):
+    """
+    Give the user the badges of the given rules, with their bonus points.
+    """
+    awarded = []
+    for rule in rules:
+        user_badge, created = UserBadge.objects.get_or_create(user=user, badge=rule.badge)
+        if not created:
+            continue
+        if rule.badge.points_required > 0:
+            award_points(
+                user,
+                rule.badge.points_required,
+                f"Earned {rule.badge.name} badge",
+                transaction_type='bonus'
+            )
+        awarded.append(user_badge)
+    return awarded
+
+
+def rebuild_badge_progress(criteria_ids=None, user_ids=None):
+    """
+    Recompute the counters of all rules, or the given ones, for all users
+    or the given ones, and award the badges they now meet. Returns the
+    number of badges awarded.
+    """
+    User = get_user_model()
+    criteria_list = ProgressBadge.objects.select_related('badge')
+    if criteria_ids is not None:
+        criteria_list = criteria_list.filter(pk__in=criteria_ids)
+
+    awarded = 0
+    for criteria in criteria_list:
+        if criteria.progress_type == 'points_milestone':
+            eligible = User.objects.filter(points__gte=criteria.target)
+            if user_ids is not None:
+                eligible = eligible.filter(pk__in=user_ids)
+            eligible_ids = set(eligible.values_list('pk', flat=True))
+        else:
+            counts = BadgeProgress.objects.rebuild(criteria, user_ids)
+            eligible_ids = {user_id for user_id, count in counts.items() if count >= criteria.target}
+        eligible_ids -= set(
+            UserBadge.objects.filter(badge_id=criteria.badge_id, user_id__in=eligible_ids).values_list('user_id', flat=True)
+        )
+        for user in User.objects.filter(pk__in=eligible_ids):
+            awarded += len(award_rule_badges(user, [criteria]))
+    return awarded
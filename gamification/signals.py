@@ -1,16 +1,22 @@
-from django.db.models.signals import post_save, m2m_changed, pre_save
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete, m2m_changed, pre_save
 from django.dispatch import receiver
 from django.utils import timezone
 from django.contrib.auth import get_user_model
-from django.db.models import Sum, Count
+from django.db.models import Count
 
-from courses.models import Enrollment, Progress, QuizAttempt
+from courses.models import Enrollment, Quiz, QuizAttempt
+from courses.signals import attempt_just_completed
+from accounts.models import UserActivity as AccountActivity
 from analytics.models import UserActivity
 from .models import (
-    Badge, UserBadge, Achievement, UserAchievement,
-    PointsTransaction, Streak, Leaderboard, UserChallenge
+    Badge, UserBadge,
+    PointsTransaction, Streak, Leaderboard, UserChallenge, ProgressBadge
 )
-from .utils import check_and_award_progress_badges, check_for_badge_eligibility
+from .leaderboard import get_leaderboard_index, index_entries
+from .dispatch import dispatch
+from .points import apply_transaction, award_points
+from .rules import has_rules, invalidate_rules, rebuild_badge_progress, record_event
 
 User = get_user_model()
 
@@ -30,37 +36,12 @@ def create_user_streak(sender, instance, created, **kwargs):
 @receiver(post_save, sender=PointsTransaction)
 def update_user_points(sender, instance, created, **kwargs):
     """
-    Update user points when a new transaction is created.
+    Apply a new transaction's points to the user's totals.
     """
     if created:
-        user = instance.user
-        # Calculate total points
-        total_points = PointsTransaction.objects.filter(user=user).aggregate(Sum('points'))['points__sum'] or 0
-        
-        # Update user points
-        user.points = total_points
-        
-        # Update user level based on points
-        if total_points >= 1000:
-            user.level = 5
-        elif total_points >= 500:
-            user.level = 4
-        elif total_points >= 250:
-            user.level = 3
-        elif total_points >= 100:
-            user.level = 2
-        else:
-            user.level = 1
-            
-        user.save(update_fields=['points', 'level'])
-        
-        # Update leaderboard
-        leaderboard, created = Leaderboard.objects.get_or_create(user=user)
-        leaderboard.points = total_points
-        leaderboard.save()
-        
-        # Check for badge eligibility
-        check_for_badge_eligibility(user)
+        # In-place increments; reconcile_points re-checks the totals against the
+        # ledger, and check_badges_on_points runs the badge check afterwards
+        apply_transaction(instance.user, instance.points)
 
 
 def check_badge_eligibility(user):
@@ -98,37 +79,8 @@ def check_quiz_achievements(sender, instance, created, **kwargs):
         streak, created = Streak.objects.get_or_create(user=user)
         streak.update_streak()
         
-        # Check for quiz score achievements
-        quiz_achievements = Achievement.objects.filter(
-            achievement_type='quiz_score'
-        )
-        
-        for achievement in quiz_achievements:
-            # Check if the score meets the threshold
-            if instance.score_percentage >= achievement.threshold:
-                # Check if already unlocked
-                if not UserAchievement.objects.filter(user=user, achievement=achievement).exists():
-                    # Unlock achievement
-                    UserAchievement.objects.create(
-                        user=user,
-                        achievement=achievement
-                    )
-                    
-                    # Award badge if applicable
-                    if achievement.badge:
-                        UserBadge.objects.get_or_create(
-                            user=user,
-                            badge=achievement.badge
-                        )
-                    
-                    # Award points
-                    if achievement.points > 0:
-                        PointsTransaction.objects.create(
-                            user=user,
-                            points=achievement.points,
-                            transaction_type='bonus',
-                            description=f"Achievement unlocked: {achievement.name}"
-                        )
+        # Check for quiz score achievements once the submission commits
+        dispatch(user.pk, 'quiz_score')
 
 
 @receiver(post_save, sender=Enrollment)
@@ -137,108 +89,7 @@ def check_course_enrollment_achievements(sender, instance, created, **kwargs):
     Check for course enrollment achievements.
     """
     if created:
-        user = instance.student
-        
-        # Count total enrollments
-        enrollment_count = Enrollment.objects.filter(student=user).count()
-        
-        # Check for enrollment achievements
-        enrollment_achievements = Achievement.objects.filter(
-            achievement_type='activity',
-            description__icontains='enroll'
-        )
-        
-        for achievement in enrollment_achievements:
-            if enrollment_count >= achievement.threshold:
-                # Check if already unlocked
-                if not UserAchievement.objects.filter(user=user, achievement=achievement).exists():
-                    # Unlock achievement
-                    UserAchievement.objects.create(
-                        user=user,
-                        achievement=achievement
-                    )
-                    
-                    # Award badge if applicable
-                    if achievement.badge:
-                        UserBadge.objects.get_or_create(
-                            user=user,
-                            badge=achievement.badge
-                        )
-                    
-                    # Award points
-                    if achievement.points > 0:
-                        PointsTransaction.objects.create(
-                            user=user,
-                            points=achievement.points,
-                            transaction_type='bonus',
-                            description=f"Achievement unlocked: {achievement.name}"
-                        )
-
-
-@receiver(post_save, sender=Progress)
-def check_course_completion_achievements(sender, instance, **kwargs):
-    """
-    Check for course completion achievements.
-    """
-    # Calculate course completion percentage
-    course_modules = instance.course.modules.count()
-    if course_modules == 0:
-        return
-    
-    user_progress = Progress.objects.filter(
-        student=instance.student,
-        course=instance.course
-    )
-    
-    total_percentage = sum(p.completion_percentage for p in user_progress)
-    overall_percentage = total_percentage / course_modules
-    
-    # If course is completed (100%)
-    if overall_percentage >= 100:
-        user = instance.student
-        
-        # Record course completion
-        enrollment = Enrollment.objects.get(student=user, course=instance.course)
-        enrollment.status = 'completed'
-        enrollment.completion_date = timezone.now()
-        enrollment.save()
-        
-        # Count completed courses
-        completed_courses = Enrollment.objects.filter(
-            student=user,
-            status='completed'
-        ).count()
-        
-        # Check for course completion achievements
-        completion_achievements = Achievement.objects.filter(
-            achievement_type='course_completion'
-        )
-        
-        for achievement in completion_achievements:
-            if completed_courses >= achievement.threshold:
-                # Check if already unlocked
-                if not UserAchievement.objects.filter(user=user, achievement=achievement).exists():
-                    # Unlock achievement
-                    UserAchievement.objects.create(
-                        user=user,
-                        achievement=achievement
-                    )
-                    
-                    # Award badge if applicable
-                    if achievement.badge:
-                        UserBadge.objects.get_or_create(
-                            user=user,
-                            badge=achievement.badge
-                        )
-                    
-                    # Award points
-                    if achievement.points > 0:
-                        PointsTransaction.objects.create(
-                            user=user,
-                            points=achievement.points,
-                            transaction_type='bonus',
-                            description=f"Achievement unlocked: {achievement.name}"
-                        )
+        dispatch(instance.student_id, 'enrollment')
 
 
 @receiver(post_save, sender=Streak)
@@ -246,38 +97,7 @@ def check_streak_achievements(sender, instance, **kwargs):
     """
     Check for streak-related achievements.
     """
-    user = instance.user
-    
-    # Check for streak achievements
-    streak_achievements = Achievement.objects.filter(
-        achievement_type='streak'
-    )
-    
-    for achievement in streak_achievements:
-        if instance.current_streak >= achievement.threshold:
-            # Check if already unlocked
-            if not UserAchievement.objects.filter(user=user, achievement=achievement).exists():
-                # Unlock achievement
-                UserAchievement.objects.create(
-                    user=user,
-                    achievement=achievement
-                )
-                
-                # Award badge if applicable
-                if achievement.badge:
-                    UserBadge.objects.get_or_create(
-                        user=user,
-                        badge=achievement.badge
-                    )
-                
-                # Award points
-                if achievement.points > 0:
-                    PointsTransaction.objects.create(
-                        user=user,
-                        points=achievement.points,
-                        transaction_type='bonus',
-                        description=f"Achievement unlocked: {achievement.name}"
-                    )
+    dispatch(instance.user_id, 'streak')
 
 
 @receiver(post_save, sender=UserChallenge)
@@ -289,11 +109,10 @@ def check_challenge_completion(sender, instance, **kwargs):
         instance.save(update_fields=['completed_at'])
         
         # Award points
-        PointsTransaction.objects.create(
-            user=instance.user,
-            points=instance.challenge.points_reward,
-            transaction_type='earned',
-            description=f"Completed challenge: {instance.challenge.name}"
+        award_points(
+            instance.user,
+            instance.challenge.points_reward,
+            f"Completed challenge: {instance.challenge.name}"
         )
         
         # Award badge if associated with challenge
@@ -305,54 +124,76 @@ def check_challenge_completion(sender, instance, **kwargs):
 
 
 @receiver(post_save, sender=Leaderboard)
-def update_leaderboard_ranks(sender, instance, **kwargs):
-    """Update ranks for all users in the leaderboard"""
-    # This is a simple implementation that might not be efficient for large user bases
-    # For production, consider using a scheduled task or more efficient approach
-    leaderboards = Leaderboard.objects.all().order_by('-points')
-    
-    for i, leaderboard in enumerate(leaderboards, 1):
-        if leaderboard.rank != i:
-            leaderboard.rank = i
-            leaderboard.save(update_fields=['rank'])
+def index_leaderboard_entry(sender, instance, **kwargs):
+    """Keep the leaderboard index in step with the entry's points"""
+    index_entries([instance.user_id])
 
 
-@receiver(post_save, sender=Progress)
-def check_badges_on_progress(sender, instance, created, **kwargs):
-    """Check for badge eligibility when a user makes progress in a course"""
-    if instance.student:
-        check_and_award_progress_badges(instance.student)
+@receiver(post_delete, sender=Leaderboard)
+def unindex_leaderboard_entry(sender, instance, **kwargs):
+    """Drop a deleted entry from the leaderboard index"""
+    transaction.on_commit(lambda: get_leaderboard_index().remove(instance.user_id))
 
 
 @receiver(post_save, sender=QuizAttempt)
-def check_badges_on_quiz_attempt(sender, instance, created, **kwargs):
-    """Check for badge eligibility when a user completes a quiz"""
-    if created and instance.user:
-        check_and_award_progress_badges(instance.user)
+def check_badges_on_quiz_attempt(sender, instance, created, raw=False, **kwargs):
+    """Count a passed quiz towards quiz performance badges"""
+    if raw or not instance.passed or not attempt_just_completed(instance, created):
+        return
+    if has_rules('quiz_performance'):
+        module_id, course_id = Quiz.objects.filter(pk=instance.quiz_id).values_list(
+            'module_id', 'module__course_id'
+        ).first()
+        record_event(
+            instance.user, 'quiz_performance',
+            course_id=course_id, module_id=module_id, score=instance.score_percentage
+        )
+
+
+@receiver(pre_save, sender=Enrollment)
+def note_enrollment_completion(sender, instance, raw=False, **kwargs):
+    """Remember whether this save is the one that completes the enrollment"""
+    instance._completes_now = bool(
+        not raw and instance.status == 'completed' and (
+            instance._state.adding
+            or Enrollment.objects.filter(pk=instance.pk).exclude(status='completed').exists()
+        )
+    )
 
 
 @receiver(post_save, sender=Enrollment)
-def check_badges_on_enrollment(sender, instance, created, **kwargs):
-    """Check for badge eligibility when a user's enrollment status changes"""
-    if instance.student and instance.status == 'completed':
-        check_and_award_progress_badges(instance.student)
+def check_badges_on_enrollment(sender, instance, **kwargs):
+    """Count a completed course towards course completion badges and achievements"""
+    if getattr(instance, '_completes_now', False):
+        record_event(instance.student, 'course_completion', course_id=instance.course_id)
+        dispatch(instance.student_id, 'course_completion')
 
 
 @receiver(post_save, sender=PointsTransaction)
 def check_badges_on_points(sender, instance, created, **kwargs):
     """Check for badge eligibility when a user earns points"""
-    if created and instance.user and instance.transaction_type in ['earned', 'bonus']:
-        check_for_badge_eligibility(instance.user)
+    if created and instance.user_id and instance.transaction_type in ['earned', 'bonus']:
+        dispatch(instance.user_id, 'points')
 
 
 @receiver(post_save, sender=UserActivity)
+@receiver(post_save, sender=AccountActivity)
 def check_badges_on_activity(sender, instance, created, **kwargs):
-    """Check for badge eligibility when a user is active"""
-    if created and instance.user:
-        # Only check for activity-based badges once per day per user
-        last_check = getattr(instance.user, '_last_activity_badge_check', None)
-        today = timezone.now().date()
-        
-        if not last_check or last_check != today:
-            check_and_award_progress_badges(instance.user)
-            instance.user._last_activity_badge_check = today 
\ No newline at end of file
+    """Count an activity, from either activity log, towards activity count badges"""
+    if created and instance.user_id and has_rules('activity_count'):
+        record_event(instance.user, 'activity_count')
+
+
+@receiver(post_save, sender=ProgressBadge)
+def rebuild_badge_rule(sender, instance, raw=False, **kwargs):
+    """Refresh the rule table and recount the changed rule from its source tables"""
+    if raw:
+        return
+    invalidate_rules()
+    transaction.on_commit(lambda: rebuild_badge_progress([instance.pk]))
+
+
+@receiver(post_delete, sender=ProgressBadge)
+def drop_badge_rule(sender, instance, **kwargs):
+    """Refresh the rule table once a rule is deleted"""
+    invalidate_rules()
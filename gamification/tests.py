@@ -0,0 +1,353 @@
+import tempfile
+from unittest import mock
+
+from django.core.cache import caches
+from django.db import transaction
+from django.test import TestCase, TransactionTestCase
+
+from accounts.activity import flush_activity, record_activity
+from accounts.models import CustomUser, UserActivity
+from courses.completion import complete_item
+from courses.models import Course, Enrollment, Lesson, Module, Quiz
+from .dispatch import EVALUATIONS, collect, dispatch, dispatch_stats, drain_queue
+from .leaderboard import CacheScoreIndex, SortedScoreIndex, snapshot_ranks
+from .models import (
+    Achievement, Badge, BadgeProgress, Leaderboard, PendingEvaluation, PointsTransaction, ProgressBadge, UserAchievement,
+    UserBadge
+)
+from .points import award_points, reconcile_points
+from .rules import rebuild_badge_progress
+
+
+class CourseCompletionAchievementTests(TestCase):
+    """
+    Completing the last item of a course unlocks course completion achievements.
+    """
+
+    def setUp(self):
+        caches['default'].clear()
+        # TestCase never commits, so run the gamification checks queued for commit here
+        with self.captureOnCommitCallbacks(execute=True):
+            instructor = CustomUser.objects.create_user(username='instructor', password='password')
+            self.student = CustomUser.objects.create_user(username='student', password='password', is_student=True)
+            self.course = Course.objects.create(
+                title='Course', slug='course', description='Description',
+                instructor=instructor, learning_outcomes='Outcomes'
+            )
+            first = Module.objects.create(course=self.course, title='First', order=0)
+            second = Module.objects.create(course=self.course, title='Second', order=1)
+            self.items = [
+                Lesson.objects.create(module=first, title='Lesson 1', content='Content'),
+                Lesson.objects.create(module=first, title='Lesson 2', content='Content'),
+                Quiz.objects.create(module=second, title='Quiz'),
+            ]
+            Enrollment.objects.create(student=self.student, course=self.course)
+            self.achievement = Achievement.objects.create(
+                name='Graduate', description='Complete a course', icon='fa-graduation-cap',
+                achievement_type='course_completion', threshold=1, points_reward=50
+            )
+
+    def test_completing_every_item_unlocks_achievement(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            for item in self.items[:-1]:
+                complete_item(self.student, item, points=10)
+        self.assertFalse(UserAchievement.objects.filter(user=self.student).exists())
+
+        with self.captureOnCommitCallbacks(execute=True):
+            complete_item(self.student, self.items[-1], points=10)
+
+        self.assertEqual(
+            Enrollment.objects.get(student=self.student, course=self.course).status, 'completed'
+        )
+        self.assertTrue(
+            UserAchievement.objects.filter(user=self.student, achievement=self.achievement).exists()
+        )
+        self.student.refresh_from_db()
+        self.assertEqual(self.student.points, 80)
+
+
+class ScoreIndexTests(TestCase):
+    """
+    Both leaderboard indexes rank students by points, with ties sharing the best rank.
+    """
+
+    def setUp(self):
+        caches['default'].clear()
+        self.users = [
+            CustomUser.objects.create_user(username=f'student{number}', password='password', is_student=True)
+            for number in range(5)
+        ]
+        CustomUser.objects.create_user(username='teacher', password='password', is_instructor=True)
+        for user, points in zip(self.users, (50, 80, 50, 10, 200)):
+            Leaderboard.objects.filter(user=user).update(points=points)
+
+    def indexes(self):
+        # A small tree, so the highest score also exercises the shared top slot
+        return [SortedScoreIndex(ttl=3600), CacheScoreIndex(max_points=127)]
+
+    def ids(self, *numbers):
+        return [self.users[number].pk for number in numbers]
+
+    def test_ranks_and_ties(self):
+        for index in self.indexes():
+            with self.subTest(index=type(index).__name__):
+                index.rebuild()
+                self.assertEqual([index.rank(user.pk) for user in self.users], [3, 2, 3, 5, 1])
+                self.assertIsNone(index.rank(CustomUser.objects.get(username='teacher').pk))
+                top = index.top(3)
+                self.assertEqual([entry.user_id for entry in top], self.ids(4, 1, 0))
+                self.assertEqual([entry.rank for entry in top], [1, 2, 3])
+                around = index.around(self.users[2].pk, 1)
+                self.assertEqual([(entry.user_id, entry.rank) for entry in around], list(zip(self.ids(0, 2, 3), [3, 3, 5])))
+
+    def test_updates_and_removals(self):
+        for index in self.indexes():
+            with self.subTest(index=type(index).__name__):
+                index.rebuild()
+                index.update(self.users[3].pk, 90)
+                self.assertEqual(index.rank(self.users[3].pk), 2)
+                self.assertEqual(index.rank(self.users[1].pk), 3)
+                index.update(self.users[3].pk, 90)
+                self.assertEqual(index.rank(self.users[0].pk), 4)
+                index.remove(self.users[4].pk)
+                self.assertIsNone(index.rank(self.users[4].pk))
+                self.assertEqual(index.rank(self.users[3].pk), 1)
+                self.assertEqual(index.points_of(self.users[3].pk), 90)
+
+    def test_snapshot_ranks(self):
+        self.assertEqual(snapshot_ranks(), 5)
+        self.assertEqual(
+            [Leaderboard.objects.get(user=user).rank for user in self.users], [3, 2, 3, 5, 1]
+        )
+        self.assertEqual(snapshot_ranks(), 0)
+
+
+class PointsLedgerTests(TestCase):
+    """
+    Totals kept from the points ledger by increments, and their reconciliation.
+    """
+
+    def setUp(self):
+        caches['default'].clear()
+        self.users = [
+            CustomUser.objects.create_user(username=f'student{number}', password='password', is_student=True)
+            for number in range(3)
+        ]
+
+    def totals(self, user):
+        user.refresh_from_db()
+        return user.points, user.level, Leaderboard.objects.get(user=user).points
+
+    def test_transactions_move_totals(self):
+        user = self.users[0]
+        award_points(user, 80, 'Quiz')
+        award_points(user, 40, 'Bonus', transaction_type='bonus')
+        self.assertEqual(self.totals(user), (120, 2, 120))
+        award_points(user, -500, 'Penalty', transaction_type='penalty')
+        self.assertEqual(self.totals(user), (0, 1, 0))
+
+    def test_reconcile_repairs_drift(self):
+        award_points(self.users[0], 300, 'Quiz')
+        award_points(self.users[1], 50, 'Quiz')
+        # Drift the stored totals away from the ledger
+        CustomUser.objects.filter(pk=self.users[0].pk).update(points=5, level=1)
+        Leaderboard.objects.filter(user=self.users[1]).update(points=999)
+        Leaderboard.objects.filter(user=self.users[2]).delete()
+
+        self.assertEqual(reconcile_points(batch_size=2, dry_run=True), (3, 3))
+        self.assertEqual(self.totals(self.users[0])[:2], (5, 1))
+
+        self.assertEqual(reconcile_points(batch_size=2), (3, 3))
+        self.assertEqual(self.totals(self.users[0]), (300, 3, 300))
+        self.assertEqual(self.totals(self.users[1]), (50, 1, 50))
+        self.assertEqual(self.totals(self.users[2]), (0, 1, 0))
+        self.assertEqual(reconcile_points(), (3, 0))
+        self.assertEqual(PointsTransaction.objects.count(), 2)
+
+
+class BadgeRuleTests(TestCase):
+    """
+    Progress badges awarded from per-rule counters moved by events.
+    """
+
+    def setUp(self):
+        caches['default'].clear()
+        instructor = CustomUser.objects.create_user(username='instructor', password='password')
+        self.student = CustomUser.objects.create_user(username='student', password='password', is_student=True)
+        self.courses = [
+            Course.objects.create(
+                title=f'Course {number}', slug=f'course-{number}', description='Description',
+                instructor=instructor, learning_outcomes='Outcomes'
+            )
+            for number in range(2)
+        ]
+        self.lessons = [
+            Lesson.objects.create(
+                module=Module.objects.create(course=course, title='Module'), title=f'Lesson {number}', content='Content'
+            )
+            for course in self.courses for number in range(3)
+        ]
+
+    def rule(self, progress_type, threshold, course=None, points=0):
+        badge = Badge.objects.create(
+            name=f'{progress_type} {threshold}', description='Badge', icon='fa-star',
+            badge_type='progress', points_required=points
+        )
+        return ProgressBadge.objects.create(badge=badge, progress_type=progress_type, threshold=threshold, course=course)
+
+    def has_badge(self, rule):
+        return UserBadge.objects.filter(user=self.student, badge=rule.badge).exists()
+
+    def test_scoped_counter_awards_badge_once(self):
+        rule = self.rule('lesson_completion', 2, course=self.courses[0], points=15)
+
+        complete_item(self.student, self.lessons[0])
+        complete_item(self.student, self.lessons[3])
+        self.assertEqual(BadgeProgress.objects.get(user=self.student, criteria=rule).count, 1)
+        self.assertFalse(self.has_badge(rule))
+
+        complete_item(self.student, self.lessons[1])
+        self.assertTrue(self.has_badge(rule))
+        self.assertTrue(PointsTransaction.objects.filter(user=self.student, transaction_type='bonus', points=15).exists())
+
+        # Counters stop once the badge is earned
+        complete_item(self.student, self.lessons[2])
+        self.assertEqual(BadgeProgress.objects.get(user=self.student, criteria=rule).count, 2)
+        self.assertEqual(UserBadge.objects.filter(user=self.student, badge=rule.badge).count(), 1)
+
+    def test_flushed_activity_counts(self):
+        rule = self.rule('activity_count', 3)
+        with tempfile.TemporaryDirectory() as location:
+            backend = 'django.core.cache.backends.filebased.FileBasedCache'
+            with self.settings(CACHES={'default': {'BACKEND': backend, 'LOCATION': location}}):
+                for _number in range(3):
+                    record_activity(self.student, 'module_view')
+                self.assertFalse(UserActivity.objects.filter(user=self.student).exists())
+                self.assertFalse(self.has_badge(rule))
+
+                self.assertEqual(flush_activity(), 3)
+
+        self.assertEqual(BadgeProgress.objects.get(user=self.student, criteria=rule).count, 3)
+        self.assertTrue(self.has_badge(rule))
+
+    def test_rebuild_counts_from_source_tables(self):
+        for lesson in self.lessons[:2]:
+            complete_item(self.student, lesson)
+        rule = self.rule('lesson_completion', 2)
+        self.assertFalse(self.has_badge(rule))
+
+        self.assertEqual(rebuild_badge_progress([rule.pk]), 1)
+        self.assertTrue(self.has_badge(rule))
+        self.assertEqual(BadgeProgress.objects.get(user=self.student, criteria=rule).count, 2)
+
+
+class DispatchMixin:
+    """
+    Replace the gamification checks with ones that record each run.
+    """
+
+    def create_users(self):
+        self.users = [
+            CustomUser.objects.create_user(username=f'student{number}', password='password', is_student=True)
+            for number in range(2)
+        ]
+
+    def setUp(self):
+        self.create_users()
+        # Start the dispatch counters after the checks creating the users ran
+        caches['default'].clear()
+        self.runs = []
+        evaluations = {
+            name: (lambda name: lambda user, scope: self.runs.append((user.pk, name, scope)))(name)
+            for name in EVALUATIONS
+        }
+        patcher = mock.patch.dict(EVALUATIONS, evaluations)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+
+class DispatchTests(DispatchMixin, TestCase):
+    """
+    Checks requested in one batch run once per user after it commits.
+    """
+
+    def create_users(self):
+        # Run the checks creating the users queues, so each test starts with no open batch
+        with self.captureOnCommitCallbacks(execute=True):
+            super().create_users()
+
+    def test_duplicates_collapse_within_a_transaction(self):
+        first, second = self.users
+        with self.captureOnCommitCallbacks(execute=True):
+            for _number in range(3):
+                dispatch(first.pk, 'points')
+            dispatch(second.pk, 'points')
+            dispatch(first.pk, 'quiz_score', 7)
+            self.assertEqual(self.runs, [])
+
+        self.assertEqual(
+            sorted(self.runs), sorted([(first.pk, 'points', 0), (second.pk, 'points', 0), (first.pk, 'quiz_score', 7)])
+        )
+
+    def test_nested_collect_blocks_share_one_batch(self):
+        user = self.users[0]
+        with self.captureOnCommitCallbacks(execute=True):
+            with collect() as outer:
+                dispatch(user.pk, 'points')
+                with collect() as inner:
+                    self.assertIs(inner, outer)
+                    dispatch(user.pk, 'points')
+                    dispatch(user.pk, 'streak')
+
+        self.assertEqual(sorted(self.runs), [(user.pk, 'points', 0), (user.pk, 'streak', 0)])
+
+    def test_rolled_back_savepoint_drops_its_checks(self):
+        first, second = self.users
+        with self.captureOnCommitCallbacks(execute=True):
+            try:
+                with transaction.atomic():
+                    dispatch(first.pk, 'points')
+                    raise ValueError
+            except ValueError:
+                pass
+            dispatch(second.pk, 'points')
+
+        self.assertEqual(self.runs, [(second.pk, 'points', 0)])
+
+    def test_queue_mode_stores_checks_for_the_worker(self):
+        first, second = self.users
+        with self.settings(GAMIFICATION_DISPATCH='queue'):
+            with self.captureOnCommitCallbacks(execute=True):
+                dispatch(first.pk, 'points')
+                dispatch(first.pk, 'points')
+                dispatch(second.pk, 'enrollment')
+
+        self.assertEqual(self.runs, [])
+        self.assertEqual(
+            set(PendingEvaluation.objects.values_list('user_id', 'evaluation')),
+            {(first.pk, 'points'), (second.pk, 'enrollment')}
+        )
+
+        self.assertEqual(drain_queue(), (2, 0))
+        self.assertFalse(PendingEvaluation.objects.exists())
+        self.assertEqual(sorted(self.runs), sorted([(first.pk, 'points', 0), (second.pk, 'enrollment', 0)]))
+
+    def test_stats_count_saved_runs(self):
+        first, second = self.users
+        with self.captureOnCommitCallbacks(execute=True):
+            for user in (first, first, first, second):
+                dispatch(user.pk, 'points')
+
+        self.assertEqual(dispatch_stats()['points'], (4, 2, 2))
+        self.assertEqual(dispatch_stats()['streak'], (0, 0, 0))
+
+
+class AutocommitDispatchTests(DispatchMixin, TransactionTestCase):
+    """
+    Outside a transaction or collect() block a check runs straight away.
+    """
+
+    def test_check_runs_immediately(self):
+        user = self.users[0]
+        dispatch(user.pk, 'points')
+        self.assertEqual(self.runs, [(user.pk, 'points', 0)])
@@ -1,173 +1,30 @@
 from django.utils import timezone
-from django.db.models import Count, Sum, Avg
-from .models import Badge, UserBadge, ProgressBadge, PointsTransaction
-from courses.models import Progress, QuizAttempt
-from analytics.models import UserActivity
+from django.db.models import Count, Sum, Avg, Max
+from django.contrib.auth import get_user_model
+from courses.models import Enrollment, QuizAttemptSummary
+from .models import Badge, UserBadge, PointsTransaction, Achievement, UserAchievement, Streak
+from .points import award_points
+from .rules import evaluate_rules, record_event
+
+
+def evaluate_badges_for_users(user_ids):
+    """
+    Run the points and progress badge checks once for each of the given users.
+    """
+    for user in get_user_model().objects.filter(pk__in=user_ids):
+        check_for_badge_eligibility(user)
+        check_and_award_progress_badges(user)
+
 
 def check_and_award_progress_badges(user):
     """
-    Check user's progress against all progress badge criteria and award badges accordingly.
+    Award the progress badges whose criteria the user's counters already meet.
     Returns a list of newly awarded badges.
-    """
-    newly_awarded = []
-    all_progress_badges = ProgressBadge.objects.select_related('badge').all()
     
-    # Get user's existing badges to avoid rechecking
-    user_badge_ids = UserBadge.objects.filter(user=user).values_list('badge_id', flat=True)
-    
-    for progress_badge in all_progress_badges:
-        # Skip if user already has this badge
-        if progress_badge.badge.id in user_badge_ids:
-            continue
-            
-        badge_earned = False
-        
-        # Check based on progress type
-        if progress_badge.progress_type == 'course_completion':
-            # Check if user has completed the specified course or any course
-            from courses.models import Enrollment
-            
-            enrollments = Enrollment.objects.filter(student=user, status='completed')
-            if progress_badge.course:
-                # Check for specific course
-                badge_earned = enrollments.filter(course=progress_badge.course).exists()
-            else:
-                # Check for course count
-                completed_count = enrollments.count()
-                badge_earned = completed_count >= progress_badge.threshold
-                
-        elif progress_badge.progress_type == 'module_completion':
-            # Check modules completed
-            modules_completed = 0
-            
-            if progress_badge.course and progress_badge.module:
-                # Specific module in specific course
-                progress = Progress.objects.filter(
-                    student=user,
-                    course=progress_badge.course,
-                    module=progress_badge.module
-                ).first()
-                
-                if progress and progress.completion_percentage == 100:
-                    badge_earned = True
-            elif progress_badge.course:
-                # All modules in specific course
-                progress_records = Progress.objects.filter(
-                    student=user,
-                    course=progress_badge.course,
-                    completion_percentage=100
-                )
-                modules_completed = progress_records.count()
-                badge_earned = modules_completed >= progress_badge.threshold
-            else:
-                # Any modules
-                progress_records = Progress.objects.filter(
-                    student=user,
-                    completion_percentage=100
-                )
-                modules_completed = progress_records.count()
-                badge_earned = modules_completed >= progress_badge.threshold
-                
-        elif progress_badge.progress_type == 'lesson_completion':
-            # Check lessons completed
-            # Since LessonCompletion model doesn't exist, we'll use Progress model to estimate
-            # lessons completed based on module completion percentage
-            from courses.models import Lesson, Module
-            
-            lesson_count = 0
-            
-            if progress_badge.course:
-                if progress_badge.module:
-                    # Specific module
-                    try:
-                        # Get lesson count in the module
-                        total_lessons = Lesson.objects.filter(
-                            module=progress_badge.module
-                        ).count()
-                        
-                        # Get progress for this module
-                        progress = Progress.objects.filter(
-                            student=user,
-                            course=progress_badge.course,
-                            module=progress_badge.module
-                        ).first()
-                        
-                        if progress:
-                            # Estimate completed lessons based on completion percentage
-                            lesson_count = int((progress.completion_percentage / 100) * total_lessons)
-                    except:
-                        lesson_count = 0
-                else:
-                    # All modules in course
-                    modules = Module.objects.filter(course=progress_badge.course)
-                    for module in modules:
-                        total_lessons = Lesson.objects.filter(module=module).count()
-                        progress = Progress.objects.filter(
-                            student=user,
-                            course=progress_badge.course,
-                            module=module
-                        ).first()
-                        
-                        if progress:
-                            lesson_count += int((progress.completion_percentage / 100) * total_lessons)
-            else:
-                # Any lessons across all courses
-                progress_records = Progress.objects.filter(student=user)
-                for progress in progress_records:
-                    total_lessons = Lesson.objects.filter(module=progress.module).count()
-                    lesson_count += int((progress.completion_percentage / 100) * total_lessons)
-            
-            badge_earned = lesson_count >= progress_badge.threshold
-            
-        elif progress_badge.progress_type == 'quiz_performance':
-            # Check quiz performance
-            quiz_attempts = QuizAttempt.objects.filter(user=user, passed=True)
-            
-            if progress_badge.course:
-                quiz_attempts = quiz_attempts.filter(quiz__module__course=progress_badge.course)
-                
-            if progress_badge.module:
-                quiz_attempts = quiz_attempts.filter(quiz__module=progress_badge.module)
-                
-            if progress_badge.min_score:
-                quiz_attempts = quiz_attempts.filter(score__gte=progress_badge.min_score)
-                
-            badge_earned = quiz_attempts.count() >= progress_badge.threshold
-            
-        elif progress_badge.progress_type == 'activity_count':
-            # Check activity count
-            activities = UserActivity.objects.filter(user=user)
-            badge_earned = activities.count() >= progress_badge.threshold
-            
-        elif progress_badge.progress_type == 'points_milestone':
-            # Check points milestone
-            total_points = user.points if hasattr(user, 'points') else PointsTransaction.objects.filter(
-                user=user, 
-                transaction_type__in=['earned', 'bonus']
-            ).aggregate(total=Sum('points'))['total'] or 0
-            
-            badge_earned = total_points >= progress_badge.threshold
-        
-        # Award badge if criteria met
-        if badge_earned:
-            user_badge = UserBadge.objects.create(
-                user=user,
-                badge=progress_badge.badge,
-                earned_at=timezone.now()
-            )
-            
-            # Create points transaction for badge
-            if progress_badge.badge.points_required > 0:
-                PointsTransaction.objects.create(
-                    user=user,
-                    points=progress_badge.badge.points_required,
-                    transaction_type='bonus',
-                    description=f"Earned {progress_badge.badge.name} badge"
-                )
-            
-            newly_awarded.append(user_badge)
-            
-    return newly_awarded
+    The counters are kept current by gamification.rules as events happen,
+    so this reads them rather than recounting the user's history.
+    """
+    return evaluate_rules(user)
 
 
 def check_for_badge_eligibility(user):
@@ -177,9 +34,11 @@ def check_for_badge_eligibility(user):
         transaction_type__in=['earned', 'bonus']
     ).aggregate(total=Sum('points'))['total'] or 0
     
-    # Get badges the user doesn't have yet that are point-based
+    # Get badges the user doesn't have yet that are point-based; badges with
+    # progress criteria are awarded by their rule
     eligible_badges = Badge.objects.filter(
-        points_required__lte=user_points
+        points_required__lte=user_points,
+        progress_criteria__isnull=True
     ).exclude(
         id__in=UserBadge.objects.filter(user=user).values_list('badge_id', flat=True)
     )
@@ -194,4 +53,81 @@ def check_for_badge_eligibility(user):
         )
         newly_awarded.append(user_badge)
         
-    return newly_awarded 
\ No newline at end of file
+    return newly_awarded 
+
+
+def check_points_badges(user):
+    """Award the badges the user's points total has reached, plain and rule-driven"""
+    awarded = check_for_badge_eligibility(user)
+    return awarded + record_event(user, 'points_milestone')
+
+
+def unlock_achievement(user, achievement):
+    """Unlock an achievement with its points, unless the user already has it"""
+    if UserAchievement.objects.filter(user=user, achievement=achievement).exists():
+        return False
+    
+    UserAchievement.objects.create(
+        user=user,
+        achievement=achievement
+    )
+    
+    # Award points
+    if achievement.points_reward > 0:
+        award_points(
+            user,
+            achievement.points_reward,
+            f"Achievement unlocked: {achievement.name}",
+            transaction_type='bonus'
+        )
+    return True
+
+
+def check_quiz_achievements(user):
+    """Unlock the quiz score achievements reached by the user's best passed attempt"""
+    best_score = QuizAttemptSummary.objects.filter(user=user, passed_count__gt=0).aggregate(
+        best=Max('best_percentage')
+    )['best']
+    if best_score is None:
+        return
+    
+    for achievement in Achievement.objects.filter(achievement_type='quiz_score'):
+        if best_score >= achievement.threshold:
+            unlock_achievement(user, achievement)
+
+
+def check_enrollment_achievements(user):
+    """Unlock the enrollment achievements reached by the user's enrollment count"""
+    enrollment_count = Enrollment.objects.filter(student=user).count()
+    
+    enrollment_achievements = Achievement.objects.filter(
+        achievement_type='activity',
+        description__icontains='enroll'
+    )
+    
+    for achievement in enrollment_achievements:
+        if enrollment_count >= achievement.threshold:
+            unlock_achievement(user, achievement)
+
+
+def check_course_completion_achievements(user):
+    """Unlock the course completion achievements reached by the user's completed courses"""
+    completed_courses = Enrollment.objects.filter(
+        student=user,
+        status='completed'
+    ).count()
+    
+    for achievement in Achievement.objects.filter(achievement_type='course_completion'):
+        if completed_courses >= achievement.threshold:
+            unlock_achievement(user, achievement)
+
+
+def check_streak_achievements(user):
+    """Unlock the streak achievements reached by the user's current streak"""
+    streak = Streak.objects.filter(user=user).first()
+    if streak is None:
+        return
+    
+    for achievement in Achievement.objects.filter(achievement_type='streak'):
+        if streak.current_streak >= achievement.threshold:
+            unlock_achievement(user, achievement)
@@ -8,9 +8,10 @@ from django.http import JsonResponse
 
 from .models import (
     Badge, UserBadge, Achievement, UserAchievement,
-    Challenge, UserChallenge, PointsTransaction, Streak, Point, ProgressBadge
+    Challenge, UserChallenge, PointsTransaction, Streak, ProgressBadge
 )
 from accounts.models import CustomUser
+from .leaderboard import get_leaderboard_index, with_users
 from .utils import check_and_award_progress_badges, check_for_badge_eligibility
 
 
@@ -245,24 +246,19 @@ def leaderboard(request):
     """
     Display the leaderboard of users ranked by points.
     """
-    # Changed from total_points to points_sum to avoid conflict with the property
-    top_users = CustomUser.objects.filter(is_student=True).annotate(
-        points_sum=Sum('points_earned__points')
-    ).order_by('-points_sum')[:20]  # Top 20 users
-    
-    # Get current user's rank
-    if request.user.is_authenticated:
-        # Calculate points directly instead of using the property
-        user_points_sum = Point.objects.filter(user=request.user).aggregate(Sum('points'))['points__sum'] or 0
-        user_rank = CustomUser.objects.filter(
-            is_student=True
-        ).annotate(
-            points_sum=Sum('points_earned__points')
-        ).filter(
-            points_sum__gt=user_points_sum
-        ).count() + 1
-    else:
-        user_rank = None
+    index = get_leaderboard_index()
+    top_entries = index.top(20)  # Top 20 users
+    
+    # Get current user's rank, and the students around them when outside the top
+    user_rank = index.rank(request.user.pk)
+    shown = {entry.user_id for entry in top_entries}
+    if user_rank and request.user.pk not in shown:
+        window = index.around(request.user.pk, 2)
+        nearby_entries = [entry for entry in window if entry.user_id not in shown]
+        if len(nearby_entries) == len(window):
+            nearby_entries[0].gap_before = True
+        top_entries += nearby_entries
+    top_entries = with_users(top_entries)
     
     # Get users with most badges
     badge_leaders = CustomUser.objects.filter(is_student=True).annotate(
@@ -273,7 +269,7 @@ def leaderboard(request):
     streak_leaders = Streak.objects.order_by('-current_streak')[:10]
     
     context = {
-        'top_users': top_users,
+        'top_entries': top_entries,
         'user_rank': user_rank,
         'badge_leaders': badge_leaders,
         'streak_leaders': streak_leaders,